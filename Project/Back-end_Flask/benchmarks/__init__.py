@@ -0,0 +1 @@
+# Benchmarks and synthetic corpora for the back-end
\ No newline at end of file
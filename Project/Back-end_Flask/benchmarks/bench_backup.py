@@ -0,0 +1,107 @@
+"""Benchmark online backups: backup time and how long a concurrent writer stalls.
+
+A writer thread commits one small review row at a time (the app's write pattern) while
+models.backup copies the synthetic database with each --pages setting (-1 = whole file in one
+step, i.e. no incremental copy). Commit latencies during the backup are compared with a run
+without backup. Use --size large (several GB) for the numbers that matter. In WAL mode every
+setting is a one-step snapshot; --journal-mode delete shows the rollback-journal case, where each
+step read-locks the file, and a short --writer-pause shows the copy restarting under writes
+(mode 'restarted').
+
+Usage: python -m benchmarks.bench_backup [--size small] [--journal-mode wal|delete] [--pages 64,256,1024,-1]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.load_test import percentile
+from benchmarks.synthetic_db import SIZES, build_database
+from models.backup import BackupManager
+
+
+class Writer(threading.Thread):
+    def __init__(self, path, pause):
+        super().__init__(daemon=True)
+        self.path = path
+        self.pause = pause
+        self.latencies = []
+        self.stop = threading.Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=600)
+        session_id = conn.execute('SELECT MIN(id) FROM study_sessions').fetchone()[0] or 1
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            conn.execute('INSERT INTO word_review_items (session_id, word_id, is_correct) VALUES (?, 1, 1)',
+                         (session_id,))
+            conn.commit()
+            self.latencies.append(time.perf_counter() - start)
+            time.sleep(self.pause)
+        conn.close()
+
+
+def stall_stats(latencies):
+    values = sorted(latencies)
+    return {'commits': len(values),
+            'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+            'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+            'max_ms': round(values[-1] * 1000, 2) if values else None}
+
+
+def with_writer(path, pause, action):
+    writer = Writer(path, pause)
+    writer.start()
+    try:
+        result = action()
+    finally:
+        writer.stop.set()
+        writer.join()
+    return result, stall_stats(writer.latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online backup benchmark')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--db', help='synthetic database to reuse (built when missing)')
+    parser.add_argument('--journal-mode', choices=['wal', 'delete'], default='wal')
+    parser.add_argument('--pages', default='64,256,1024,-1', help='comma-separated pages per step')
+    parser.add_argument('--sleep', type=float, default=0.005, help='seconds between steps')
+    parser.add_argument('--writer-pause', type=float, default=0.002)
+    parser.add_argument('--baseline-seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bench_backup_')
+    try:
+        path = os.path.abspath(args.db or os.path.join(tempfile.gettempdir(), f'bench_backup_{args.size}.db'))
+        if not os.path.exists(path):
+            build_database(path, **SIZES[args.size])
+        conn = sqlite3.connect(path)
+        conn.execute(f'PRAGMA journal_mode={args.journal_mode}')
+        conn.close()
+
+        _, baseline = with_writer(path, args.writer_pause, lambda: time.sleep(args.baseline_seconds))
+        results = {'database': path, 'bytes': os.path.getsize(path), 'journal_mode': args.journal_mode,
+                   'writer_without_backup': baseline, 'backups': {}}
+        for pages in (int(value) for value in args.pages.split(',')):
+            manager = BackupManager(os.path.join(work, str(pages)), keep=0, pages_per_step=pages, sleep=args.sleep)
+            manifest, stall = with_writer(path, args.writer_pause, lambda: manager.create(path, label='bench'))
+            results['backups'][str(pages)] = {
+                'seconds': round(manifest['duration_ms'] / 1000, 3),
+                'mode': manifest['mode'],
+                'steps': manifest['steps'],
+                'longest_step_ms': manifest['longest_step_ms'],
+                'writer': stall,
+            }
+            shutil.rmtree(manager.directory)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark the streaming word export and the bulk import on a synthetic database.
+
+Each format is streamed through the app to a temp file (time, bytes, chunks and the Python heap
+peak while streaming), then the NDJSON export is imported into a fresh database.
+
+Usage: python -m benchmarks.bench_export [--words 100000] [--groups 1000] [--no-trace]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_db import build_database
+
+FORMATS = ['ndjson', 'ndjson&gzip=1', 'csv', 'csv&gzip=1']
+
+
+def stream_to_file(http, query, path, trace):
+    start = time.perf_counter()
+    response = http.get(f'/api/export/words?format={query}', buffered=False)
+    if trace:
+        tracemalloc.start()
+    size = chunks = 0
+    with open(path, 'wb') as out:
+        for chunk in response.response:
+            out.write(chunk)
+            size += len(chunk)
+            chunks += 1
+    peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+    response.close()
+    return {'seconds': round(time.perf_counter() - start, 3), 'bytes': size, 'chunks': chunks,
+            'peak_heap_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Word export/import benchmark')
+    parser.add_argument('--words', type=int, default=100_000)
+    parser.add_argument('--groups', type=int, default=1_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-trace', action='store_true', help='skip tracemalloc (it slows the export down)')
+    args = parser.parse_args()
+
+    from app import create_app
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, 'source.db')
+        dataset = build_database(source, words=args.words, groups=args.groups, review_items=0, seed=args.seed)
+        app = create_app({'DATABASE_URL': None, 'DATABASE_PATH': source})
+        results = {'dataset': dataset, 'export': {}}
+        with app.test_client() as http:
+            for query in FORMATS:
+                path = os.path.join(work, 'export.' + query.replace('&gzip=1', '.gz'))
+                results['export'][query.replace('&gzip=1', '+gzip')] = stream_to_file(http, query, path,
+                                                                                      not args.no_trace)
+
+        target = create_app({'DATABASE_URL': None, 'DATABASE_PATH': os.path.join(work, 'target.db')})
+        with target.test_client() as http, open(os.path.join(work, 'export.ndjson'), 'rb') as body:
+            start = time.perf_counter()
+            response = http.post('/api/import/words', data=body)
+            results['import'] = {'status': response.status_code, 'seconds': round(time.perf_counter() - start, 3),
+                                 **response.get_json()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
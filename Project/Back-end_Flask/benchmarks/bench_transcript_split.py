@@ -0,0 +1,82 @@
+"""Benchmark the streaming transcript splitter against the old whole-text regex pipeline.
+
+Usage: python -m benchmarks.bench_transcript_split [--repeat 20] [--workers N]
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from services.transcript_splitter import iter_file_sections, split_directory, split_file
+
+TRANSCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Data', 'transcripts')
+
+
+def legacy_split(path):
+    """The pre-rewrite split_transcript_text: four uncompiled passes over the whole text."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    text = text.replace('\r\n', '\n').replace('\r', '\n').replace('　', ' ')
+    text = re.sub(r'(\d+)\s*[\r\n]+\s*番', r'\1番', text)
+    text = re.sub(r"(問題[1-7])", r"\n\1", text)
+    text = re.sub(r'(選んでください)(\s*)(\d+番)', r'\1\n\3番', text)
+    result = []
+    for section in re.split(r'\n(?=問題[1-7])', text):
+        match = re.search(r'問題([1-7])', section)
+        if match:
+            result.append((match.group(1), section.strip()))
+    return result
+
+
+def streaming_split(path):
+    return [(section.number, section.text) for section in iter_file_sections(path)]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcript splitter benchmark')
+    parser.add_argument('--transcripts', default=TRANSCRIPTS_DIR)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scale', type=int, default=50, help='copies of the corpus in the large-file case')
+    args = parser.parse_args()
+    paths = sorted(os.path.join(args.transcripts, name) for name in os.listdir(args.transcripts)
+                   if name.endswith('.txt'))
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    mismatched = [os.path.basename(path) for path in paths if legacy_split(path) != streaming_split(path)]
+    results = {
+        'files': len(paths),
+        'bytes': total_bytes,
+        'mismatched_files': mismatched,
+        'legacy_seconds': round(best_of(lambda: [legacy_split(p) for p in paths], args.repeat), 5),
+        'streaming_seconds': round(best_of(lambda: [streaming_split(p) for p in paths], args.repeat), 5),
+    }
+    with tempfile.TemporaryDirectory() as out_dir:
+        results['write_serial_seconds'] = round(
+            best_of(lambda: [split_file(p, out_dir) for p in paths], max(1, args.repeat // 4)), 5)
+        results['write_pool_seconds'] = round(
+            best_of(lambda: split_directory(args.transcripts, out_dir, args.workers), max(1, args.repeat // 4)), 5)
+        # One large transcript: whole-text passes copy the text per pass, streaming keeps one block
+        big_path = os.path.join(out_dir, 'large.txt')
+        with open(big_path, 'w', encoding='utf-8') as out:
+            for _ in range(args.scale):
+                for path in paths:
+                    with open(path, encoding='utf-8') as f:
+                        out.write(f.read())
+        results['large_file_bytes'] = os.path.getsize(big_path)
+        results['large_legacy_seconds'] = round(best_of(lambda: legacy_split(big_path), 3), 5)
+        results['large_streaming_seconds'] = round(best_of(lambda: streaming_split(big_path), 3), 5)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare the single-pass word parser with the old regex + json/json5/demjson3 chain.
+
+Usage: python -m benchmarks.bench_vocab_parser [--size 200] [--seed 0] [--repeat 5]
+"""
+import argparse
+import json
+import re
+import time
+from benchmarks.vocab_corpus import build_corpus
+from services.llm_parsing import parse_word_objects
+
+REQUIRED_KEYS = {"kanji", "romaji", "vietnamese", "jlpt_level", "parts"}
+
+
+def legacy_parse(text):
+    """The pre-rewrite parse_json_response, minus logging, for comparison."""
+    parsers = [json.loads]
+    try:
+        import json5
+        parsers.append(json5.loads)
+    except ImportError:
+        pass
+    try:
+        import demjson3
+        parsers.append(demjson3.decode)
+    except ImportError:
+        pass
+    text = re.sub(r'<think>[\s\S]*?</think>', '', text)
+    text = text.replace('```json', '').replace('```', '').strip()
+    match = re.search(r'(\[.*\]|\{.*\})', text, re.DOTALL)
+    if match:
+        for parser in parsers:
+            try:
+                return parser(match.group(1))
+            except Exception:
+                pass
+    valid, seen, depth, start = [], set(), 0, None
+    for i, c in enumerate(text):
+        if c == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif c == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                try:
+                    obj = json.loads(text[start:i + 1])
+                except Exception:
+                    continue
+                if REQUIRED_KEYS.issubset(obj) and (obj["kanji"], obj["jlpt_level"]) not in seen:
+                    seen.add((obj["kanji"], obj["jlpt_level"]))
+                    valid.append(obj)
+    return valid
+
+
+def recovered(result):
+    """Kanji of the valid, de-duplicated word objects in a parser result."""
+    if isinstance(result, dict):
+        result = next((v for v in result.values() if isinstance(v, list)), [result])
+    if not isinstance(result, list):
+        return []
+    kanji = []
+    for obj in result:
+        if isinstance(obj, dict) and REQUIRED_KEYS.issubset(obj) and obj["kanji"] not in kanji:
+            kanji.append(obj["kanji"])
+    return kanji
+
+
+def run(parser, corpus, repeat):
+    correct = 0
+    for _, text, expected in corpus:
+        if recovered(parser(text)) == expected:
+            correct += 1
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, text, _ in corpus:
+            parser(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {'correct': correct, 'cases': len(corpus), 'best_seconds': round(best, 4),
+            'us_per_case': round(best / len(corpus) * 1e6, 1)}
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Vocabulary parser benchmark')
+    arg_parser.add_argument('--size', type=int, default=200)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+    corpus = build_corpus(seed=args.seed, size=args.size)
+    results = {
+        'single_pass': run(parse_word_objects, corpus, args.repeat),
+        'legacy_chain': run(legacy_parse, corpus, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,214 @@
+"""Concurrent load test of the hot read endpoints against a synthetic database.
+
+Builds (or reuses) a synthetic word.db, serves an app created for it (create_app) on a local
+threaded server, and drives each scenario with N concurrent clients. Results
+(latency percentiles, throughput, errors, dataset and environment) are written as JSON so
+two runs can be diffed:
+
+    python -m benchmarks.load_test --size small --clients 8 --requests 500 --output before.json
+    python -m benchmarks.load_test --size small --clients 8 --requests 500 --output after.json --compare before.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic_db import SIZES, build_database, search_terms
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scenarios(groups, seed=0):
+    """name -> fn(rng) returning the request path; one entry per hot endpoint."""
+    terms = search_terms(seed)
+    return {
+        'words_search': lambda rng: '/api/words/?' + urllib.parse.urlencode(
+            {'search': rng.choice(terms), 'page': rng.randint(1, 3), 'per_page': 20}),
+        'group_words': lambda rng: f'/api/groups/{rng.randint(1, groups)}/words?page=1&per_page=20',
+        'all_groups_stats': lambda rng: '/api/word_progress/all-groups/stats',
+        'dashboard_quick_stats': lambda rng: '/api/dashboard/quick_stats',
+        'dashboard_study_progress': lambda rng: '/api/dashboard/study_progress',
+        'dashboard_performance_graph': lambda rng: '/api/dashboard/performance_graph',
+        'dashboard_last_session': lambda rng: '/api/dashboard/last_session',
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def run_scenario(base_url, make_path, clients, requests, warmup=0, seed=0, timeout=60):
+    """Send `requests` GETs from `clients` threads; returns the summary dict."""
+    counter = iter(range(warmup + requests))
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + make_path(rng), timeout=timeout) as response:
+                    response.read()
+                ok = response.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            duration = time.perf_counter() - start
+            if n < warmup:
+                continue
+            with lock:
+                if ok:
+                    latencies.append(duration)
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(clients)))
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+class LocalServer:
+    """The Flask app on a threaded werkzeug server bound to an ephemeral port."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def run_load(app, groups, clients=8, requests=200, warmup=20, only=None, seed=0):
+    results = {}
+    with LocalServer(app) as server:
+        for name, make_path in scenarios(groups, seed).items():
+            if only and name not in only:
+                continue
+            results[name] = run_scenario(server.url, make_path, clients, requests, warmup, seed)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(current, baseline):
+    """Per-scenario ratio current/baseline for p50, p95, p99 and throughput (>1 latency = slower)."""
+    diff = {}
+    for name, stats in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        diff[name] = {key: round(stats[key] / before[key], 3)
+                      for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+                      if stats.get(key) and before.get(key)}
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the hot read endpoints')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--words', type=int)
+    parser.add_argument('--groups', type=int)
+    parser.add_argument('--review-items', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='synthetic database to reuse (built when missing)')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild --db even if it exists')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--output', help='write the JSON results here')
+    parser.add_argument('--compare', help='baseline JSON results to diff against')
+    args = parser.parse_args()
+
+    size = dict(SIZES[args.size])
+    for key in size:
+        if getattr(args, key) is not None:
+            size[key] = getattr(args, key)
+    path = os.path.abspath(args.db or os.path.join(tempfile.gettempdir(),
+                                                   'bench_{words}w_{groups}g_{review_items}r.db'.format(**size)))
+    meta_path = path + '.json'
+    dataset = None
+    if not args.rebuild and os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            dataset = json.load(f)
+        if any(dataset.get(key) != value for key, value in size.items()) or dataset.get('seed') != args.seed:
+            dataset = None
+    if dataset is None:
+        dataset = build_database(path, seed=args.seed, **size)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f)
+
+    from app import create_app
+    app = create_app({'DATABASE_URL': None, 'DATABASE_PATH': path})
+
+    results = {
+        'environment': environment(),
+        'dataset': {**dataset, 'path': path, 'bytes': os.path.getsize(path)},
+        'load': {'clients': args.clients, 'requests': args.requests, 'warmup': args.warmup},
+        'scenarios': run_load(app, size['groups'], args.clients, args.requests, args.warmup,
+                              args.scenario, args.seed),
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            results['compare'] = {'baseline': args.compare, 'ratios': compare(results, json.load(f))}
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
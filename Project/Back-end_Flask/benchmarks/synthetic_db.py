@@ -0,0 +1,171 @@
+"""Deterministic synthetic word.db for load tests.
+
+The schema comes from Database.setup_tables and study activities from the seed file, so the
+generated file is exactly what the app opens. Rows are bulk-inserted with executemany; the
+words_count triggers are dropped during the load (each fires a COUNT over word_groups) and
+recreated afterwards, with words_count recomputed once. With --users N, progress, sessions and
+reviews are spread over N learners (the first is the default user the load test acts as), so
+per-user queries can be measured against a table holding everybody's rows.
+
+Usage: python -m benchmarks.synthetic_db out.db [--size medium] [--words N] [--groups N] [--review-items N] [--users N]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from models.backends.sqlite import COUNT_TRIGGERS
+from models.database import Database, SCHEMA_VERSION
+from models.user_context import DEFAULT_USER_ID
+
+SIZES = {
+    'small': {'words': 10_000, 'groups': 1_000, 'review_items': 100_000},
+    'medium': {'words': 100_000, 'groups': 10_000, 'review_items': 1_000_000},
+    'large': {'words': 1_000_000, 'groups': 10_000, 'review_items': 5_000_000},
+}
+
+SYLLABLES = ['a', 'i', 'u', 'e', 'o', 'ka', 'ki', 'ku', 'ke', 'ko', 'sa', 'shi', 'su', 'se', 'so',
+             'ta', 'chi', 'tsu', 'te', 'to', 'na', 'ni', 'nu', 'ne', 'no', 'ha', 'hi', 'fu', 'he', 'ho',
+             'ma', 'mi', 'mu', 'me', 'mo', 'ya', 'yu', 'yo', 'ra', 'ri', 'ru', 're', 'ro', 'wa', 'n']
+VIETNAMESE = ['nước', 'trà', 'ăn', 'uống', 'học', 'trường', 'giáo viên', 'núi', 'sông', 'nhà', 'đi',
+              'đến', 'mua', 'bán', 'đẹp', 'lớn', 'nhỏ', 'mới', 'cũ', 'thời gian', 'bạn', 'sách']
+JLPT_LEVELS = ['N5', 'N4', 'N3', 'N2', 'N1']
+STATUSES = ['new', 'learning', 'learned']
+REVIEWS_PER_SESSION = 50
+BATCH_SIZE = 10_000
+
+
+def make_word(rng):
+    kanji = ''.join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(1, 3)))
+    syllables = [rng.choice(SYLLABLES) for _ in kanji]
+    parts = [{'kanji': k, 'romaji': [s]} for k, s in zip(kanji, syllables)]
+    vietnamese = ' '.join(rng.sample(VIETNAMESE, rng.randint(1, 2)))
+    return kanji, ''.join(syllables), vietnamese, json.dumps(parts, ensure_ascii=False)
+
+
+def search_terms(seed=0, count=50):
+    """Search strings the load test sends to /api/words?search= (romaji, Vietnamese, JLPT level)."""
+    rng = random.Random(seed + 1)
+    terms = [rng.choice(SYLLABLES) + rng.choice(SYLLABLES) for _ in range(count // 2)]
+    terms += [rng.choice(VIETNAMESE) for _ in range(count - len(terms) - 5)]
+    return terms + JLPT_LEVELS
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(cursor, sql, rows):
+    total = 0
+    for batch in _batches(rows):
+        cursor.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def user_ids(users):
+    return [DEFAULT_USER_ID] + [f'user{i}' for i in range(1, users)]
+
+
+def build_database(path, words, groups, review_items, seed=0, users=1):
+    """Create path with the given row counts; returns the counts actually written and the build time."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    with Flask(__name__).app_context():
+        db = Database(os.path.abspath(path))
+        conn = db.get()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        cursor = conn.cursor()
+        db.setup_tables(cursor)
+        db.migrate(cursor, 0)
+        db.import_study_activities_json(cursor, 'seed/study_activities.json')
+        activity_ids = [row[0] for row in conn.execute('SELECT id FROM study_activities')]
+        for trigger in COUNT_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+        _insert(cursor, 'INSERT INTO groups (id, name, description) VALUES (?, ?, ?)',
+                ((i, f'Group {i}', f'Synthetic group {i}') for i in range(1, groups + 1)))
+        _insert(cursor, 'INSERT INTO words (id, kanji, romaji, vietnamese, parts) VALUES (?, ?, ?, ?, ?)',
+                ((i, *make_word(rng)) for i in range(1, words + 1)))
+        _insert(cursor, 'INSERT INTO jlpt_levels (word_id, level) VALUES (?, ?)',
+                ((i, rng.choice(JLPT_LEVELS)) for i in range(1, words + 1)))
+
+        # Every word in one group, a third of them in a second one
+        def memberships():
+            for word_id in range(1, words + 1):
+                first = rng.randint(1, groups)
+                yield word_id, first
+                if groups > 1 and rng.random() < 0.33:
+                    second = rng.randint(1, groups)
+                    if second != first:
+                        yield word_id, second
+        word_groups = _insert(cursor, 'INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)', memberships())
+
+        now = datetime.utcnow()
+        learners = user_ids(users)
+        progress = _insert(cursor, 'INSERT INTO word_progress (user_id, word_id, status, last_studied_at) '
+                                   'VALUES (?, ?, ?, ?)',
+                           ((user_id, i, rng.choice(STATUSES),
+                             (now - timedelta(minutes=rng.randint(0, 525_600))).isoformat())
+                            for user_id in learners for i in range(1, words + 1) if rng.random() < 0.6))
+
+        sessions = max(1, review_items // REVIEWS_PER_SESSION)
+        # No extra draws for a single user, so --users 1 yields the same dataset as before
+        session_users = [rng.choice(learners) for _ in range(sessions)] if users > 1 else learners * sessions
+        _insert(cursor, 'INSERT INTO study_sessions (id, user_id, group_id, study_activity_id, created_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                ((i, session_users[i - 1], rng.randint(1, groups), rng.choice(activity_ids),
+                  (now - timedelta(minutes=rng.randint(0, 525_600))).strftime('%Y-%m-%d %H:%M:%S'))
+                 for i in range(1, sessions + 1)))
+        _insert(cursor, 'INSERT INTO word_review_items (user_id, session_id, word_id, is_correct) VALUES (?, ?, ?, ?)',
+                ((session_users[min(i // REVIEWS_PER_SESSION, sessions - 1)], i // REVIEWS_PER_SESSION + 1,
+                  rng.randint(1, words), rng.random() < 0.7)
+                 for i in range(review_items)))
+
+        conn.execute('UPDATE groups SET words_count = '
+                     '(SELECT COUNT(*) FROM word_groups WHERE group_id = groups.id)')
+        db.setup_tables(cursor)  # recreate the triggers
+        db.backend.set_schema_version(conn, SCHEMA_VERSION)
+        conn.commit()
+        conn.execute('PRAGMA journal_mode=DELETE')
+        db.close()
+    return {
+        'words': words, 'groups': groups, 'word_groups': word_groups, 'word_progress': progress,
+        'study_sessions': sessions, 'review_items': review_items, 'users': users, 'seed': seed,
+        'build_seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a synthetic word.db')
+    parser.add_argument('path')
+    parser.add_argument('--size', choices=sorted(SIZES), default='medium')
+    parser.add_argument('--words', type=int)
+    parser.add_argument('--groups', type=int)
+    parser.add_argument('--review-items', type=int)
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    size = dict(SIZES[args.size])
+    for key in size:
+        if getattr(args, key) is not None:
+            size[key] = getattr(args, key)
+    print(json.dumps(build_database(args.path, seed=args.seed, users=args.users, **size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
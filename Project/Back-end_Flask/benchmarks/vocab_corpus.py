@@ -0,0 +1,115 @@
+"""Deterministic corpus of malformed vocabulary responses, shaped like real LLM output.
+
+Each case is (name, text, expected_kanji): the kanji, in order, that a correct parser
+should recover from the text.
+"""
+import json
+import random
+
+BASE_WORDS = [
+    ("水", "mizu", "nước", [("水", ["mi", "zu"])]),
+    ("茶", "cha", "trà", [("茶", ["cha"])]),
+    ("食べる", "taberu", "ăn", [("食", ["ta"]), ("べ", ["be"]), ("る", ["ru"])]),
+    ("ラーメン", "rāmen", "mì ramen", [("ラ", ["ra"]), ("ー", ["ā"]), ("メ", ["me"]), ("ン", ["n"])]),
+    ("富士", "fuji", "Núi Phú Sĩ", [("富", ["fu"]), ("士", ["ji"])]),
+    ("日本", "nihon", "Nhật Bản", [("日", ["ni"]), ("本", ["hon"])]),
+    ("学校", "gakkō", "trường học {cấp 1}", [("学", ["gak"]), ("校", ["kō"])]),
+    ("先生", "sensei", "giáo viên \"thầy\"", [("先", ["sen"]), ("生", ["sei"])]),
+]
+
+
+def make_word(kanji, romaji, vietnamese, parts, jlpt_level="N5"):
+    return {"kanji": kanji, "romaji": romaji, "vietnamese": vietnamese, "jlpt_level": jlpt_level,
+            "parts": [{"kanji": k, "romaji": r} for k, r in parts]}
+
+
+def _single_quoted(word):
+    text = json.dumps(word, ensure_ascii=False)
+    # Only safe for words without quotes/apostrophes inside values
+    return text.replace('"', "'")
+
+
+def _bare_keys(word):
+    text = json.dumps(word, ensure_ascii=False, indent=2)
+    for key in ("kanji", "romaji", "vietnamese", "jlpt_level", "parts"):
+        text = text.replace(f'"{key}":', f'{key}:')
+    return text
+
+
+def _trailing_commas(word):
+    text = json.dumps(word, ensure_ascii=False, indent=2)
+    return text.replace('\n}', ',\n}').replace('\n  ]', ',\n  ]')
+
+
+def _commented(word):
+    text = json.dumps(word, ensure_ascii=False, indent=2)
+    return text.replace('"romaji"', '// cách đọc\n  "romaji"', 1).replace('"parts"', '/* tách chữ */ "parts"', 1)
+
+
+STYLES = {
+    'strict': lambda w: json.dumps(w, ensure_ascii=False),
+    'pretty': lambda w: json.dumps(w, ensure_ascii=False, indent=2),
+    'single_quoted': _single_quoted,
+    'bare_keys': _bare_keys,
+    'trailing_commas': _trailing_commas,
+    'commented': _commented,
+}
+
+
+def build_case(rng, index):
+    words = [make_word(*w) for w in rng.sample(BASE_WORDS, rng.randint(2, len(BASE_WORDS)))]
+    style = rng.choice(list(STYLES))
+    if style == 'single_quoted':
+        words = [w for w in words if '"' not in w["vietnamese"] and "'" not in w["vietnamese"]]
+    rendered = [STYLES[style](w) for w in words]
+    expected = [w["kanji"] for w in words]
+    mutations = []
+
+    truncated = rng.random() < 0.25
+    if truncated:
+        # Output cut off by max_tokens in the middle of the last object
+        rendered[-1] = rendered[-1][:rng.randint(5, 40)]
+        expected.pop()
+        mutations.append('truncated')
+    elif rng.random() < 0.3:
+        # The model repeats itself; duplicates must be dropped
+        rendered.append(rendered[0])
+        mutations.append('duplicate')
+    if rng.random() < 0.2:
+        position = rng.randrange(max(len(rendered) - 1, 1) if truncated else len(rendered) + 1)
+        rendered.insert(position, '{"kanji": "thiếu trường", "romaji": "x"}')
+        mutations.append('missing_keys')
+    body = '[\n' + ',\n'.join(rendered)
+    if rng.random() < 0.2:
+        body = '{"words": ' + body
+        mutations.append('wrapper')
+    if not truncated:
+        body += '\n]' + ('}' if 'wrapper' in mutations else '')
+    if rng.random() < 0.5:
+        body = '```json\n' + body + ('' if truncated else '\n```')
+        mutations.append('fenced')
+    if rng.random() < 0.5:
+        body = ('<think>\nNgười dùng muốn danh sách; ví dụ {"kanji": "例", "romaji": "rei", "vietnamese": "ví dụ", '
+                '"jlpt_level": "N5", "parts": []} thì sao?\n</think>\n') + body
+        mutations.append('think')
+    if rng.random() < 0.4:
+        body = "Here's the vocabulary list you asked for:\n" + body + "\nHope this helps {:}!"
+        mutations.append('prose')
+    name = f"{index:03d}-{style}" + ''.join(f"+{m}" for m in mutations)
+    return name, body, expected
+
+
+def build_corpus(seed=0, size=200):
+    rng = random.Random(seed)
+    return [build_case(rng, i) for i in range(size)]
+
+
+def chunked(text, rng, max_chunk=24):
+    """Split text into random-size chunks, as a streaming response would arrive."""
+    chunks = []
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, max_chunk)
+        chunks.append(text[i:i + step])
+        i += step
+    return chunks
@@ -0,0 +1,18 @@
+"""gunicorn settings for wsgi:app.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(max(2, multiprocessing.cpu_count()))))
+# Import the app (schema work, asset preload) once in the master, then fork
+preload_app = True
+
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = 30
+accesslog = '-'
@@ -0,0 +1,49 @@
+"""Storage backends under the model layer.
+
+A backend opens and releases connections, creates the schema and tracks its version; the
+models themselves write portable SQL (`?` placeholders, `INSERT ... RETURNING id`,
+`ON CONFLICT ... DO UPDATE`) that runs on both SQLite and PostgreSQL.
+"""
+import os
+import threading
+
+from .sqlite import SQLiteBackend
+
+POSTGRES_SCHEMES = ('postgres://', 'postgresql://')
+
+_backends = {}
+_lock = threading.Lock()
+# Backends of the parent process after a fork; kept referenced so their pooled connections are
+# never closed (which would end the parent's sessions) from the child.
+_inherited = []
+
+
+def is_postgres_url(url):
+    return bool(url) and url.startswith(POSTGRES_SCHEMES)
+
+
+def get_backend(url):
+    """Process-wide backend for url: a postgresql:// URL or an SQLite file path."""
+    backend = _backends.get(url)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(url)
+            if backend is None:
+                if is_postgres_url(url):
+                    # psycopg is only needed when PostgreSQL is configured
+                    from .postgres import PostgresBackend
+                    backend = PostgresBackend(url)
+                else:
+                    backend = SQLiteBackend(url)
+                _backends[url] = backend
+    return backend
+
+
+def _reset_after_fork():
+    global _lock
+    _inherited.extend(_backends.values())
+    _backends.clear()
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
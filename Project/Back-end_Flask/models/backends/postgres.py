@@ -0,0 +1,227 @@
+"""PostgreSQL storage backend (DATABASE_URL=postgresql://...).
+
+Connections come from a psycopg_pool.ConnectionPool (PG_POOL_MIN_SIZE..PG_POOL_MAX_SIZE) and
+go back to it when the app context ends. Models keep writing SQLite-style `?` placeholders;
+the cursors installed here rewrite them to psycopg's `%s` before executing. Large result sets
+can be read through a named (server-side) cursor, see Database.iterate.
+"""
+import itertools
+import os
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+# Same tables as the SQLite schema. Timestamps stay TEXT ('YYYY-MM-DD HH:MM:SS', like SQLite's
+# CURRENT_TIMESTAMP) so both backends return identical JSON.
+# words_count of a group follows its word_groups rows (deleting a word cascades here too).
+# Incremental, so a bulk import pays O(1) per membership and never has to disable it.
+WORDS_COUNT_TRIGGER = '''
+    CREATE OR REPLACE FUNCTION update_group_words_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE groups SET words_count = words_count - 1 WHERE id = OLD.group_id;
+        ELSE
+            UPDATE groups SET words_count = words_count + 1 WHERE id = NEW.group_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS update_group_words_count ON word_groups;
+    CREATE TRIGGER update_group_words_count
+    AFTER INSERT OR DELETE ON word_groups
+    FOR EACH ROW EXECUTE FUNCTION update_group_words_count();
+'''
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS words (
+        id SERIAL PRIMARY KEY,
+        kanji TEXT NOT NULL,
+        romaji TEXT NOT NULL,
+        vietnamese TEXT NOT NULL,
+        parts TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS groups (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        words_count INTEGER DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS word_groups (
+        word_id INTEGER NOT NULL REFERENCES words(id) ON DELETE CASCADE,
+        group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+        PRIMARY KEY (word_id, group_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS study_activities (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        url TEXT NOT NULL,
+        preview_url TEXT,
+        description TEXT,
+        release_date TEXT,
+        average_duration INTEGER,
+        -- The seed data stores a topic ('verbs') here; SQLite's INTEGER affinity lets it through
+        focus TEXT
+    );
+
+    -- No foreign keys: the seed sessions point at groups that only exist in the sample data,
+    -- and SQLite (foreign_keys off) never enforced them either
+    CREATE TABLE IF NOT EXISTS study_sessions (
+        id SERIAL PRIMARY KEY,
+        group_id INTEGER NOT NULL,
+        study_activity_id INTEGER NOT NULL,
+        created_at TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+    );
+
+    CREATE TABLE IF NOT EXISTS word_review_items (
+        id SERIAL PRIMARY KEY,
+        session_id INTEGER NOT NULL REFERENCES study_sessions(id) ON DELETE CASCADE,
+        word_id INTEGER NOT NULL REFERENCES words(id) ON DELETE CASCADE,
+        is_correct BOOLEAN NOT NULL,
+        created_at TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+    );
+
+    CREATE TABLE IF NOT EXISTS jlpt_levels (
+        word_id INTEGER PRIMARY KEY REFERENCES words(id) ON DELETE CASCADE,
+        level TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS word_progress (
+        id SERIAL PRIMARY KEY,
+        word_id INTEGER NOT NULL REFERENCES words(id) ON DELETE CASCADE,
+        status TEXT NOT NULL CHECK (status IN ('new', 'learning', 'learned')),
+        last_studied_at TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER NOT NULL
+    );
+
+''' + WORDS_COUNT_TRIGGER
+
+
+# Version 2, see the SQLite backend
+MIGRATIONS = {
+    2: '''
+        ALTER TABLE word_progress ADD COLUMN IF NOT EXISTS user_id TEXT NOT NULL DEFAULT 'default';
+        ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS user_id TEXT NOT NULL DEFAULT 'default';
+        ALTER TABLE word_review_items ADD COLUMN IF NOT EXISTS user_id TEXT NOT NULL DEFAULT 'default';
+        CREATE INDEX IF NOT EXISTS idx_word_progress_user_word ON word_progress (user_id, word_id);
+        CREATE INDEX IF NOT EXISTS idx_word_progress_user_status ON word_progress (user_id, status);
+        CREATE INDEX IF NOT EXISTS idx_study_sessions_user_created ON study_sessions (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_study_sessions_user_group ON study_sessions (user_id, group_id);
+        CREATE INDEX IF NOT EXISTS idx_study_sessions_user_activity ON study_sessions (user_id, study_activity_id);
+        CREATE INDEX IF NOT EXISTS idx_word_review_items_user_session ON word_review_items (user_id, session_id);
+        CREATE INDEX IF NOT EXISTS idx_word_review_items_user_word ON word_review_items (user_id, word_id);
+    ''',
+    # Version 3: incremental words_count trigger
+    3: WORDS_COUNT_TRIGGER,
+}
+
+_LITERALS = re.compile(r"('(?:[^']|'')*')")
+
+
+@lru_cache(maxsize=1024)
+def qmark_to_format(sql):
+    """Rewrite `?` placeholders to `%s` (and escape literal `%`), leaving quoted strings alone."""
+    parts = _LITERALS.split(sql)
+    for i, part in enumerate(parts):
+        part = part.replace('%', '%%')
+        parts[i] = part if i % 2 else part.replace('?', '%s')
+    return ''.join(parts)
+
+
+class QmarkCursor(psycopg.Cursor):
+    def execute(self, query, params=None, **kwargs):
+        return super().execute(qmark_to_format(query) if params is not None else query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        return super().executemany(qmark_to_format(query), params_seq, **kwargs)
+
+
+class QmarkServerCursor(psycopg.ServerCursor):
+    def execute(self, query, params=None, **kwargs):
+        return super().execute(qmark_to_format(query) if params is not None else query, params, **kwargs)
+
+
+def _configure(connection):
+    connection.cursor_factory = QmarkCursor
+    connection.server_cursor_factory = QmarkServerCursor
+
+
+class PostgresBackend:
+    name = 'postgresql'
+
+    def __init__(self, url, min_size=None, max_size=None):
+        self.url = url
+        self.pool = ConnectionPool(
+            url,
+            min_size=min_size or int(os.getenv('PG_POOL_MIN_SIZE', '1')),
+            max_size=max_size or int(os.getenv('PG_POOL_MAX_SIZE', '10')),
+            timeout=float(os.getenv('PG_POOL_TIMEOUT', '30')),
+            configure=_configure,
+            name='japanese-portal',
+            open=True,
+        )
+        self._cursor_ids = itertools.count()
+
+    def exists(self):
+        with self.pool.connection() as connection:
+            return connection.execute("SELECT to_regclass('words')").fetchone()[0] is not None
+
+    def connect(self, read_only=False):
+        connection = self.pool.getconn()
+        # Only settable between transactions; the pool hands out idle connections
+        connection.read_only = read_only
+        return connection
+
+    def release(self, connection):
+        # Like closing an SQLite connection: whatever the request did not commit is dropped
+        connection.rollback()
+        self.pool.putconn(connection)
+
+    def streaming_cursor(self, connection):
+        """Named cursor: rows stay on the server and arrive fetchmany() batch by batch."""
+        return connection.cursor(name=f'stream_{os.getpid()}_{next(self._cursor_ids)}')
+
+    def setup_tables(self, cursor):
+        cursor.execute(SCHEMA)
+
+    def migrate(self, cursor, version):
+        """Upgrade tables created by SCHEMA at `version` to the current layout (idempotent)."""
+        for target in sorted(MIGRATIONS):
+            if version < target:
+                cursor.execute(MIGRATIONS[target])
+
+    @contextmanager
+    def bulk_load(self, connection):
+        """One transaction for a bulk import; explicit word ids are allowed. The words_count
+        trigger stays enabled (no table lock, other sessions keep writing); the caller still recomputes
+        words_count before leaving the block."""
+        try:
+            yield
+            connection.execute("SELECT setval(pg_get_serial_sequence('words', 'id'), "
+                               "COALESCE((SELECT MAX(id) FROM words), 1))")
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def schema_version(self, connection):
+        if connection.execute("SELECT to_regclass('schema_version')").fetchone()[0] is None:
+            return 0
+        row = connection.execute('SELECT MAX(version) FROM schema_version').fetchone()
+        return row[0] or 0
+
+    def set_schema_version(self, connection, version):
+        connection.execute('DELETE FROM schema_version')
+        connection.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,196 @@
+"""SQLite storage backend: one database file, a connection per app context."""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+TABLES = '''
+    -- Create words table
+    CREATE TABLE IF NOT EXISTS words (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kanji TEXT NOT NULL,
+        romaji TEXT NOT NULL,
+        vietnamese TEXT NOT NULL,
+        parts TEXT NOT NULL
+    );
+
+    -- Create groups table
+    CREATE TABLE IF NOT EXISTS groups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        words_count INTEGER DEFAULT 0
+    );
+
+    -- Create word_groups table (for many-to-many relationship)
+    CREATE TABLE IF NOT EXISTS word_groups (
+        word_id INTEGER NOT NULL,
+        group_id INTEGER NOT NULL,
+        PRIMARY KEY (word_id, group_id),
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE,
+        FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
+    );
+
+    -- Create study_activities table
+    CREATE TABLE IF NOT EXISTS study_activities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        url TEXT NOT NULL,
+        preview_url TEXT,
+        description TEXT,
+        release_date DATE,
+        average_duration INTEGER,
+        focus INTEGER,
+        FOREIGN KEY (focus) REFERENCES groups(id)
+    );
+
+    -- Create study_sessions table
+    CREATE TABLE IF NOT EXISTS study_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_id INTEGER NOT NULL,
+        study_activity_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (group_id) REFERENCES groups(id),
+        FOREIGN KEY (study_activity_id) REFERENCES study_activities(id)
+    );
+
+    -- Create word_review_items table
+    CREATE TABLE IF NOT EXISTS word_review_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        word_id INTEGER NOT NULL,
+        is_correct BOOLEAN NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES study_sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    );
+
+    -- Create jlpt_levels table
+    CREATE TABLE IF NOT EXISTS jlpt_levels (
+        word_id INTEGER PRIMARY KEY,
+        level TEXT NOT NULL,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    );
+
+    -- Create word_progress table
+    CREATE TABLE IF NOT EXISTS word_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word_id INTEGER NOT NULL,
+        status TEXT NOT NULL CHECK(status IN ('new', 'learning', 'learned')),
+        last_studied_at DATETIME,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    );
+'''
+
+# words_count of each group; dropped and recreated around bulk loads (see bulk_load)
+COUNT_TRIGGERS = {
+    'update_group_words_count_insert': '''
+    CREATE TRIGGER IF NOT EXISTS update_group_words_count_insert
+    AFTER INSERT ON word_groups
+    BEGIN
+        UPDATE groups 
+        SET words_count = (
+            SELECT COUNT(*) 
+            FROM word_groups 
+            WHERE group_id = NEW.group_id
+        )
+        WHERE id = NEW.group_id;
+    END''',
+    'update_group_words_count_delete': '''
+    CREATE TRIGGER IF NOT EXISTS update_group_words_count_delete
+    AFTER DELETE ON word_groups
+    BEGIN
+        UPDATE groups 
+        SET words_count = (
+            SELECT COUNT(*) 
+            FROM word_groups 
+            WHERE group_id = OLD.group_id
+        )
+        WHERE id = OLD.group_id;
+    END''',
+    # Update words_count when a word is completely deleted from database
+    'update_groups_words_count_on_word_delete': '''
+    CREATE TRIGGER IF NOT EXISTS update_groups_words_count_on_word_delete
+    AFTER DELETE ON words
+    BEGIN
+        UPDATE groups 
+        SET words_count = (
+            SELECT COUNT(*) 
+            FROM word_groups 
+            WHERE group_id = groups.id
+        );
+    END''',
+}
+
+SCHEMA = TABLES + ''.join(f'{trigger};\n' for trigger in COUNT_TRIGGERS.values())
+
+# Version 2: progress, sessions and reviews belong to a user; every per-user query can seek
+# on an index leading on user_id instead of scanning all users' rows
+USER_TABLES = ('word_progress', 'study_sessions', 'word_review_items')
+USER_INDEXES = '''
+    CREATE INDEX IF NOT EXISTS idx_word_progress_user_word ON word_progress (user_id, word_id);
+    CREATE INDEX IF NOT EXISTS idx_word_progress_user_status ON word_progress (user_id, status);
+    CREATE INDEX IF NOT EXISTS idx_study_sessions_user_created ON study_sessions (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_study_sessions_user_group ON study_sessions (user_id, group_id);
+    CREATE INDEX IF NOT EXISTS idx_study_sessions_user_activity ON study_sessions (user_id, study_activity_id);
+    CREATE INDEX IF NOT EXISTS idx_word_review_items_user_session ON word_review_items (user_id, session_id);
+    CREATE INDEX IF NOT EXISTS idx_word_review_items_user_word ON word_review_items (user_id, word_id);
+'''
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self, read_only=False):
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def release(self, connection):
+        connection.close()
+
+    def streaming_cursor(self, connection):
+        # sqlite3 steps through the result as fetchmany() asks for rows
+        return connection.cursor()
+
+    def setup_tables(self, cursor):
+        cursor.executescript(SCHEMA)
+
+    @contextmanager
+    def bulk_load(self, connection):
+        """One write transaction for a bulk import with the per-row words_count triggers dropped;
+        the caller recomputes words_count before leaving the block."""
+        # Explicit BEGIN: the module would otherwise autocommit the DROP TRIGGERs on their own
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for name in COUNT_TRIGGERS:
+                connection.execute(f'DROP TRIGGER IF EXISTS {name}')
+            yield
+            for trigger in COUNT_TRIGGERS.values():
+                connection.execute(trigger)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def migrate(self, cursor, version):
+        """Upgrade tables created by SCHEMA at `version` to the current layout (idempotent)."""
+        if version < 2:
+            for table in USER_TABLES:
+                columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+                if 'user_id' not in columns:
+                    # Existing rows become the default user's (models/user_context.py)
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'")
+            cursor.executescript(USER_INDEXES)
+        # Version 3 only changed the PostgreSQL words_count trigger
+
+    def schema_version(self, connection):
+        return connection.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_schema_version(self, connection, version):
+        connection.execute(f'PRAGMA user_version = {int(version)}')
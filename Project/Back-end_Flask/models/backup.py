@@ -0,0 +1,386 @@
+"""Online backups of the SQLite database.
+
+Backups use the sqlite3 backup API. A database in WAL mode is copied in one step: that is a single
+read transaction, which never blocks writers, while a step-wise copy would start over after every
+commit made between two steps. A rollback-journal database (where a reader does hold off writers)
+is copied PAGES_PER_STEP pages at a time with a sleep between steps, so a writer waits at most one
+step; if writes keep restarting the copy MAX_RESTARTS times, it is finished in one step. The copy
+is written to a temporary file, checked with PRAGMA quick_check and renamed to
+<db name>-<UTC timestamp>[-label].db in the backup directory, next to a .json manifest holding
+its size, SHA-256, schema version and row counts. Only the newest BACKUP_KEEP backups are kept.
+
+Restores verify the backup (integrity_check, checksum) first, save the current database as a
+'pre-restore' backup and copy the backup into the live file through the same API in a single
+step, so connections see either the old or the restored database.
+
+    python -m models.backup create [--label before-import]
+    python -m models.backup list
+    python -m models.backup verify backups/word-20250101T000000.000000Z.db
+    python -m models.backup restore backups/word-20250101T000000.000000Z.db
+    python -m models.backup prune --keep 3
+    python -m models.backup schedule --interval 3600 --keep 24
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from .database import BASE_DIR, Database
+from .snapshot import read_only_uri
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+MAX_RESTARTS = 3
+COUNTED_TABLES = ('words', 'groups', 'word_groups', 'jlpt_levels', 'word_progress', 'study_activities',
+                  'study_sessions', 'word_review_items')
+
+
+class BackupError(Exception):
+    """A backup could not be taken, verified or restored."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_dir():
+    """Backup directory of the current app (config BACKUP_DIR), else $BACKUP_DIR, else ./backups."""
+    directory = current_app.config.get('BACKUP_DIR') if has_app_context() else None
+    return os.path.join(BASE_DIR, directory or os.getenv('BACKUP_DIR', 'backups'))
+
+
+def backup_keep():
+    keep = current_app.config.get('BACKUP_KEEP') if has_app_context() else None
+    return int(keep or os.getenv('BACKUP_KEEP', '7'))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _counts(connection):
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in COUNTED_TABLES if table in tables}
+
+
+def _stem(source):
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+class BackupManager:
+    def __init__(self, directory, keep=7, pages_per_step=PAGES_PER_STEP, sleep=STEP_SLEEP):
+        self.directory = directory
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.sleep = sleep
+
+    def _copy(self, source_uri, target, pages):
+        """Backup-API copy; returns (steps, longest step in ms). Raises _Restarted when the
+        source changed between steps MAX_RESTARTS times."""
+        src = sqlite3.connect(source_uri, uri=True)
+        dst = sqlite3.connect(target, timeout=30)
+        state = {'steps': 0, 'longest': 0.0, 'last': time.perf_counter(), 'remaining': None, 'restarts': 0}
+
+        def progress(status, remaining, total):
+            now = time.perf_counter()
+            # The sleep between steps is not part of the step
+            step = now - state['last'] - (self.sleep if state['steps'] else 0)
+            state['steps'] += 1
+            state['longest'] = max(state['longest'], step)
+            state['last'] = now
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] >= MAX_RESTARTS:
+                    raise _Restarted()
+            state['remaining'] = remaining
+
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=self.sleep)
+        finally:
+            dst.close()
+            src.close()
+        return state['steps'], round(state['longest'] * 1000, 2)
+
+    def create(self, source, label=None, prune=True):
+        """Back up the database file source now; returns the manifest of the new backup."""
+        if not os.path.exists(source):
+            raise BackupError(f"Database not found: {source}")
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+        name = f"{_stem(source)}-{stamp}" + (f"-{label}" if label else '') + '.db'
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        start = time.perf_counter()
+        try:
+            src = sqlite3.connect(read_only_uri(source), uri=True)
+            try:
+                journal_mode = src.execute('PRAGMA journal_mode').fetchone()[0]
+            finally:
+                src.close()
+            mode = 'snapshot' if journal_mode == 'wal' else 'incremental'
+            try:
+                steps, longest = self._copy(read_only_uri(source), tmp_path,
+                                            -1 if mode == 'snapshot' else self.pages_per_step)
+            except _Restarted:
+                logger.info("backup of %s kept restarting under writes, copying in one step", source)
+                mode = 'restarted'
+                steps, longest = self._copy(read_only_uri(source), tmp_path, -1)
+            conn = sqlite3.connect(tmp_path)
+            try:
+                # Self-contained file: no -wal/-shm beside it
+                conn.execute('PRAGMA journal_mode=DELETE')
+                check = conn.execute('PRAGMA quick_check').fetchone()[0]
+                if check != 'ok':
+                    raise BackupError(f"Backup of {source} failed quick_check: {check}")
+                manifest = {
+                    'file': name,
+                    'source': os.path.abspath(source),
+                    'label': label,
+                    # snapshot (WAL, one read transaction), incremental, or restarted (finished in one step)
+                    'mode': mode,
+                    'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                    'schema_version': conn.execute('PRAGMA user_version').fetchone()[0],
+                    'pages': conn.execute('PRAGMA page_count').fetchone()[0],
+                    'counts': _counts(conn),
+                }
+            finally:
+                conn.close()
+            manifest.update(bytes=os.path.getsize(tmp_path), sha256=_sha256(tmp_path), steps=steps,
+                            longest_step_ms=longest, duration_ms=round((time.perf_counter() - start) * 1000, 1))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with open(path + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.json.tmp', path + '.json')
+        logger.info("backup created file=%s bytes=%d duration_ms=%.1f longest_step_ms=%.2f", name,
+                    manifest['bytes'], manifest['duration_ms'], longest)
+        if prune and self.keep:
+            self.prune(source)
+        return {**manifest, 'path': path}
+
+    def list(self, source=None):
+        """Manifests of the backups (of source only, if given), newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        prefix = f"{_stem(source)}-" if source else ''
+        manifests = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith('.db.json'):
+                path = os.path.join(self.directory, name[:-len('.json')])
+                with open(path + '.json', encoding='utf-8') as f:
+                    manifests.append({**json.load(f), 'path': path})
+        return sorted(manifests, key=lambda manifest: manifest['file'], reverse=True)
+
+    def prune(self, source, keep=None):
+        """Delete all but the newest keep backups of source; returns the deleted files."""
+        keep = self.keep if keep is None else keep
+        removed = []
+        for manifest in self.list(source)[keep:]:
+            for path in (manifest['path'], manifest['path'] + '.json'):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(manifest['file'])
+        if removed:
+            logger.info("backups pruned source=%s removed=%s", source, removed)
+        return removed
+
+    def verify(self, path):
+        """Full integrity_check of a backup plus its checksum and row counts against the manifest."""
+        if not os.path.exists(path):
+            raise BackupError(f"Backup not found: {path}")
+        manifest = None
+        if os.path.exists(path + '.json'):
+            with open(path + '.json', encoding='utf-8') as f:
+                manifest = json.load(f)
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
+        try:
+            problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+            counts = _counts(conn)
+        finally:
+            conn.close()
+        errors = [] if problems == ['ok'] else [f"integrity_check: {problem}" for problem in problems]
+        if 'words' not in counts:
+            errors.append('no words table')
+        if manifest is not None:
+            if _sha256(path) != manifest['sha256']:
+                errors.append('checksum does not match the manifest')
+            if counts != manifest['counts']:
+                errors.append('row counts do not match the manifest')
+        return {'path': path, 'ok': not errors, 'errors': errors, 'counts': counts, 'manifest': manifest}
+
+    def restore(self, path, target):
+        """Replace the contents of the database file target with a verified backup."""
+        report = self.verify(path)
+        if not report['ok']:
+            raise BackupError(f"Refusing to restore {path}: {'; '.join(report['errors'])}")
+        start = time.perf_counter()
+        # Pruned only after the restore, which could otherwise delete the backup being restored
+        previous = self.create(target, label='pre-restore', prune=False)['file'] if os.path.exists(target) else None
+        # One step: the target is locked once and switches to the backup atomically
+        self._copy(read_only_uri(path), target, -1)
+        conn = sqlite3.connect(target)
+        try:
+            check = conn.execute('PRAGMA quick_check').fetchone()[0]
+            counts = _counts(conn)
+        finally:
+            conn.close()
+        if check != 'ok' or counts != report['counts']:
+            raise BackupError(f"Restored {target} does not match {path} (quick_check={check}); "
+                              f"the previous database is saved as {previous}")
+        if self.keep:
+            self.prune(target)
+        duration = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("backup restored file=%s target=%s previous=%s duration_ms=%.1f", path, target, previous,
+                    duration)
+        return {'restored': os.path.basename(path), 'target': target, 'previous': previous, 'counts': counts,
+                'duration_ms': duration}
+
+
+class BackupScheduler:
+    """Daemon thread taking a 'scheduled' backup of source every interval seconds."""
+
+    def __init__(self, manager, source, interval):
+        self.manager = manager
+        self.source = source
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.manager.create(self.source, label='scheduled')
+            except Exception as e:
+                logger.warning("scheduled backup failed source=%s error=%s", self.source, e)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def current_manager():
+    return BackupManager(backup_dir(), keep=backup_keep())
+
+
+def sqlite_database():
+    """File of the configured database; BackupError when it is PostgreSQL (use pg_dump there)."""
+    db = Database()
+    if db.backend.name != 'sqlite':
+        raise BackupError('Online backups cover the SQLite database; back up PostgreSQL with pg_dump')
+    return db.database
+
+
+def init_app(app):
+    """Start scheduled backups of the app's SQLite database when BACKUP_INTERVAL > 0. One
+    scheduler per database and process; in a preforking server it runs in the master only."""
+    interval = float(app.config.get('BACKUP_INTERVAL') or 0)
+    if interval <= 0:
+        return None
+    with app.app_context():
+        source = sqlite_database()
+        manager = current_manager()
+    with _schedulers_lock:
+        scheduler = _schedulers.get(source)
+        if scheduler is None:
+            scheduler = _schedulers[source] = BackupScheduler(manager, source, interval).start()
+    return scheduler
+
+
+def backup_before(action):
+    """Back up the current app's SQLite database before a destructive action when
+    BACKUP_BEFORE_DESTRUCTIVE is set; returns the backup file name or None."""
+    if not current_app.config.get('BACKUP_BEFORE_DESTRUCTIVE'):
+        return None
+    db = Database()
+    if db.backend.name != 'sqlite':
+        return None
+    return current_manager().create(db.database, label=f'pre-{action}')['file']
+
+
+def _reset_after_fork():
+    # Scheduler threads of the parent do not exist in the child
+    global _schedulers_lock
+    _schedulers.clear()
+    _schedulers_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online backups of the SQLite database')
+    parser.add_argument('--db', default=os.path.join(BASE_DIR, os.getenv('DATABASE_PATH', 'word.db')))
+    parser.add_argument('--dir', default=backup_dir())
+    parser.add_argument('--keep', type=int, default=backup_keep())
+    parser.add_argument('--pages-per-step', type=int, default=PAGES_PER_STEP)
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='take a backup now')
+    create.add_argument('--label')
+    commands.add_parser('list', help='list backups, newest first')
+    verify = commands.add_parser('verify', help='check a backup')
+    verify.add_argument('backup')
+    restore = commands.add_parser('restore', help='restore a verified backup into --db')
+    restore.add_argument('backup')
+    prune = commands.add_parser('prune', help='keep only the newest --keep backups')
+    schedule = commands.add_parser('schedule', help='take a backup every --interval seconds')
+    schedule.add_argument('--interval', type=float, required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    manager = BackupManager(args.dir, keep=args.keep, pages_per_step=args.pages_per_step)
+    try:
+        if args.command == 'create':
+            result = manager.create(args.db, label=args.label)
+        elif args.command == 'list':
+            result = manager.list(args.db)
+        elif args.command == 'verify':
+            result = manager.verify(args.backup)
+        elif args.command == 'restore':
+            result = manager.restore(args.backup, args.db)
+        elif args.command == 'prune':
+            result = {'removed': manager.prune(args.db, args.keep)}
+        else:
+            scheduler = BackupScheduler(manager, args.db, args.interval).start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                scheduler.stop()
+            return 0
+    except BackupError as e:
+        print(f"error: {e}")
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if args.command != 'verify' or result['ok'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,30 +1,34 @@
-from .database import Database
+from .database import Database, ReadOnlyDatabase
 from .study_session import StudySession
+from .user_context import resolve_user_id
+from .backup import backup_before
 
 class Dashboard:
     @staticmethod
-    def get_last_study_session():
-        db = Database()
+    def get_last_study_session(user_id=None):
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at 
             FROM study_sessions 
+            WHERE user_id = ?
             ORDER BY created_at DESC 
             LIMIT 1
-        ''')
+        ''', (resolve_user_id(user_id),))
         row = cursor.fetchone()
         return StudySession(*row).__dict__ if row else None
 
     @staticmethod
-    def get_study_progress():
-        db = Database()
+    def get_study_progress(user_id=None):
+        user_id = resolve_user_id(user_id)
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
-        # Lấy tổng số session từ bảng study_sessions
-        cursor.execute('SELECT COUNT(*) FROM study_sessions')
+        # Lấy tổng số session của user từ bảng study_sessions
+        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE user_id = ?', (user_id,))
         total_sessions = cursor.fetchone()[0]
 
         # Lấy tổng số từ đã review (nếu muốn giữ)
-        cursor.execute('SELECT COUNT(DISTINCT word_id) FROM word_review_items')
+        cursor.execute('SELECT COUNT(DISTINCT word_id) FROM word_review_items WHERE user_id = ?', (user_id,))
         total_words = cursor.fetchone()[0]
 
         return {
@@ -35,7 +39,7 @@ class Dashboard:
 
     @staticmethod
     def get_quick_stats():
-        db = Database()
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
         cursor.execute('SELECT COUNT(*) FROM words')
         total_words = cursor.fetchone()[0]
@@ -53,18 +57,19 @@ class Dashboard:
         }
 
     @staticmethod
-    def get_performance_graph():
-        db = Database()
+    def get_performance_graph(user_id=None):
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
         cursor.execute('''
             SELECT 
-                DATE(created_at) as date,
+                SUBSTR(created_at, 1, 10) as date,
                 COUNT(*) as sessions_count
             FROM study_sessions
-            GROUP BY DATE(created_at)
+            WHERE user_id = ?
+            GROUP BY SUBSTR(created_at, 1, 10)
             ORDER BY date DESC
             LIMIT 31
-        ''')
+        ''', (resolve_user_id(user_id),))
         results = cursor.fetchall()
         return [{
             'date': row[0],
@@ -73,19 +78,22 @@ class Dashboard:
         } for row in results]
 
     @staticmethod
-    def full_reset():
-        """Reset all study progress data"""
+    def full_reset(user_id=None):
+        """Reset the study progress data of one user (default: the current one)"""
+        user_id = resolve_user_id(user_id)
+        backup_file = backup_before('reset')
         db = Database()
         cursor = db.cursor()
         
-        # Xóa dữ liệu từ các bảng liên quan
-        cursor.execute('DELETE FROM word_review_items')
-        cursor.execute('DELETE FROM study_sessions')
+        # Xóa dữ liệu của user từ các bảng liên quan
+        cursor.execute('DELETE FROM word_review_items WHERE user_id = ?', (user_id,))
+        cursor.execute('DELETE FROM study_sessions WHERE user_id = ?', (user_id,))
         
         # Commit thay đổi
         db.commit()
         
         return {
             'message': 'All study progress data has been reset successfully',
-            'status': 'success'
+            'status': 'success',
+            'backup': backup_file
         } 
\ No newline at end of file
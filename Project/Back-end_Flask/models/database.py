@@ -1,19 +1,71 @@
 import sqlite3
 import json
 import os
-from flask import g
+import time
+from flask import g, current_app, has_app_context
+from services.metrics import SQL_CONNECT_WAIT
+from .query_metrics import InstrumentedCursor, INSTRUMENTATION_ENABLED, init_app as init_query_metrics
+from .snapshot import snapshots, read_only_uri
+from .backends import get_backend, is_postgres_url
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Bumped with each new step in the backends' migrate(); stored in PRAGMA user_version (SQLite)
+# or the schema_version table (PostgreSQL)
+SCHEMA_VERSION = 3
+
+def configured_database():
+    """Database file of the current app (config DATABASE_PATH), else $DATABASE_PATH, else word.db."""
+    if has_app_context() and current_app.config.get('DATABASE_PATH'):
+        return current_app.config['DATABASE_PATH']
+    return os.getenv('DATABASE_PATH', 'word.db')
+
+def configured_database_url():
+    """PostgreSQL URL of the current app (config DATABASE_URL, which may pin SQLite with None),
+    else $DATABASE_URL; None means SQLite."""
+    if has_app_context() and 'DATABASE_URL' in current_app.config:
+        return current_app.config['DATABASE_URL'] or None
+    return os.getenv('DATABASE_URL') or None
+
+ANALYTICS_MODES = ('wal', 'snapshot', 'primary')
+
+def analytics_mode():
+    """Where ReadOnlyDatabase reads: 'wal' (read-only connection to the WAL database),
+    'snapshot' (periodic backup copy) or 'primary' (the normal read-write connection)."""
+    mode = current_app.config.get('ANALYTICS_DB_MODE') if has_app_context() else None
+    mode = mode or os.getenv('ANALYTICS_DB_MODE', 'wal')
+    if mode not in ANALYTICS_MODES:
+        raise ValueError(f"ANALYTICS_DB_MODE must be one of {ANALYTICS_MODES}, got {mode!r}")
+    return mode
 
 class Database:
-    def __init__(self, database='word.db'):
-        """Initialize database connection with the specified database file."""
-        self.database = os.path.join(os.path.dirname(os.path.dirname(__file__)), database)
+    def __init__(self, database=None):
+        """Initialize database connection with the specified database file or postgresql:// URL
+        (default: configured_database_url(), else the SQLite file configured_database())."""
+        self._database = database
         self.connection = None
 
+    @property
+    def database(self):
+        return os.path.join(BASE_DIR, self._database or configured_database())
+
+    @property
+    def url(self):
+        if self._database:
+            return self._database if is_postgres_url(self._database) else self.database
+        return configured_database_url() or self.database
+
+    @property
+    def backend(self):
+        """Storage backend (see models/backends) for this database."""
+        return get_backend(self.url)
+
     def get(self):
         """Get database connection from Flask context or create new one."""
         if 'db' not in g:
-            g.db = sqlite3.connect(self.database)
-            g.db.row_factory = sqlite3.Row
+            start = time.perf_counter()
+            g.db = self.backend.connect()
+            SQL_CONNECT_WAIT.observe(time.perf_counter() - start)
         return g.db
 
     def commit(self):
@@ -21,139 +73,57 @@ class Database:
         self.get().commit()
 
     def cursor(self):
-        """Get database cursor."""
-        connection = self.get()
-        return connection.cursor()
+        """Get database cursor (timed per request, see query_metrics)."""
+        cursor = self.get().cursor()
+        return InstrumentedCursor(cursor) if INSTRUMENTATION_ENABLED else cursor
+
+    def iterate(self, query, params=(), batch_size=500):
+        """Yield the rows of a large result set batch_size at a time instead of all at once
+        (a server-side cursor on PostgreSQL)."""
+        cursor = self.backend.streaming_cursor(self.get())
+        if INSTRUMENTATION_ENABLED:
+            cursor = InstrumentedCursor(cursor)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def instrument(self, app):
+        """Record query count, time and rows of every request; adds the Server-Timing header."""
+        init_query_metrics(app)
 
     def close(self):
-        """Close database connection."""
-        db = g.pop('db', None)
-        if db is not None:
-            db.close()
+        """Close the database connections of this app context."""
+        for key in ('db', 'analytics_db'):
+            connection = g.pop(key, None)
+            if connection is not None:
+                self.backend.release(connection)
 
     def setup_tables(self, cursor):
         """Create all necessary tables in the database."""
         try:
-            cursor.executescript('''
-                -- Create words table
-                CREATE TABLE IF NOT EXISTS words (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    kanji TEXT NOT NULL,
-                    romaji TEXT NOT NULL,
-                    vietnamese TEXT NOT NULL,
-                    parts TEXT NOT NULL
-                );
-
-                -- Create groups table
-                CREATE TABLE IF NOT EXISTS groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    words_count INTEGER DEFAULT 0
-                );
-
-                -- Create word_groups table (for many-to-many relationship)
-                CREATE TABLE IF NOT EXISTS word_groups (
-                    word_id INTEGER NOT NULL,
-                    group_id INTEGER NOT NULL,
-                    PRIMARY KEY (word_id, group_id),
-                    FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE,
-                    FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
-                );
-
-                -- Create study_activities table
-                CREATE TABLE IF NOT EXISTS study_activities (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL,
-                    preview_url TEXT,
-                    description TEXT,
-                    release_date DATE,
-                    average_duration INTEGER,
-                    focus INTEGER,
-                    FOREIGN KEY (focus) REFERENCES groups(id)
-                );
-
-                -- Create study_sessions table
-                CREATE TABLE IF NOT EXISTS study_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    group_id INTEGER NOT NULL,
-                    study_activity_id INTEGER NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (group_id) REFERENCES groups(id),
-                    FOREIGN KEY (study_activity_id) REFERENCES study_activities(id)
-                );
-
-                -- Create word_review_items table
-                CREATE TABLE IF NOT EXISTS word_review_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    word_id INTEGER NOT NULL,
-                    is_correct BOOLEAN NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES study_sessions(id) ON DELETE CASCADE,
-                    FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-                );
-
-                -- Create jlpt_levels table
-                CREATE TABLE IF NOT EXISTS jlpt_levels (
-                    word_id INTEGER PRIMARY KEY,
-                    level TEXT NOT NULL,
-                    FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-                );
-
-                -- Create word_progress table
-                CREATE TABLE IF NOT EXISTS word_progress (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    word_id INTEGER NOT NULL,
-                    status TEXT NOT NULL CHECK(status IN ('new', 'learning', 'learned')),
-                    last_studied_at DATETIME,
-                    FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-                );
-
-                -- Create triggers to update words_count in groups
-                CREATE TRIGGER IF NOT EXISTS update_group_words_count_insert
-                AFTER INSERT ON word_groups
-                BEGIN
-                    UPDATE groups 
-                    SET words_count = (
-                        SELECT COUNT(*) 
-                        FROM word_groups 
-                        WHERE group_id = NEW.group_id
-                    )
-                    WHERE id = NEW.group_id;
-                END;
-
-                CREATE TRIGGER IF NOT EXISTS update_group_words_count_delete
-                AFTER DELETE ON word_groups
-                BEGIN
-                    UPDATE groups 
-                    SET words_count = (
-                        SELECT COUNT(*) 
-                        FROM word_groups 
-                        WHERE group_id = OLD.group_id
-                    )
-                    WHERE id = OLD.group_id;
-                END;
-
-                -- Trigger to update words_count when a word is completely deleted from database
-                CREATE TRIGGER IF NOT EXISTS update_groups_words_count_on_word_delete
-                AFTER DELETE ON words
-                BEGIN
-                    UPDATE groups 
-                    SET words_count = (
-                        SELECT COUNT(*) 
-                        FROM word_groups 
-                        WHERE group_id = groups.id
-                    );
-                END;
-            ''')
+            self.backend.setup_tables(cursor)
             self.get().commit()
             print("All tables created successfully!")
         except Exception as e:
             print(f"Error creating tables: {str(e)}")
             raise
 
+    def migrate(self, cursor, version):
+        """Upgrade a schema at `version` to SCHEMA_VERSION (see the backends' migrate())."""
+        try:
+            self.backend.migrate(cursor, version)
+            self.get().commit()
+            print(f"Schema migrated from version {version} to {SCHEMA_VERSION}")
+        except Exception as e:
+            print(f"Error migrating schema: {str(e)}")
+            raise
+
     def load_json(self, filepath):
         """Load data from a JSON file."""
         json_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), filepath)
@@ -206,25 +176,24 @@ class Database:
         """Import words from JSON file and add them to a group."""
         try:
             cursor.execute('''
-                INSERT INTO groups (name) VALUES (?)
+                INSERT INTO groups (name) VALUES (?) RETURNING id
             ''', (group_name,))
-            self.get().commit()
-            
-            cursor.execute('SELECT id FROM groups WHERE name = ?', (group_name,))
             group_id = cursor.fetchone()[0]
+            self.get().commit()
             
             words = self.load_json(data_json_path)
             for word in words:
                 cursor.execute('''
                     INSERT INTO words (kanji, romaji, vietnamese, parts) 
                     VALUES (?, ?, ?, ?)
+                    RETURNING id
                 ''', (
                     word['kanji'],
                     word['romaji'],
                     word['vietnamese'],
                     json.dumps(word['parts'])
                 ))
-                word_id = cursor.lastrowid
+                word_id = cursor.fetchone()[0]
                 cursor.execute('''
                     INSERT INTO word_groups (word_id, group_id) 
                     VALUES (?, ?)
@@ -250,8 +219,9 @@ class Database:
             jlpt_levels = self.load_json(data_json_path)
             for item in jlpt_levels:
                 cursor.execute('''
-                    INSERT OR REPLACE INTO jlpt_levels (word_id, level)
+                    INSERT INTO jlpt_levels (word_id, level)
                     VALUES (?, ?)
+                    ON CONFLICT (word_id) DO UPDATE SET level = excluded.level
                 ''', (
                     item['word_id'],
                     item['level']
@@ -268,7 +238,7 @@ class Database:
             progresses = self.load_json(data_json_path)
             for item in progresses:
                 cursor.execute('''
-                    INSERT OR REPLACE INTO word_progress (word_id, status, last_studied_at)
+                    INSERT INTO word_progress (word_id, status, last_studied_at)
                     VALUES (?, ?, ?)
                 ''', (
                     item['word_id'],
@@ -285,10 +255,21 @@ class Database:
         """Initialize database with tables and sample data if db does not exist."""
         with app.app_context():
             try:
-                print(f"Initializing database at: {self.database}")
-                db_exists = os.path.exists(self.database)
+                backend = self.backend
+                print(f"Initializing database at: {self.database if backend.name == 'sqlite' else backend.name}")
+                db_exists = backend.exists()
                 cursor = self.cursor()
+                if backend.name == 'sqlite' and analytics_mode() == 'wal':
+                    # Persistent; lets read-only analytics connections run beside writers
+                    self.get().execute('PRAGMA journal_mode=WAL')
+                version = backend.schema_version(self.get()) if db_exists else 0
+                if version >= SCHEMA_VERSION:
+                    # Schema already current (e.g. created by the master before workers forked)
+                    print("Database schema is up to date")
+                    return
                 self.setup_tables(cursor)
+                self.migrate(cursor, version)
+                backend.set_schema_version(self.get(), SCHEMA_VERSION)
                 self.get().commit()
                 if not db_exists:
                     # Chỉ import dữ liệu mẫu nếu chưa có database
@@ -304,5 +285,34 @@ class Database:
                 print(f"Error during database initialization: {str(e)}")
                 raise
 
+class ReadOnlyDatabase(Database):
+    """Connection for analytics reads (Dashboard, group stats) that never holds locks writers wait on.
+
+    Opened with mode=ro, either on the WAL database itself (each read sees a consistent
+    snapshot while writers append to the WAL) or on a periodically refreshed backup copy,
+    depending on analytics_mode(). Writes through it fail with sqlite3.OperationalError.
+    On PostgreSQL it is a pooled connection in read-only transaction mode (MVCC readers do not
+    block writers, so analytics_mode() does not apply).
+    """
+
+    def get(self):
+        backend = self.backend
+        if backend.name != 'sqlite':
+            if 'analytics_db' not in g:
+                start = time.perf_counter()
+                g.analytics_db = backend.connect(read_only=True)
+                SQL_CONNECT_WAIT.observe(time.perf_counter() - start)
+            return g.analytics_db
+        mode = analytics_mode()
+        if mode == 'primary':
+            return super().get()
+        if 'analytics_db' not in g:
+            path = self.database if mode == 'wal' else snapshots.current(self.database)
+            start = time.perf_counter()
+            g.analytics_db = sqlite3.connect(read_only_uri(path), uri=True)
+            SQL_CONNECT_WAIT.observe(time.perf_counter() - start)
+            g.analytics_db.row_factory = sqlite3.Row
+        return g.analytics_db
+
 db = Database()
 init_db = db.init
\ No newline at end of file
@@ -67,10 +67,10 @@ class Group:
         """Tạo group mới"""
         db = Database()
         cursor = db.cursor()
-        cursor.execute('INSERT INTO groups (name, description, words_count) VALUES (?, ?, ?)',
+        cursor.execute('INSERT INTO groups (name, description, words_count) VALUES (?, ?, ?) RETURNING id',
                        (name, description, 0))
+        group_id = cursor.fetchone()[0]
         db.commit()
-        group_id = cursor.lastrowid
         return Group.get_by_id(group_id)
 
     @staticmethod
@@ -0,0 +1,268 @@
+"""Per-request SQL instrumentation.
+
+Database.cursor() hands out InstrumentedCursor objects that time every statement and count
+the rows it returned or changed. Inside a request the records go to a QueryRecorder on
+flask.g; at the end of the request they are summed into a Server-Timing header and into
+per-endpoint aggregates (see /api/admin/sql_metrics). Statements slower than SLOW_QUERY_MS
+are logged with their EXPLAIN QUERY PLAN.
+
+Set SQL_INSTRUMENTATION=0 to hand out the backend's plain cursors.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import g, has_app_context, has_request_context, request
+
+from services.metrics import SQL_LATENCY, statement_type
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+INSTRUMENTATION_ENABLED = os.getenv('SQL_INSTRUMENTATION', '1') == '1'
+
+
+class QueryRecord:
+    __slots__ = ('sql', 'duration_ms', 'rows')
+
+    def __init__(self, sql, duration_ms, rows):
+        self.sql = sql
+        self.duration_ms = duration_ms
+        self.rows = rows
+
+
+class QueryRecorder:
+    """Queries issued while handling one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(q.duration_ms for q in self.queries)
+
+    @property
+    def rows(self):
+        return sum(q.rows for q in self.queries)
+
+
+def _current_recorder():
+    if not has_app_context():
+        return None
+    return g.get('sql_recorder')
+
+
+def _statement(sql):
+    return ' '.join(sql.split())
+
+
+class InstrumentedCursor:
+    """DB-API cursor wrapper; anything not overridden is delegated to the real cursor.
+
+    A statement's duration covers execute() and the fetches that follow it (SQLite steps
+    most of a SELECT inside fetch*). It is observed and checked against SLOW_QUERY_MS once
+    the result set is exhausted, or when the cursor is reused, closed or dropped before that.
+    Statements that raise are not recorded.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._record = None
+        self._pending = None  # (sql, parameters) of a result set still being fetched
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        rows = iter(self._cursor)
+        while True:
+            start = time.perf_counter()
+            row = next(rows, None)
+            self._add_time(start)
+            if row is None:
+                self._finish()
+                return
+            self._count_rows(1)
+            yield row
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            logger.debug("could not finish query record", exc_info=True)
+
+    def _run(self, method, sql, *args):
+        self._finish()
+        start = time.perf_counter()
+        method(sql, *args)
+        duration_ms = (time.perf_counter() - start) * 1000
+        # psycopg reports the row count of SELECTs too; those rows are counted as fetched
+        changed = self._cursor.rowcount if statement_type(sql) not in ('SELECT', 'WITH') else 0
+        self._record = QueryRecord(sql, duration_ms, changed if changed > 0 else 0)
+        recorder = _current_recorder()
+        if recorder is not None:
+            recorder.queries.append(self._record)
+        self._pending = (sql, args[0] if args else ())
+        if self._cursor.description is None:  # nothing to fetch
+            self._finish()
+
+    def _finish(self):
+        if self._pending is None:
+            return
+        (sql, parameters), self._pending = self._pending, None
+        duration_ms = self._record.duration_ms
+        SQL_LATENCY.observe(duration_ms / 1000, statement=statement_type(sql))
+        if duration_ms >= SLOW_QUERY_MS:
+            log_slow_query(self._cursor.connection, sql, parameters, duration_ms)
+
+    def execute(self, sql, parameters=()):
+        self._run(self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._run(self._cursor.executemany, sql, seq_of_parameters)
+        return self
+
+    def executescript(self, script):
+        self._run(self._cursor.executescript, script)
+        return self
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def _add_time(self, start):
+        if self._record is not None:
+            self._record.duration_ms += (time.perf_counter() - start) * 1000
+
+    def _count_rows(self, n):
+        if self._record is not None:
+            self._record.rows += n
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._add_time(start)
+        if row is None:
+            self._finish()
+        else:
+            self._count_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._add_time(start)
+        self._count_rows(len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._add_time(start)
+        self._count_rows(len(rows))
+        self._finish()
+        return rows
+
+
+def explain(connection, sql, parameters=()):
+    """EXPLAIN (QUERY PLAN) detail lines for a single statement, or [] if it cannot be explained."""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        parameters = parameters[0]  # executemany: the plan of the first row is representative
+    if not isinstance(connection, sqlite3.Connection):
+        # PostgreSQL: a failed EXPLAIN would abort the request's transaction, so reads only
+        if statement_type(sql) not in ('SELECT', 'WITH'):
+            return []
+        return [row[-1] for row in connection.execute(f"EXPLAIN {sql}", parameters).fetchall()]
+    try:
+        return [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()]
+    except Exception:
+        return []
+
+
+def log_slow_query(connection, sql, parameters, duration_ms):
+    endpoint = request.endpoint if has_request_context() else None
+    plan = explain(connection, sql, parameters) if ';' not in sql.strip().rstrip(';') else []
+    metrics.record_slow(endpoint, _statement(sql), duration_ms, plan)
+    logger.warning("slow query endpoint=%s duration_ms=%.1f sql=%r plan=%r",
+                   endpoint, duration_ms, _statement(sql), plan)
+
+
+class SQLMetrics:
+    """Per-endpoint aggregates of the queries issued by requests."""
+
+    def __init__(self, slow_log_size=50):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._slow = deque(maxlen=slow_log_size)
+
+    def record_request(self, endpoint, recorder):
+        count, total_ms, rows = recorder.count, recorder.total_ms, recorder.rows
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'query_ms': 0.0, 'rows': 0,
+                'max_queries': 0, 'max_query_ms': 0.0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += count
+            stats['query_ms'] += total_ms
+            stats['rows'] += rows
+            stats['max_queries'] = max(stats['max_queries'], count)
+            stats['max_query_ms'] = max(stats['max_query_ms'], total_ms)
+
+    def record_slow(self, endpoint, sql, duration_ms, plan):
+        with self._lock:
+            self._slow.append({'endpoint': endpoint, 'sql': sql, 'duration_ms': round(duration_ms, 3),
+                               'plan': plan, 'at': time.time()})
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                endpoints[endpoint] = {
+                    **stats,
+                    'query_ms': round(stats['query_ms'], 3),
+                    'max_query_ms': round(stats['max_query_ms'], 3),
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'avg_query_ms': round(stats['query_ms'] / stats['requests'], 3),
+                }
+            return {'slow_query_ms': SLOW_QUERY_MS, 'endpoints': endpoints, 'slow_queries': list(self._slow)}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._slow.clear()
+
+
+metrics = SQLMetrics()
+
+
+def _start_request():
+    g.sql_recorder = QueryRecorder()
+
+
+def _finish_request(response):
+    recorder = g.pop('sql_recorder', None)
+    if recorder is None:
+        return response
+    total_ms = (time.perf_counter() - recorder.started) * 1000
+    response.headers.add('Server-Timing', f'db;dur={recorder.total_ms:.2f};desc="{recorder.count} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+    metrics.record_request(request.endpoint or request.path, recorder)
+    return response
+
+
+def init_app(app):
+    """Record the queries of every request handled by app."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,96 @@
+"""Periodically refreshed copy of the database for analytics reads (ANALYTICS_DB_MODE=snapshot).
+
+The copy is made with the sqlite3 backup API a few hundred pages at a time, so the source is
+only read-locked for short steps (and not at all against writers when it is in WAL mode). It is
+written to a temporary file and renamed over the previous snapshot, so connections already
+reading the old snapshot finish on it undisturbed.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_STEP = 256
+
+
+def snapshot_path(source):
+    return os.path.splitext(source)[0] + '.snapshot.db'
+
+
+def read_only_uri(path):
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+
+class SnapshotManager:
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refreshed_at = {}
+
+    def age(self, source):
+        """Seconds since the snapshot of source was taken, None if there is none."""
+        path = snapshot_path(source)
+        refreshed = self._refreshed_at.get(path)
+        if refreshed is None and os.path.exists(path):
+            refreshed = self._refreshed_at[path] = os.path.getmtime(path)
+        return time.time() - refreshed if refreshed is not None else None
+
+    def refresh(self, source):
+        """Copy source into its snapshot file now; returns the snapshot path."""
+        path = snapshot_path(source)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        start = time.perf_counter()
+        src = sqlite3.connect(read_only_uri(source), uri=True)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst, pages=PAGES_PER_STEP, sleep=0.001)
+            # Readers open the snapshot with mode=ro; a rollback-journal file needs no -shm/-wal
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp_path, path)
+        self._refreshed_at[path] = time.time()
+        logger.info("analytics snapshot refreshed source=%s duration_ms=%.1f", source,
+                    (time.perf_counter() - start) * 1000)
+        return path
+
+    def _refresh_in_background(self, source):
+        try:
+            self.refresh(source)
+        except Exception as e:
+            logger.warning("analytics snapshot refresh failed source=%s error=%s", source, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(source)
+
+    def current(self, source):
+        """Snapshot path for source. The first call copies synchronously; a stale snapshot keeps
+        being served while one background thread refreshes it."""
+        age = self.age(source)
+        if age is None:
+            return self.refresh(source)
+        if age >= self.interval:
+            with self._lock:
+                start = source not in self._refreshing
+                self._refreshing.add(source)
+            if start:
+                threading.Thread(target=self._refresh_in_background, args=(source,), daemon=True).start()
+        return snapshot_path(source)
+
+
+snapshots = SnapshotManager(interval=float(os.getenv('ANALYTICS_SNAPSHOT_INTERVAL', '60')))
+
+
+def _reset_after_fork():
+    # A refresh thread of the parent does not exist in the child
+    snapshots._lock = threading.Lock()
+    snapshots._refreshing = set()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,4 +1,5 @@
 from .database import Database
+from .user_context import resolve_user_id
 from .word import Word
 
 class StudySession:
@@ -9,20 +10,22 @@ class StudySession:
         self.created_at = created_at
 
     @staticmethod
-    def get_all(page=1, per_page=10):
+    def get_all(page=1, per_page=10, user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         offset = (page - 1) * per_page
         
-        cursor.execute('SELECT COUNT(*) FROM study_sessions')
+        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE user_id = ?', (user_id,))
         total = cursor.fetchone()[0]
         
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at 
             FROM study_sessions 
+            WHERE user_id = ?
             ORDER BY created_at DESC
             LIMIT ? OFFSET ?
-        ''', (per_page, offset))
+        ''', (user_id, per_page, offset))
         sessions = [StudySession(*row) for row in cursor.fetchall()]
         
         return {
@@ -33,32 +36,33 @@ class StudySession:
         }
 
     @staticmethod
-    def get_by_id(session_id):
+    def get_by_id(session_id, user_id=None):
         db = Database()
         cursor = db.cursor()
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at 
             FROM study_sessions 
-            WHERE id = ?
-        ''', (session_id,))
+            WHERE id = ? AND user_id = ?
+        ''', (session_id, resolve_user_id(user_id)))
         row = cursor.fetchone()
         return StudySession(*row).__dict__ if row else None
 
     @staticmethod
-    def get_by_activity_id(activity_id, page=1, per_page=10):
+    def get_by_activity_id(activity_id, page=1, per_page=10, user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         offset = (page - 1) * per_page
         
-        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE study_activity_id = ?', (activity_id,))
+        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE user_id = ? AND study_activity_id = ?', (user_id, activity_id))
         total = cursor.fetchone()[0]
         
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at 
             FROM study_sessions 
-            WHERE study_activity_id = ? 
+            WHERE user_id = ? AND study_activity_id = ? 
             LIMIT ? OFFSET ?
-        ''', (activity_id, per_page, offset))
+        ''', (user_id, activity_id, per_page, offset))
         sessions = [StudySession(*row) for row in cursor.fetchall()]
         
         return {
@@ -69,20 +73,21 @@ class StudySession:
         }
 
     @staticmethod
-    def get_by_group_id(group_id, page=1, per_page=10):
+    def get_by_group_id(group_id, page=1, per_page=10, user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         offset = (page - 1) * per_page
         
-        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE group_id = ?', (group_id,))
+        cursor.execute('SELECT COUNT(*) FROM study_sessions WHERE user_id = ? AND group_id = ?', (user_id, group_id))
         total = cursor.fetchone()[0]
         
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at 
             FROM study_sessions 
-            WHERE group_id = ? 
+            WHERE user_id = ? AND group_id = ? 
             LIMIT ? OFFSET ?
-        ''', (group_id, per_page, offset))
+        ''', (user_id, group_id, per_page, offset))
         sessions = [StudySession(*row) for row in cursor.fetchall()]
         
         return {
@@ -93,21 +98,23 @@ class StudySession:
         }
 
     @staticmethod
-    def get_session_words(session_id, page=1, per_page=10):
+    def get_session_words(session_id, page=1, per_page=10, user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         offset = (page - 1) * per_page
         
-        cursor.execute('SELECT COUNT(*) FROM word_review_items WHERE session_id = ?', (session_id,))
+        cursor.execute('SELECT COUNT(*) FROM word_review_items WHERE user_id = ? AND session_id = ?',
+                       (user_id, session_id))
         total = cursor.fetchone()[0]
         
         cursor.execute('''
             SELECT w.id, w.kanji, w.romaji, w.vietnamese, w.parts
             FROM words w
             JOIN word_review_items wri ON w.id = wri.word_id
-            WHERE wri.session_id = ?
+            WHERE wri.user_id = ? AND wri.session_id = ?
             LIMIT ? OFFSET ?
-        ''', (session_id, per_page, offset))
+        ''', (user_id, session_id, per_page, offset))
         words = [Word(*row) for row in cursor.fetchall()]
         
         return {
@@ -118,14 +125,14 @@ class StudySession:
         }
 
     @staticmethod
-    def create(group_id, study_activity_id):
+    def create(group_id, study_activity_id, user_id=None):
         db = Database()
         cursor = db.cursor()
         cursor.execute('''
-            INSERT INTO study_sessions (group_id, study_activity_id) VALUES (?, ?)
-        ''', (group_id, study_activity_id))
+            INSERT INTO study_sessions (user_id, group_id, study_activity_id) VALUES (?, ?, ?) RETURNING id
+        ''', (resolve_user_id(user_id), group_id, study_activity_id))
+        session_id = cursor.fetchone()[0]
         db.commit()
-        session_id = cursor.lastrowid
         cursor.execute('''
             SELECT id, group_id, study_activity_id, created_at FROM study_sessions WHERE id = ?
         ''', (session_id,))
@@ -0,0 +1,40 @@
+"""Which learner a request acts for.
+
+word_progress, study_sessions and word_review_items are partitioned by user_id. The request's
+user comes from the X-User-Id header and is kept on flask.g; model methods take an explicit
+user_id and fall back to current_user_id(). Requests without the header act for
+DEFAULT_USER_ID, which owns everything recorded before progress became per-user.
+"""
+import re
+
+from flask import g, has_app_context, jsonify, request
+
+USER_HEADER = 'X-User-Id'
+DEFAULT_USER_ID = 'default'
+_VALID_USER_ID = re.compile(r'^[A-Za-z0-9_.@:-]{1,64}$')
+
+
+def current_user_id():
+    if has_app_context():
+        return g.get('user_id', DEFAULT_USER_ID)
+    return DEFAULT_USER_ID
+
+
+def resolve_user_id(user_id=None):
+    return user_id or current_user_id()
+
+
+def _load_user():
+    user_id = request.headers.get(USER_HEADER)
+    if user_id is None:
+        g.user_id = DEFAULT_USER_ID
+        return None
+    if not _VALID_USER_ID.match(user_id):
+        return jsonify({'error': f'Invalid {USER_HEADER} header'}), 400
+    g.user_id = user_id
+    return None
+
+
+def init_app(app):
+    """Set g.user_id from the X-User-Id header of every request."""
+    app.before_request(_load_user)
@@ -1,5 +1,8 @@
+import logging
 from .database import Database
 
+logger = logging.getLogger(__name__)
+
 class Word:
     def __init__(self, id, kanji, romaji, vietnamese, parts, jlpt_level=None):
         self.id = id
@@ -62,10 +65,10 @@ class Word:
     def create(data):
         db = Database()
         cursor = db.cursor()
-        cursor.execute('INSERT INTO words (kanji, romaji, vietnamese, parts) VALUES (?, ?, ?, ?)',
+        cursor.execute('INSERT INTO words (kanji, romaji, vietnamese, parts) VALUES (?, ?, ?, ?) RETURNING id',
                        (data.get('kanji'), data.get('romaji'), data.get('vietnamese'), data.get('parts')))
+        word_id = cursor.fetchone()[0]
         db.commit()
-        word_id = cursor.lastrowid
         return Word.get_by_id(word_id)
 
     @staticmethod
@@ -82,22 +85,19 @@ class Word:
         db = Database()
         cursor = db.cursor()
         
-        print(f"DEBUG: Deleting word ID: {word_id}")
-        
         # Lấy danh sách groups chứa từ này trước khi xóa
         cursor.execute('SELECT DISTINCT group_id FROM word_groups WHERE word_id = ?', (word_id,))
         affected_groups = [row[0] for row in cursor.fetchall()]
-        print(f"DEBUG: Word {word_id} is in groups: {affected_groups}")
-        
-        # Kiểm tra word_progress trước khi xóa
-        cursor.execute('SELECT COUNT(*) FROM word_progress WHERE word_id = ?', (word_id,))
-        word_progress_count = cursor.fetchone()[0]
-        print(f"DEBUG: Word {word_id} has {word_progress_count} progress records")
-        
+
+        # Số word_progress chỉ dùng cho debug log, không query khi log tắt
+        if logger.isEnabledFor(logging.DEBUG):
+            cursor.execute('SELECT COUNT(*) FROM word_progress WHERE word_id = ?', (word_id,))
+            logger.debug("word.delete word_id=%s groups=%s progress_records=%s",
+                         word_id, affected_groups, cursor.fetchone()[0])
+
         # Xóa từ
         cursor.execute('DELETE FROM words WHERE id=?', (word_id,))
-        print(f"DEBUG: Deleted word {word_id} from words table")
-        
+
         # Cập nhật words_count cho tất cả groups bị ảnh hưởng
         for group_id in affected_groups:
             cursor.execute('''
@@ -105,10 +105,9 @@ class Word:
                 SET words_count = (SELECT COUNT(*) FROM word_groups WHERE group_id = ?)
                 WHERE id = ?
             ''', (group_id, group_id))
-            print(f"DEBUG: Updated words_count for group {group_id}")
-        
+
         db.commit()
-        print(f"DEBUG: Delete operation completed for word {word_id}")
+        logger.info("word.delete word_id=%s updated_groups=%s", word_id, affected_groups)
         return {'message': 'Word deleted successfully'}
 
     @staticmethod
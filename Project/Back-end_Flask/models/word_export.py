@@ -0,0 +1,135 @@
+import itertools
+import logging
+import time
+from .database import Database
+from .user_context import resolve_user_id
+
+logger = logging.getLogger(__name__)
+
+# Một dòng cho mỗi (từ, group, progress); ORDER BY theo khóa chính của word_groups nên không cần sort
+EXPORT_QUERY = '''
+    SELECT w.id, w.kanji, w.romaji, w.vietnamese, w.parts, j.level, g.name, wp.status, wp.last_studied_at
+    FROM words w
+    LEFT JOIN jlpt_levels j ON j.word_id = w.id
+    LEFT JOIN word_groups wg ON wg.word_id = w.id
+    LEFT JOIN groups g ON g.id = wg.group_id
+    LEFT JOIN word_progress wp ON wp.user_id = ? AND wp.word_id = w.id
+    ORDER BY w.id, wg.group_id
+'''
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class WordExport:
+    """Export/import of all words with their groups, JLPT level and the user's progress.
+
+    A record is {'id', 'kanji', 'romaji', 'vietnamese', 'parts', 'jlpt_level', 'groups': [names],
+    'progress': {'status', 'last_studied_at'} | None}; parts is the stored JSON string.
+    """
+
+    @staticmethod
+    def iter_records(user_id=None, batch_size=1000):
+        """Yield one record per word from a single cursor read batch_size rows at a time
+        (server-side on PostgreSQL), so memory does not grow with the database."""
+        rows = Database().iterate(EXPORT_QUERY, (resolve_user_id(user_id),), batch_size=batch_size)
+        for word_id, word_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            first = next(word_rows)
+            # Several progress rows for the word repeat each group; dict keeps the first occurrence
+            groups = dict.fromkeys(row[6] for row in itertools.chain([first], word_rows) if row[6] is not None)
+            yield {
+                'id': word_id,
+                'kanji': first[1],
+                'romaji': first[2],
+                'vietnamese': first[3],
+                'parts': first[4],
+                'jlpt_level': first[5],
+                'groups': list(groups),
+                'progress': {'status': first[7], 'last_studied_at': first[8]} if first[7] is not None else None,
+            }
+
+    @staticmethod
+    def import_records(records, user_id=None, batch_size=IMPORT_BATCH_SIZE):
+        """Upsert exported records (keeping their word ids) in one transaction, batch_size at a time.
+
+        Groups are matched by name and created when missing; progress is stored for user_id.
+        words_count is recomputed once at the end (SQLite drops its per-membership triggers meanwhile).
+        """
+        user_id = resolve_user_id(user_id)
+        db = Database()
+        connection = db.get()
+        cursor = db.cursor()
+        start = time.perf_counter()
+        counts = {'words': 0, 'groups_created': 0, 'memberships': 0, 'jlpt_levels': 0, 'progress': 0}
+        touched_groups = set()
+        with db.backend.bulk_load(connection):
+            group_ids = {}
+            for group_id, name in cursor.execute('SELECT id, name FROM groups ORDER BY id').fetchall():
+                group_ids.setdefault(name, group_id)
+
+            def group_id_for(name):
+                if name not in group_ids:
+                    cursor.execute('INSERT INTO groups (name, description, words_count) VALUES (?, ?, 0) RETURNING id',
+                                   (name, ''))
+                    group_ids[name] = cursor.fetchone()[0]
+                    counts['groups_created'] += 1
+                return group_ids[name]
+
+            for batch in _batches(records, batch_size):
+                words, levels, memberships, progress = [], [], [], []
+                for record in batch:
+                    word_id = record['id']
+                    words.append((word_id, record['kanji'], record['romaji'], record['vietnamese'], record['parts']))
+                    if record.get('jlpt_level'):
+                        levels.append((word_id, record['jlpt_level']))
+                    for name in record.get('groups') or []:
+                        group_id = group_id_for(name)
+                        touched_groups.add(group_id)
+                        memberships.append((word_id, group_id))
+                    if record.get('progress'):
+                        progress.append((user_id, word_id, record['progress']['status'],
+                                         record['progress'].get('last_studied_at')))
+                cursor.executemany('''
+                    INSERT INTO words (id, kanji, romaji, vietnamese, parts) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET kanji = excluded.kanji, romaji = excluded.romaji,
+                        vietnamese = excluded.vietnamese, parts = excluded.parts
+                ''', words)
+                if levels:
+                    cursor.executemany('''
+                        INSERT INTO jlpt_levels (word_id, level) VALUES (?, ?)
+                        ON CONFLICT (word_id) DO UPDATE SET level = excluded.level
+                    ''', levels)
+                if memberships:
+                    cursor.executemany('''
+                        INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)
+                        ON CONFLICT (word_id, group_id) DO NOTHING
+                    ''', memberships)
+                if progress:
+                    # word_progress has no unique key: replace the user's row for each word
+                    cursor.executemany('DELETE FROM word_progress WHERE user_id = ? AND word_id = ?',
+                                       [(uid, wid) for uid, wid, _, _ in progress])
+                    cursor.executemany('''
+                        INSERT INTO word_progress (user_id, word_id, status, last_studied_at) VALUES (?, ?, ?, ?)
+                    ''', progress)
+                counts['words'] += len(words)
+                counts['jlpt_levels'] += len(levels)
+                counts['memberships'] += len(memberships)
+                counts['progress'] += len(progress)
+
+            if touched_groups:
+                # Một lần quét word_groups thay cho COUNT(*) mỗi group
+                cursor.execute('SELECT group_id, COUNT(*) FROM word_groups GROUP BY group_id')
+                sizes = {group_id: count for group_id, count in cursor.fetchall() if group_id in touched_groups}
+                cursor.executemany('UPDATE groups SET words_count = ? WHERE id = ?',
+                                   [(sizes.get(group_id, 0), group_id) for group_id in touched_groups])
+        counts['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("word import user_id=%s %s", user_id, counts)
+        return counts
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -1,6 +1,10 @@
-from .database import Database
+import logging
+from .database import Database, ReadOnlyDatabase
+from .user_context import resolve_user_id
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 class WordProgress:
     def __init__(self, id, word_id, status, last_studied_at):
         self.id = id
@@ -9,17 +13,19 @@ class WordProgress:
         self.last_studied_at = last_studied_at
 
     @staticmethod
-    def create(word_id, status='new'):
+    def create(word_id, status='new', user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         now = datetime.utcnow().isoformat()
-        cursor.execute('INSERT INTO word_progress (word_id, status, last_studied_at) VALUES (?, ?, ?)',
-                       (word_id, status, now))
+        cursor.execute('INSERT INTO word_progress (user_id, word_id, status, last_studied_at) VALUES (?, ?, ?, ?)',
+                       (user_id, word_id, status, now))
         db.commit()
-        return WordProgress.get_by_word_id(word_id)
+        return WordProgress.get_by_word_id(word_id, user_id)
 
     @staticmethod
-    def update(word_id, status=None, last_studied_at=None):
+    def update(word_id, status=None, last_studied_at=None, user_id=None):
+        user_id = resolve_user_id(user_id)
         db = Database()
         cursor = db.cursor()
         fields = []
@@ -32,56 +38,56 @@ class WordProgress:
             params.append(last_studied_at)
         if not fields:
             return None
-        params.append(word_id)
-        cursor.execute(f'UPDATE word_progress SET {", ".join(fields)} WHERE word_id=?', params)
+        params.extend([user_id, word_id])
+        cursor.execute(f'UPDATE word_progress SET {", ".join(fields)} WHERE user_id=? AND word_id=?', params)
         db.commit()
-        return WordProgress.get_by_word_id(word_id)
+        return WordProgress.get_by_word_id(word_id, user_id)
 
     @staticmethod
-    def get_by_word_id(word_id):
+    def get_by_word_id(word_id, user_id=None):
         db = Database()
         cursor = db.cursor()
-        cursor.execute('SELECT id, word_id, status, last_studied_at FROM word_progress WHERE word_id=?', (word_id,))
+        cursor.execute('SELECT id, word_id, status, last_studied_at FROM word_progress WHERE user_id=? AND word_id=?',
+                       (resolve_user_id(user_id), word_id))
         row = cursor.fetchone()
         return WordProgress(*row).__dict__ if row else None
 
     @staticmethod
-    def get_by_status(status):
+    def get_by_status(status, user_id=None):
         db = Database()
-        cursor = db.cursor()
-        cursor.execute('SELECT id, word_id, status, last_studied_at FROM word_progress WHERE status=?', (status,))
-        return [WordProgress(*row).__dict__ for row in cursor.fetchall()]
+        rows = db.iterate('SELECT id, word_id, status, last_studied_at FROM word_progress WHERE user_id=? AND status=?',
+                          (resolve_user_id(user_id), status))
+        return [WordProgress(*row).__dict__ for row in rows]
 
     @staticmethod
-    def get_learned_over_days(days=7):
+    def get_learned_over_days(days=7, user_id=None):
         db = Database()
-        cursor = db.cursor()
         cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
-        cursor.execute('''
+        rows = db.iterate('''
             SELECT id, word_id, status, last_studied_at FROM word_progress
-            WHERE status="learned" AND last_studied_at < ?
-        ''', (cutoff,))
-        return [WordProgress(*row).__dict__ for row in cursor.fetchall()]
+            WHERE user_id = ? AND status='learned' AND last_studied_at < ?
+        ''', (resolve_user_id(user_id), cutoff))
+        return [WordProgress(*row).__dict__ for row in rows]
 
     @staticmethod
-    def get_by_group(group_id):
+    def get_by_group(group_id, user_id=None):
         db = Database()
-        cursor = db.cursor()
-        cursor.execute('''
+        rows = db.iterate('''
             SELECT wp.id, wp.word_id, wp.status, wp.last_studied_at 
             FROM word_progress wp
             JOIN word_groups wg ON wp.word_id = wg.word_id
-            WHERE wg.group_id = ?
-        ''', (group_id,))
-        rows = cursor.fetchall()
+            WHERE wp.user_id = ? AND wg.group_id = ?
+        ''', (resolve_user_id(user_id), group_id))
+        items = [WordProgress(*row).__dict__ for row in rows]
         return {
-            'items': [WordProgress(*row).__dict__ for row in rows],
-            'total': len(rows)
+            'items': items,
+            'total': len(items)
         }
 
     @staticmethod
-    def get_group_stats(group_id):
-        db = Database()
+    def get_group_stats(group_id, user_id=None):
+        user_id = resolve_user_id(user_id)
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
         
         # Get total words in group
@@ -94,32 +100,32 @@ class WordProgress:
         cursor.execute('''
             SELECT COUNT(*) FROM word_progress wp
             JOIN word_groups wg ON wp.word_id = wg.word_id
-            WHERE wg.group_id = ? AND wp.status = 'learned'
-        ''', (group_id,))
+            WHERE wp.user_id = ? AND wg.group_id = ? AND wp.status = 'learned'
+        ''', (user_id, group_id))
         learned_words = cursor.fetchone()[0]
         
         # Get learning words count
         cursor.execute('''
             SELECT COUNT(*) FROM word_progress wp
             JOIN word_groups wg ON wp.word_id = wg.word_id
-            WHERE wg.group_id = ? AND wp.status = 'learning'
-        ''', (group_id,))
+            WHERE wp.user_id = ? AND wg.group_id = ? AND wp.status = 'learning'
+        ''', (user_id, group_id))
         learning_words = cursor.fetchone()[0]
         
-        # Get new words count
+        # Get new words count (từ chưa có tiến độ của user cũng tính là new)
         cursor.execute('''
-            SELECT COUNT(*) FROM word_progress wp
-            JOIN word_groups wg ON wp.word_id = wg.word_id
-            WHERE wg.group_id = ? AND wp.status = 'new'
-        ''', (group_id,))
+            SELECT COUNT(*) FROM word_groups wg
+            LEFT JOIN word_progress wp ON wp.user_id = ? AND wp.word_id = wg.word_id
+            WHERE wg.group_id = ? AND (wp.id IS NULL OR wp.status = 'new')
+        ''', (user_id, group_id))
         new_words = cursor.fetchone()[0]
         
         # Get last studied date
         cursor.execute('''
             SELECT MAX(wp.last_studied_at) FROM word_progress wp
             JOIN word_groups wg ON wp.word_id = wg.word_id
-            WHERE wg.group_id = ?
-        ''', (group_id,))
+            WHERE wp.user_id = ? AND wg.group_id = ?
+        ''', (user_id, group_id))
         last_studied = cursor.fetchone()[0]
         
         return {
@@ -132,22 +138,19 @@ class WordProgress:
         }
 
     @staticmethod
-    def get_all_groups_stats():
-        db = Database()
+    def get_all_groups_stats(user_id=None):
+        user_id = resolve_user_id(user_id)
+        db = ReadOnlyDatabase()
         cursor = db.cursor()
         
-        # Debug: Kiểm tra dữ liệu thực tế
-        cursor.execute('SELECT COUNT(*) FROM words')
-        total_words_in_db = cursor.fetchone()[0]
-        print(f"DEBUG: Total words in words table: {total_words_in_db}")
-        
-        cursor.execute('SELECT COUNT(*) FROM word_groups')
-        total_word_groups = cursor.fetchone()[0]
-        print(f"DEBUG: Total word_groups: {total_word_groups}")
-        
-        cursor.execute('SELECT COUNT(*) FROM word_progress')
-        total_word_progress = cursor.fetchone()[0]
-        print(f"DEBUG: Total word_progress: {total_word_progress}")
+        # Debug: Kiểm tra dữ liệu thực tế (các COUNT(*) chỉ chạy khi bật DEBUG log)
+        if logger.isEnabledFor(logging.DEBUG):
+            cursor.execute('''
+                SELECT (SELECT COUNT(*) FROM words),
+                       (SELECT COUNT(*) FROM word_groups),
+                       (SELECT COUNT(*) FROM word_progress)
+            ''')
+            logger.debug("groups_stats words=%s word_groups=%s word_progress=%s", *cursor.fetchone())
         
         # Get all groups with their stats - tính toán chính xác từ word_groups
         cursor.execute('''
@@ -166,14 +169,15 @@ class WordProgress:
                     COUNT(*) as word_count,
                     COUNT(CASE WHEN wp.status = 'learned' THEN 1 END) as learned_count,
                     COUNT(CASE WHEN wp.status = 'learning' THEN 1 END) as learning_count,
-                    COUNT(CASE WHEN wp.status = 'new' THEN 1 END) as new_count,
+                    COUNT(CASE WHEN wp.status = 'new' OR wp.id IS NULL THEN 1 END) as new_count,
                     MAX(wp.last_studied_at) as last_studied
                 FROM word_groups wg
                 INNER JOIN words w ON wg.word_id = w.id  -- Chỉ lấy những words còn tồn tại
-                LEFT JOIN word_progress wp ON wg.word_id = wp.word_id
+                -- Chỉ tiến độ của user hiện tại (index user_id, word_id)
+                LEFT JOIN word_progress wp ON wp.user_id = ? AND wg.word_id = wp.word_id
                 GROUP BY wg.group_id
             ) stats ON g.id = stats.group_id
-        ''')
+        ''', (user_id,))
         
         rows = cursor.fetchall()
         groups_stats = []
@@ -184,13 +188,11 @@ class WordProgress:
             'new_words': 0
         }
         
-        print(f"DEBUG: Found {len(rows)} groups in get_all_groups_stats")
-        
         for row in rows:
             group_id, name, total_words, learned_words, learning_words, new_words, last_studied = row
             progress_percentage = round((learned_words / total_words * 100) if total_words > 0 else 0, 1)
-            
-            print(f"DEBUG: Group {name} (ID: {group_id}) - Total: {total_words}, Learned: {learned_words}, Learning: {learning_words}, New: {new_words}")
+            logger.debug("groups_stats group_id=%s name=%s total=%s learned=%s learning=%s new=%s",
+                         group_id, name, total_words, learned_words, learning_words, new_words)
             
             groups_stats.append({
                 'group_id': group_id,
@@ -210,7 +212,8 @@ class WordProgress:
         
         overall_progress = round((total_stats['learned_words'] / total_stats['total_words'] * 100) if total_stats['total_words'] > 0 else 0, 1)
         
-        print(f"DEBUG: Overall stats - Total: {total_stats['total_words']}, Learned: {total_stats['learned_words']}, Progress: {overall_progress}%")
+        logger.debug("groups_stats overall groups=%s total=%s learned=%s progress=%s",
+                     len(rows), total_stats['total_words'], total_stats['learned_words'], overall_progress)
         
         return {
             'groups': groups_stats,
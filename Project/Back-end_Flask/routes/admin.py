@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify, request
+from services.llm_client import get_llm_client
+from models.backup import BackupError, current_manager, sqlite_database
+from models.query_metrics import metrics as sql_metrics
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/llm_cache', methods=['GET'])
+def get_llm_cache_stats():
+    cache = get_llm_client().cache
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@admin_bp.route('/llm_cache', methods=['DELETE'])
+def clear_llm_cache():
+    cache = get_llm_client().cache
+    if cache is None:
+        return jsonify({'error': 'LLM cache is disabled'}), 404
+    cache.clear()
+    return jsonify({'message': 'LLM cache cleared'})
+
+@admin_bp.route('/sql_metrics', methods=['GET'])
+def get_sql_metrics():
+    """Per-endpoint query counts and times, plus the most recent slow queries with their plans."""
+    return jsonify(sql_metrics.snapshot())
+
+@admin_bp.route('/sql_metrics', methods=['DELETE'])
+def reset_sql_metrics():
+    sql_metrics.reset()
+    return jsonify({'message': 'SQL metrics reset'})
+
+@admin_bp.route('/backups', methods=['GET'])
+def list_backups():
+    try:
+        return jsonify({'backups': current_manager().list(sqlite_database())})
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 400
+
+@admin_bp.route('/backups', methods=['POST'])
+def create_backup():
+    """Online backup of the SQLite database now (restores go through `python -m models.backup restore`)."""
+    label = (request.get_json(silent=True) or {}).get('label') or 'manual'
+    if not label.replace('-', '').replace('_', '').isalnum():
+        return jsonify({'error': 'label may only contain letters, digits, - and _'}), 400
+    try:
+        return jsonify(current_manager().create(sqlite_database(), label=label)), 201
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 400
@@ -0,0 +1,145 @@
+"""Streaming export and bulk import of the vocabulary.
+
+GET  /api/export/words?format=ndjson|csv[&gzip=1]  streams every word with its groups, JLPT level
+     and the caller's progress straight from one database cursor, in ~64 KB chunks.
+POST /api/import/words?format=ndjson|csv           ingests the same format (gzip detected from the
+     body), upserting by word id in a single transaction.
+"""
+import csv
+import gzip
+import io
+import json
+import zlib
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from models.word_export import WordExport
+
+export_bp = Blueprint('export', __name__)
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_FIELDS = ['id', 'kanji', 'romaji', 'vietnamese', 'parts', 'jlpt_level', 'groups', 'status', 'last_studied_at']
+CHUNK_SIZE = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    """A line of the import body could not be read as a record."""
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for record in records:
+        progress = record['progress'] or {}
+        writer.writerow([record['id'], record['kanji'], record['romaji'], record['vietnamese'], record['parts'],
+                         record['jlpt_level'], json.dumps(record['groups'], ensure_ascii=False),
+                         progress.get('status'), progress.get('last_studied_at')])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunked(lines, size=CHUNK_SIZE):
+    """Encode lines and join them into ~size byte chunks, one response write per chunk."""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks, level=6):
+    """Compress a chunk stream into one gzip member as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _csv_record(row):
+    return {
+        'id': int(row['id']),
+        'kanji': row['kanji'],
+        'romaji': row['romaji'],
+        'vietnamese': row['vietnamese'],
+        'parts': row['parts'],
+        'jlpt_level': row['jlpt_level'] or None,
+        'groups': json.loads(row['groups'] or '[]'),
+        'progress': {'status': row['status'], 'last_studied_at': row['last_studied_at'] or None}
+        if row['status'] else None,
+    }
+
+
+def _ndjson_record(line):
+    record = json.loads(line)
+    for key in ('kanji', 'romaji', 'vietnamese', 'parts'):
+        if key not in record:
+            raise KeyError(key)
+    record['id'] = int(record['id'])
+    return record
+
+
+def read_records(stream, fmt):
+    """Yield records from a binary stream in export format fmt; ImportFormatError names the bad line."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        rows = enumerate(csv.DictReader(text), start=2)
+        parse = _csv_record
+    else:
+        rows = ((number, line) for number, line in enumerate(text, start=1) if line.strip())
+        parse = _ndjson_record
+    for number, row in rows:
+        try:
+            yield parse(row)
+        except (KeyError, ValueError, TypeError) as e:
+            raise ImportFormatError(f"line {number}: {type(e).__name__}: {e}")
+
+
+def _format():
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if request.method == 'POST' and request.mimetype == 'text/csv' else 'ndjson'
+    return fmt.lower()
+
+
+@export_bp.route('/export/words', methods=['GET'])
+def export_words():
+    fmt = _format()
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {sorted(FORMATS)}"}), 400
+    lines = csv_lines(WordExport.iter_records()) if fmt == 'csv' else ndjson_lines(WordExport.iter_records())
+    body = chunked(lines)
+    filename, mimetype = f'words.{fmt}', FORMATS[fmt]
+    if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        body = gzipped(body)
+        filename, mimetype = filename + '.gz', 'application/gzip'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@export_bp.route('/import/words', methods=['POST'])
+def import_words():
+    fmt = _format()
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {sorted(FORMATS)}"}), 400
+    stream = io.BufferedReader(request.stream)
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        stream = gzip.GzipFile(fileobj=stream)
+    try:
+        counts = WordExport.import_records(read_records(stream, fmt))
+    except ImportFormatError as e:
+        return jsonify({'error': f"Invalid {fmt} import: {e}"}), 400
+    except Exception as e:
+        return jsonify({'error': f"Import failed: {e}"}), 500
+    return jsonify(counts)
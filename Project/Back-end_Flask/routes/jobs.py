@@ -0,0 +1,38 @@
+from flask import Blueprint, jsonify, request
+from services.jobs import jobs
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/', methods=['GET'])
+def list_jobs():
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    return jsonify({'jobs': jobs.list(status=request.args.get('status'), limit=limit)})
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in ('queued', 'running'):
+        return jsonify({'status': job['status']}), 202
+    if job['status'] != 'succeeded':
+        return jsonify({'status': job['status'], 'error': job['error']}), 409
+    return jsonify(job['result'])
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not jobs.get(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    if not jobs.cancel(job_id):
+        return jsonify({'error': 'Job already finished'}), 409
+    return jsonify(jobs.get(job_id))
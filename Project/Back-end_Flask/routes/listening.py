@@ -1,13 +1,29 @@
-from flask import Blueprint, request, jsonify
-from youtube_transcript_api import YouTubeTranscriptApi
+from flask import Blueprint, request, jsonify, Response
 from youtube_transcript_api._errors import (
     TranscriptsDisabled, VideoUnavailable, NoTranscriptFound
 )
+import asyncio
 import os
 import re
-import requests
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.llm_client import get_llm_client
+from services.async_llm_client import get_async_llm_client
+from services.embedding_executor import ExecutorBusy, get_embedding_executor
+from services.jobs import jobs
+from services.llm_parsing import QuestionBlockStream
+from services.transcript_splitter import split_text, split_file
+from services.listening_catalog import get_listening_catalog
+from services.transcript_repository import get_transcript_repository, TranscriptNotFound
+from services.transcript_store import load_index, read_section, read_time_range
+from services.section_chunker import chunk_section, merge_question_blocks
+from services.question_generation import GenerationItem, pack_batches, build_batch_prompt, parse_batch_response
+from services.metrics import EMBEDDING_ENCODE, EMBEDDING_TEXTS, register_cache
+from services.question_similarity import QueryEmbeddingCache, NeighbourIndex
+from services.question_parser import parse_questions, parse_question_blocks, load_questions, write_questions_cache
+from utils import is_async_request, job_accepted, wants_stream, sse_event, SSE_HEADERS
 
 # --- VECTOR STORE LOGIC ---
 import sys
@@ -19,6 +35,17 @@ from chromadb.utils import embedding_functions
 
 listening_bp = Blueprint('listening', __name__)
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'Data')
+
+def transcript_file(video_id):
+    return os.path.join(DATA_DIR, 'transcripts', f"{video_id}.txt")
+
+def section_file(video_id, section_num):
+    return os.path.join(DATA_DIR, 'split', video_id, f"{video_id}_section{section_num}.txt")
+
+def questions_file(video_id, section_num):
+    return os.path.join(DATA_DIR, 'questions', f"{video_id}_section{section_num}_questions.txt")
+
 def extract_video_id(url: str):
     # Dùng regex để lấy video_id từ mọi dạng URL
     match = re.search(r"(?:v=|youtu\.be/)([A-Za-z0-9_-]{11})", url)
@@ -29,6 +56,7 @@ def extract_video_id(url: str):
 @listening_bp.route('/get_transcript', methods=['POST'])
 def get_transcript_route():
     youtube_url = None
+    data = None
     if request.is_json:
         data = request.get_json()
         youtube_url = data.get('youtube_url')
@@ -39,49 +67,57 @@ def get_transcript_route():
     video_id = extract_video_id(youtube_url)
     if not video_id:
         return jsonify({'error': 'Invalid YouTube URL'}), 400
-    dir_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'transcripts')
-    os.makedirs(dir_path, exist_ok=True)
-    filename = os.path.join(dir_path, f"{video_id}.txt")
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    if is_async_request(data):
+        return job_accepted(*jobs.submit('get_transcript', {'video_id': video_id, 'refresh': refresh}))
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=["ja", "en"])
-    except NoTranscriptFound:
-        return jsonify({'success': False, 'error': 'No transcript available for ja/en.'}), 404
-    except TranscriptsDisabled:
-        return jsonify({'success': False, 'error': 'Transcripts are disabled for this video.'}), 403
-    except VideoUnavailable:
-        return jsonify({'success': False, 'error': 'Video is unavailable.'}), 404
+        transcript = fetch_transcript(video_id, refresh=refresh)
     except Exception as e:
-        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
-    with open(filename, 'w', encoding='utf-8') as f:
-        for entry in transcript:
-            f.write(f"{entry['text']}\n")
-    return jsonify({
+        body, status = transcript_error(e)
+        return jsonify(body), status
+    return jsonify(transcript_response(transcript))
+
+TRANSCRIPT_ERRORS = (
+    ((NoTranscriptFound, TranscriptNotFound), 'No transcript available for ja/en.', 404),
+    ((TranscriptsDisabled,), 'Transcripts are disabled for this video.', 403),
+    ((VideoUnavailable,), 'Video is unavailable.', 404),
+)
+
+def transcript_error(e):
+    """(body, status) for an exception raised while fetching a transcript."""
+    for types, message, status in TRANSCRIPT_ERRORS:
+        if isinstance(e, types):
+            return {'success': False, 'error': message}, status
+    return {'success': False, 'error': f"Unexpected error: {str(e)}"}, 500
+
+def fetch_transcript(video_id: str, refresh: bool = False):
+    """Stored transcript for a video, downloaded (with timings and section index) only on a miss."""
+    return get_transcript_repository(os.path.join(DATA_DIR, 'transcripts')).get(video_id, refresh=refresh)
+
+def transcript_response(transcript):
+    return {
         'success': True,
-        'transcript': [entry['text'] for entry in transcript],
-        'file_saved': True
-    })
+        'transcript': transcript['lines'],
+        'file_saved': True,
+        'cached': transcript['cached'],
+        'source': transcript['meta'].get('source'),
+        'fetched_at': transcript['meta'].get('fetched_at')
+    }
+
+def get_transcript_job(ctx, payload):
+    return transcript_response(fetch_transcript(payload['video_id'], refresh=payload.get('refresh', False)))
+
+def split_transcript_text(text: str):
+    """Split a transcript into (section_num, section_text) pairs at each 問題N header."""
+    return [(section.number, section.text) for section in split_text(text)]
+
+def split_and_save(input_path: str, video_id: str):
+    """Stream a transcript file into section files; returns (section_num, text, path) triples."""
+    saved = split_file(input_path, os.path.join(DATA_DIR, 'split'), video_id)
+    return [(section.number, section.text, out_path) for section, out_path in saved]
 
 def split_transcript(input_path: str, video_id: str):
-    with open(input_path, encoding='utf-8') as f:
-        text = f.read()
-    text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\u3000', ' ')
-    text = re.sub(r'(\d+)\s*[\r\n]+\s*番', r'\1番', text)
-    text = re.sub(r"(問題[1-7])", r"\n\1", text)
-    text = re.sub(r'(選んでください)(\s*)(\d+番)', r'\1\n\3番', text)
-    sections = re.split(r'\n(?=問題[1-7])', text)
-    out_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'split', video_id)
-    os.makedirs(out_dir, exist_ok=True)
-    saved_files = []
-    for section in sections:
-        match = re.search(r'問題([1-7])', section)
-        if not match:
-            continue
-        section_num = match.group(1)
-        out_path = os.path.join(out_dir, f"{video_id}_section{section_num}.txt")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(section.strip())
-        saved_files.append(out_path)
-    return saved_files
+    return [out_path for _, _, out_path in split_and_save(input_path, video_id)]
 
 @listening_bp.route('/split_transcript', methods=['POST'])
 def split_transcript_route():
@@ -90,7 +126,7 @@ def split_transcript_route():
     if not youtube_url:
         return jsonify({'error': 'youtube_url is required'}), 400
     video_id = extract_video_id(youtube_url)
-    transcript_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'transcripts', f"{video_id}.txt")
+    transcript_path = transcript_file(video_id)
     if not os.path.exists(transcript_path):
         return jsonify({'error': 'Transcript file not found'}), 404
     try:
@@ -99,14 +135,48 @@ def split_transcript_route():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _optional_float(value):
+    return float(value) if value not in (None, '') else None
+
+@listening_bp.route('/transcript/<video_id>', methods=['GET'])
+def timed_transcript_route(video_id):
+    """Timestamped caption entries, optionally limited to ?start=&end= seconds."""
+    transcripts_dir = os.path.join(DATA_DIR, 'transcripts')
+    index = load_index(transcripts_dir, video_id)
+    if index is None:
+        return jsonify({'error': 'Timed transcript not found'}), 404
+    try:
+        start = _optional_float(request.args.get('start'))
+        end = _optional_float(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be numbers'}), 400
+    entries = read_time_range(transcripts_dir, video_id, index, start, end)
+    return jsonify({'success': True, 'video_id': video_id, 'duration': index['duration'], 'entries': entries})
+
+@listening_bp.route('/transcript/<video_id>/sections', methods=['GET'])
+def transcript_sections_route(video_id):
+    index = load_index(os.path.join(DATA_DIR, 'transcripts'), video_id)
+    if index is None:
+        return jsonify({'error': 'Timed transcript not found'}), 404
+    return jsonify({'success': True, 'video_id': video_id, 'sections': index['sections']})
+
+@listening_bp.route('/transcript/<video_id>/sections/<int:section_num>', methods=['GET'])
+def transcript_section_route(video_id, section_num):
+    transcripts_dir = os.path.join(DATA_DIR, 'transcripts')
+    index = load_index(transcripts_dir, video_id)
+    if index is None:
+        return jsonify({'error': 'Timed transcript not found'}), 404
+    section, entries = read_section(transcripts_dir, video_id, index, section_num)
+    if section is None:
+        return jsonify({'error': 'Section not found'}), 404
+    return jsonify({'success': True, 'video_id': video_id, 'section': section, 'entries': entries})
+
 def clean_text(text: str) -> str:
     text = text.replace('\u3000', ' ')
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
 MODEL_ID = "deepseek-r1-distill-llama-70b"
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")  # Lấy từ biến môi trường
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
 
 PROMPT = (
     "You are a Japanese Language Proficiency Test (JLPT) Listening Comprehension Question Extractor.\n\n"
@@ -136,43 +206,153 @@ PROMPT = (
     "- Remove unrelated phrases like 'では始めます', '練習しましょう', '[音楽]'\n"
 )
 
+def structure_prompt(prompt: str, transcript: str):
+    return f"{prompt}\n\nHere is the transcript:\n{transcript}"
+
 def call_groq_api(prompt: str, transcript: str, model_id: str = MODEL_ID):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    full_prompt = f"{prompt}\n\nHere is the transcript:\n{transcript}"
-    data = {
-        "model": model_id,
-        "messages": [
-            {"role": "user", "content": full_prompt}
-        ],
-        "temperature": 0
-    }
-    response = requests.post(GROQ_URL, headers=headers, json=data)
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    return get_llm_client().complete(structure_prompt(prompt, transcript), model=model_id, temperature=0,
+                                     cache_tag='structure_section')
+
+def stream_groq_api(prompt: str, transcript: str, model_id: str = MODEL_ID):
+    """Streaming variant of call_groq_api; shares its cache entries."""
+    return get_llm_client().stream_complete(structure_prompt(prompt, transcript), model=model_id, temperature=0,
+                                            cache_tag='structure_section')
+
+STRUCTURE_CHUNK_TOKENS = int(os.getenv('STRUCTURE_CHUNK_TOKENS', '4000'))
+STRUCTURE_CHUNK_RETRIES = 1
+
+def section_chunks(section_text: str):
+    return chunk_section(clean_text(section_text), STRUCTURE_CHUNK_TOKENS)
+
+def structure_chunk(chunk: str):
+    """One structuring call with a retry. Answers are cached (temperature 0), so re-running a
+    section after a failure only repeats the chunks that failed."""
+    for attempt in range(STRUCTURE_CHUNK_RETRIES + 1):
+        try:
+            return call_groq_api(PROMPT, chunk)
+        except Exception:
+            if attempt == STRUCTURE_CHUNK_RETRIES:
+                raise
+
+async def structure_chunk_async(chunk: str):
+    """structure_chunk over the async client."""
+    for attempt in range(STRUCTURE_CHUNK_RETRIES + 1):
+        try:
+            return await get_async_llm_client().complete(structure_prompt(PROMPT, chunk), model=MODEL_ID,
+                                                         temperature=0, cache_tag='structure_section')
+        except Exception:
+            if attempt == STRUCTURE_CHUNK_RETRIES:
+                raise
+
+def settled(futures):
+    """Result or exception of each finished future, in order."""
+    return [future.exception() or future.result() for future in futures]
+
+def merge_chunk_outputs(outputs):
+    """Merged <question> blocks of the per-chunk outputs; any exception among them fails the section."""
+    errors = {i: str(output) for i, output in enumerate(outputs) if isinstance(output, Exception)}
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(outputs)} chunks failed: {errors}")
+    return merge_question_blocks(outputs)
+
+def structure_chunks(chunks):
+    """Structure chunks concurrently; returns the merged <question> blocks."""
+    if len(chunks) == 1:
+        return structure_chunk(chunks[0])
+    with ThreadPoolExecutor(max_workers=min(len(chunks), get_llm_client().max_concurrency)) as pool:
+        futures = [pool.submit(structure_chunk, chunk) for chunk in chunks]
+    return merge_chunk_outputs(settled(futures))
+
+async def structure_chunks_async(chunks):
+    if len(chunks) == 1:
+        return await structure_chunk_async(chunks[0])
+    return merge_chunk_outputs(await asyncio.gather(*(structure_chunk_async(chunk) for chunk in chunks),
+                                                    return_exceptions=True))
+
+def structure_section(video_id: str, section_num, section_text: str) -> str:
+    """Extract <question> blocks from a section with the LLM and save them to the questions file.
+    Long sections are split at question boundaries and structured chunk by chunk."""
+    result = structure_chunks(section_chunks(section_text))
+    save_questions(video_id, section_num, result)
+    return result
+
+async def structure_section_async(video_id: str, section_num, section_text: str) -> str:
+    result = await structure_chunks_async(section_chunks(section_text))
+    save_questions(video_id, section_num, result)
+    return result
+
+def save_questions(video_id: str, section_num, content: str, questions=None):
+    """Write the raw LLM output and its parsed JSON cache side by side. Returns the parsed questions."""
+    out_path = questions_file(video_id, section_num)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    if questions is None:
+        questions = parse_questions(content)
+    write_questions_cache(out_path, questions)
+    listening_catalog().invalidate()
+    return questions
+
+def structure_section_events(video_id: str, section_num, section_text: str):
+    """Yield SSE events: one `question` per completed <question> block, then `done` once the file is saved."""
+    chunks = []
+    blocks = QuestionBlockStream()
+    questions = []
+    try:
+        text_chunks = section_chunks(section_text)
+        if len(text_chunks) > 1:
+            # Chunks run concurrently; questions are sent once the merged result is known
+            result = structure_chunks(text_chunks)
+            for block in blocks.feed(result):
+                for question in parse_questions(block):
+                    yield sse_event('question', {'index': len(questions), 'question': question, 'block': block})
+                    questions.append(question)
+            save_questions(video_id, section_num, result, questions)
+        else:
+            for delta in stream_groq_api(PROMPT, text_chunks[0] if text_chunks else ''):
+                chunks.append(delta)
+                for block in blocks.feed(delta):
+                    for question in parse_questions(block):
+                        yield sse_event('question', {'index': len(questions), 'question': question, 'block': block})
+                        questions.append(question)
+            save_questions(video_id, section_num, ''.join(chunks), questions)
+        yield sse_event('done', {'success': True, 'questions_saved': questions_file(video_id, section_num),
+                                 'count': len(questions)})
+    except Exception as e:
+        yield sse_event('error', {'success': False, 'error': str(e)})
+
+def structure_section_job(ctx, payload):
+    video_id, section_num = payload['video_id'], payload['section_num']
+    with open(section_file(video_id, section_num), 'r', encoding='utf-8') as f:
+        section_text = f.read()
+    result = structure_section(video_id, section_num, section_text)
+    questions_path = questions_file(video_id, section_num)
+    return {'success': True, 'questions_saved': questions_path, 'content': result, 'questions': load_questions(questions_path)}
 
 @listening_bp.route('/structure_section', methods=['POST'])
-def structure_section_route():
+async def structure_section_route():
     data = request.get_json()
     youtube_url = data.get('youtube_url')
     section_num = data.get('section_num')
     if not youtube_url or not section_num:
         return jsonify({'error': 'youtube_url and section_num are required'}), 400
     video_id = extract_video_id(youtube_url)
-    section_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'split', video_id, f"{video_id}_section{section_num}.txt")
-    out_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'questions', f"{video_id}_section{section_num}_questions.txt")
+    section_path = section_file(video_id, section_num)
     if not os.path.exists(section_path):
         return jsonify({'error': 'Section file not found'}), 404
+    if is_async_request(data):
+        return job_accepted(*jobs.submit('structure_section', {'video_id': video_id, 'section_num': section_num}))
     try:
         with open(section_path, 'r', encoding='utf-8') as f:
-            section_text = clean_text(f.read())
-        result = call_groq_api(PROMPT, section_text)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return jsonify({'success': True, 'questions_saved': out_path, 'content': result})
+            section_text = f.read()
+        if wants_stream():
+            # No stream_with_context from an async view; the events need no request context
+            return Response(structure_section_events(video_id, section_num, section_text),
+                            mimetype='text/event-stream', headers=SSE_HEADERS)
+        result = await structure_section_async(video_id, section_num, section_text)
+        questions_path = questions_file(video_id, section_num)
+        return jsonify({'success': True, 'questions_saved': questions_path, 'content': result,
+                        'questions': load_questions(questions_path)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -182,59 +362,202 @@ class LocalEmbeddingFunction(embedding_functions.EmbeddingFunction):
         self.model = SentenceTransformer(self.model_id)
     def __call__(self, texts):
         try:
-            return self.model.encode(texts, show_progress_bar=False).tolist()
+            with EMBEDDING_ENCODE.time(model=self.model_id):
+                embeddings = self.model.encode(texts, show_progress_bar=False).tolist()
+            EMBEDDING_TEXTS.inc(len(texts), model=self.model_id)
+            return embeddings
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
             return [[0.0] * 384 for _ in texts]
     def name(self):
         return f"LocalEmbeddingFunction-{self.model_id}"
 
+def parse_questions_from_text(text):
+    return parse_questions(text)
+
 def parse_questions_from_file(filename):
-    questions = []
-    current_question = {}
+    """Parsed questions for a questions file, served from its JSON cache when fresh."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if line.startswith('<question>'):
-                current_question = {}
-            elif line.startswith('Introduction:'):
-                i += 1
-                if i < len(lines):
-                    current_question['Introduction'] = lines[i].strip()
-            elif line.startswith('Conversation:'):
-                conversation_lines = []
-                i += 1
-                while i < len(lines) and not lines[i].startswith('Question:'):
-                    conversation_lines.append(lines[i].strip())
-                    i += 1
-                current_question['Conversation'] = '\n'.join(conversation_lines).strip()
-                i -= 1
-            elif line.startswith('Question:'):
-                i += 1
-                if i < len(lines):
-                    current_question['Question'] = lines[i].strip()
-            elif line.startswith('Options:'):
-                options = []
-                i += 1
-                while i < len(lines) and (lines[i].strip().startswith(('1.', '2.', '3.', '4.'))):
-                    option = lines[i].strip()
-                    options.append(option[2:].strip())
-                    i += 1
-                current_question['Options'] = options
-                i -= 1
-            elif line.startswith('</question>'):
-                if current_question:
-                    questions.append(current_question)
-                    current_question = {}
-            i += 1
-        return questions
+        return load_questions(filename)
     except Exception as e:
         print(f"Error parsing questions from {filename}: {str(e)}")
         return []
 
+@listening_bp.route('/questions/<video_id>', methods=['GET'])
+def video_questions_route(video_id):
+    prefix = f"{video_id}_section"
+    questions_dir = os.path.join(DATA_DIR, 'questions')
+    sections = []
+    if os.path.isdir(questions_dir):
+        for name in os.listdir(questions_dir):
+            match = re.fullmatch(re.escape(prefix) + r'(\d+)_questions\.txt', name)
+            if match:
+                section_num = int(match.group(1))
+                sections.append({'section_num': section_num,
+                                 'questions': parse_questions_from_file(questions_file(video_id, section_num))})
+    if not sections:
+        return jsonify({'error': 'No questions found for video'}), 404
+    sections.sort(key=lambda s: s['section_num'])
+    return jsonify({'success': True, 'video_id': video_id, 'sections': sections})
+
+@listening_bp.route('/questions/<video_id>/<int:section_num>', methods=['GET'])
+def section_questions_route(video_id, section_num):
+    questions_path = questions_file(video_id, section_num)
+    if not os.path.exists(questions_path):
+        return jsonify({'error': 'Questions file not found'}), 404
+    return jsonify({'success': True, 'video_id': video_id, 'section_num': section_num,
+                    'questions': parse_questions_from_file(questions_path)})
+
+def listening_catalog():
+    return get_listening_catalog(DATA_DIR)
+
+@listening_bp.route('/videos', methods=['GET'])
+def videos_route():
+    """Every processed video with its sections and question counts, from the catalog manifest."""
+    return jsonify({'success': True, 'videos': listening_catalog().videos()})
+
+@listening_bp.route('/videos/<video_id>', methods=['GET'])
+def video_route(video_id):
+    """Sections, times and parsed questions of one video in a single response."""
+    video = listening_catalog().video(video_id)
+    if video is None:
+        return jsonify({'error': 'Video not in catalog'}), 404
+    return jsonify({'success': True, **video})
+
+VECTORSTORE_PATH = os.path.abspath(os.path.join(DATA_DIR, 'vectorstore'))
+QUESTION_COLLECTION = "jlpt_questions"
+MAX_OPTIONS = 4
+
+_question_collection = None
+_question_collection_lock = threading.Lock()
+_embedding_function = None
+query_embeddings = QueryEmbeddingCache(maxsize=int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024')))
+question_neighbours = NeighbourIndex(os.path.join(VECTORSTORE_PATH, 'neighbours.json'))
+register_cache('query_embeddings', lambda: query_embeddings.stats())
+
+def get_embedding_function():
+    global _embedding_function
+    if _embedding_function is None:
+        with _question_collection_lock:
+            if _embedding_function is None:
+                _embedding_function = LocalEmbeddingFunction()
+    return _embedding_function
+
+def get_question_collection():
+    """Return the shared ChromaDB collection, loading the embedding model only once."""
+    global _question_collection
+    if _question_collection is None:
+        embedding_function = get_embedding_function()
+        with _question_collection_lock:
+            if _question_collection is None:
+                client = chromadb.PersistentClient(path=VECTORSTORE_PATH)
+                _question_collection = client.get_or_create_collection(
+                    name=QUESTION_COLLECTION,
+                    embedding_function=embedding_function,
+                    metadata={"description": "All JLPT listening comprehension questions (all sections)"}
+                )
+    return _question_collection
+
+def _reset_after_fork():
+    # The ChromaDB client (SQLite + threads) is per process; the preloaded model is kept (copy-on-write)
+    global _question_collection, _question_collection_lock
+    _question_collection, _question_collection_lock = None, threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def question_to_metadata(question: dict, video_id: str, section: int, idx: int) -> dict:
+    """Flatten a parsed question into scalar ChromaDB metadata fields (filterable, no JSON blob)."""
+    options = question.get('Options', [])[:MAX_OPTIONS]
+    metadata = {
+        "video_id": video_id,
+        "section": int(section),
+        "question_index": idx,
+        "introduction": question.get('Introduction', ''),
+        "conversation": question.get('Conversation', ''),
+        "question": question.get('Question', ''),
+        "option_count": len(options),
+    }
+    for i, option in enumerate(options, start=1):
+        metadata[f"option_{i}"] = option
+    if question.get('CorrectAnswer'):
+        metadata["correct_answer"] = str(question['CorrectAnswer'])
+    return metadata
+
+def metadata_to_question(metadata: dict) -> dict:
+    """Rebuild a question dict from the metadata written by question_to_metadata."""
+    if 'question' not in metadata and 'full_structure' in metadata:
+        # Entry indexed before structured metadata existed
+        question = json.loads(metadata['full_structure'])
+    else:
+        option_count = metadata.get('option_count', 0)
+        question = {
+            'Introduction': metadata.get('introduction', ''),
+            'Conversation': metadata.get('conversation', ''),
+            'Question': metadata.get('question', ''),
+            'Options': [metadata.get(f"option_{i}", '') for i in range(1, option_count + 1)],
+        }
+        if metadata.get('correct_answer'):
+            question['CorrectAnswer'] = metadata['correct_answer']
+    question['video_id'] = metadata.get('video_id')
+    question['section'] = metadata.get('section')
+    return question
+
+def build_question_filter(section=None, video_id=None, option_count=None):
+    """Build a ChromaDB `where` clause from the optional search filters."""
+    conditions = []
+    if section is not None:
+        conditions.append({"section": int(section)})
+    if video_id:
+        conditions.append({"video_id": video_id})
+    if option_count is not None:
+        conditions.append({"option_count": int(option_count)})
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def question_document(question: dict) -> str:
+    return f"""
+Introduction: {question.get('Introduction', '')}
+Conversation: {question.get('Conversation', '')}
+Question: {question.get('Question', '')}
+Options: {'; '.join(question.get('Options', []))}
+"""
+
+def index_questions(entries):
+    """Index [(video_id, section_num, questions), ...] in a single upsert; returns the number indexed."""
+    ids = []
+    documents = []
+    metadatas = []
+    for video_id, section_num, questions in entries:
+        for idx, question in enumerate(questions):
+            ids.append(f"{video_id}_{section_num}_{idx}")
+            metadatas.append(question_to_metadata(question, video_id, section_num, idx))
+            documents.append(question_document(question))
+    if ids:
+        # upsert so re-indexing a section replaces older entries instead of duplicating them
+        get_question_collection().upsert(ids=ids, documents=documents, metadatas=metadatas)
+        try:
+            update_question_neighbours(ids)
+        except Exception as e:
+            print(f"Could not update question neighbours: {str(e)}")
+            question_neighbours.invalidate()
+    return len(ids)
+
+def update_question_neighbours(changed_ids):
+    """Refresh the neighbour lists after changed_ids were upserted; only lists they can affect are recomputed."""
+    stored = get_question_collection().get(include=["embeddings"])
+    return question_neighbours.update(stored['ids'], stored['embeddings'], changed_ids)
+
+def rebuild_question_neighbours():
+    """Recompute every question's neighbour list from the embeddings already in the vector store."""
+    stored = get_question_collection().get(include=["embeddings"])
+    return question_neighbours.rebuild(stored['ids'], stored['embeddings'])
+
+def embed_query(text: str):
+    return query_embeddings.get_or_compute(text, lambda normalized: get_embedding_function()([normalized])[0])
+
 @listening_bp.route('/index_questions', methods=['POST'])
 def index_questions_route():
     data = request.get_json()
@@ -243,7 +566,7 @@ def index_questions_route():
     if not youtube_url or not section_num:
         return jsonify({'error': 'youtube_url and section_num are required'}), 400
     video_id = extract_video_id(youtube_url)
-    questions_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'questions', f"{video_id}_section{section_num}_questions.txt")
+    questions_path = questions_file(video_id, section_num)
     if not os.path.exists(questions_path):
         return jsonify({'error': 'Questions file not found'}), 404
     try:
@@ -251,72 +574,203 @@ def index_questions_route():
         questions = parse_questions_from_file(questions_path)
         if not questions:
             return jsonify({'error': 'No questions found in file'}), 400
-        # Prepare ChromaDB
-        vectorstore_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'vectorstore'))
-        client = chromadb.PersistentClient(path=vectorstore_path)
-        embedding_fn = LocalEmbeddingFunction()
-        collection = client.get_or_create_collection(
-            name="jlpt_questions",
-            embedding_function=embedding_fn,
-            metadata={"description": "All JLPT listening comprehension questions (all sections)"}
-        )
-        # Add questions
-        ids = []
-        documents = []
-        metadatas = []
-        for idx, question in enumerate(questions):
-            question_id = f"{video_id}_{section_num}_{idx}"
-            ids.append(question_id)
-            metadatas.append({
-                "video_id": video_id,
-                "section": int(section_num),
-                "question_index": idx,
-                "full_structure": json.dumps(question, ensure_ascii=False)
-            })
-            document = f"""
-Introduction: {question.get('Introduction', '')}
-Conversation: {question.get('Conversation', '')}
-Question: {question.get('Question', '')}
-Options: {'; '.join(question.get('Options', []))}
-"""
-            documents.append(document)
-        collection.add(ids=ids, documents=documents, metadatas=metadatas)
-        return jsonify({'success': True, 'indexed_file': questions_path, 'vectorstore_path': vectorstore_path, 'num_questions': len(questions)})
+        num_questions = index_questions([(video_id, section_num, questions)])
+        return jsonify({'success': True, 'indexed_file': questions_path, 'vectorstore_path': VECTORSTORE_PATH, 'num_questions': num_questions})
     except Exception as e:
         print("DEBUG ERROR in index_questions_route:", str(e))
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def search_similar_questions(conversation: str, n_results: int = 3):
+PROCESS_VIDEO_STAGES = ('transcript', 'split', 'structure', 'index')
+
+def process_video(ctx, payload):
+    """Transcript -> split -> structure every section concurrently -> index all questions in one batch."""
+    video_id = payload['video_id']
+    ctx.update_stage('transcript', status='running', total=1)
+    fetch_transcript(video_id)
+    ctx.update_stage('transcript', status='done', done=1)
+    ctx.check_cancelled()
+
+    ctx.update_stage('split', status='running', total=1)
+    # Later sections with the same number overwrite earlier ones, as the split files do
+    sections = {num: text for num, text, _ in split_and_save(transcript_file(video_id), video_id)}
+    if not sections:
+        raise ValueError('No 問題 sections found in transcript')
+    ctx.update_stage('split', status='done', done=1)
+    ctx.check_cancelled()
+
+    ctx.update_stage('structure', status='running', total=len(sections))
+    structured = {}
+    errors = {}
+    # Section texts are passed in memory; the LLM client semaphore bounds the real concurrency
+    with ThreadPoolExecutor(max_workers=get_llm_client().max_concurrency) as pool:
+        futures = {pool.submit(structure_section, video_id, num, text): num for num, text in sections.items()}
+        for future in as_completed(futures):
+            num = futures[future]
+            try:
+                structured[num] = future.result()
+            except Exception as e:
+                errors[num] = str(e)
+            ctx.advance_stage('structure')
+            if ctx.cancelled:
+                for pending in futures:
+                    pending.cancel()
+    ctx.check_cancelled()
+    if not structured:
+        raise ValueError(f"All sections failed to structure: {errors}")
+    ctx.update_stage('structure', status='done' if not errors else 'partial')
+
+    # structure_section already cached the parsed questions next to each file
+    parsed = {num: load_questions(questions_file(video_id, num)) for num in structured}
+    ctx.update_stage('index', status='running', total=sum(len(q) for q in parsed.values()))
+    index_error = None
+    try:
+        indexed = index_questions([(video_id, num, questions) for num, questions in sorted(parsed.items())])
+        ctx.update_stage('index', status='done', done=indexed)
+    except Exception as e:
+        index_error = str(e)
+        ctx.update_stage('index', status='failed')
+
+    index = load_index(os.path.join(DATA_DIR, 'transcripts'), video_id)
+    times = {str(s['section_num']): (s['start'], s['end']) for s in index['sections']} if index else {}
+    return {
+        'video_id': video_id,
+        'sections': [
+            {
+                'section_num': int(num),
+                'start': times.get(str(num), (None, None))[0],
+                'end': times.get(str(num), (None, None))[1],
+                'questions_saved': questions_file(video_id, num) if num in structured else None,
+                'num_questions': len(parsed.get(num, [])),
+                'questions': parsed.get(num, []),
+                'error': errors.get(num)
+            }
+            for num in sorted(sections, key=int)
+        ],
+        'total_questions': sum(len(q) for q in parsed.values()),
+        'index_error': index_error
+    }
+
+@listening_bp.route('/process_video', methods=['POST'])
+def process_video_route():
+    data = request.get_json(silent=True) or {}
+    youtube_url = data.get('youtube_url')
+    if not youtube_url:
+        return jsonify({'error': 'youtube_url is required'}), 400
+    video_id = extract_video_id(youtube_url)
+    if not video_id:
+        return jsonify({'error': 'Invalid YouTube URL'}), 400
+    job_id, created = jobs.submit('process_video', {'video_id': video_id}, stages=PROCESS_VIDEO_STAGES)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'deduplicated': not created,
+        'status_url': f"/api/listening/process_video/{job_id}"
+    }), 202
+
+@listening_bp.route('/process_video/<job_id>', methods=['GET'])
+def process_video_status_route(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+def search_similar_questions(conversation: str, n_results: int = 3, section=None, video_id=None, option_count=None):
     """
     Truy vấn vector db để lấy các câu hỏi JLPT tương tự dựa trên embedding của đoạn hội thoại.
+    Filters (section, video_id, option_count) are applied inside the vector query.
     """
-    # Prepare ChromaDB
-    vectorstore_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'vectorstore'))
-    client = chromadb.PersistentClient(path=vectorstore_path)
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    collection = client.get_or_create_collection(
-        name="jlpt_questions",
-        embedding_function=embedding_fn,
-        metadata={"description": "All JLPT listening comprehension questions (all sections)"}
+    return search_similar_questions_many([conversation], n_results, section=section, video_id=video_id,
+                                         option_count=option_count)[0]
+
+def search_similar_questions_many(conversations, n_results: int = 3, section=None, video_id=None, option_count=None):
+    """search_similar_questions for several conversations in one vector query; one result list per input."""
+    collection = get_question_collection()
+    where = build_question_filter(section=section, video_id=video_id, option_count=option_count)
+    results = collection.query(
+        query_embeddings=[embed_query(conversation) for conversation in conversations],
+        n_results=n_results,
+        where=where,
+        include=["metadatas", "distances"]
     )
-    # Search
-    results = collection.query(query_texts=[conversation], n_results=n_results)
-    # Parse results
+    all_similar = []
+    for ids, metas, distances in zip(results['ids'], results['metadatas'], results['distances']):
+        similar_questions = []
+        for question_id, meta, distance in zip(ids, metas, distances):
+            question = metadata_to_question(meta)
+            question['id'] = question_id
+            question['distance'] = distance
+            similar_questions.append(question)
+        all_similar.append(similar_questions)
+    return all_similar
+
+def _optional_int(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+def similar_request_params(data):
+    """(search_similar_questions kwargs, None) for a /similar body, or (None, error message)."""
+    conversation = data.get('conversation')
+    if not conversation:
+        return None, 'conversation is required'
+    try:
+        n_results = min(max(int(data.get('n_results', 3)), 1), 50)
+        section = _optional_int(data.get('section'))
+        option_count = _optional_int(data.get('option_count'))
+    except (TypeError, ValueError):
+        return None, 'n_results, section and option_count must be integers'
+    return {'conversation': conversation, 'n_results': n_results, 'section': section,
+            'video_id': data.get('video_id'), 'option_count': option_count}, None
+
+@listening_bp.route('/similar', methods=['POST'])
+async def similar_questions_route():
+    params, error = similar_request_params(request.get_json() or {})
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        questions = await get_embedding_executor().run(search_similar_questions, **params)
+        return jsonify({'success': True, 'questions': questions})
+    except ExecutorBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def similar_to_question(question_id: str, n_results: int = 3):
+    """Nearest indexed questions of an indexed question from the precomputed lists; None if unknown."""
+    collection = get_question_collection()
+    if not question_neighbours.matches(collection.count()):
+        rebuild_question_neighbours()
+    neighbours = question_neighbours.lookup(question_id)
+    if neighbours is None:
+        return None
+    neighbours = neighbours[:n_results]
+    stored = collection.get(ids=[nid for nid, _ in neighbours], include=["metadatas"])
+    metadatas = dict(zip(stored['ids'], stored['metadatas']))
     similar_questions = []
-    for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
-        try:
-            q = json.loads(meta['full_structure'])
-            similar_questions.append(q)
-        except Exception:
-            continue
+    for neighbour_id, distance in neighbours:
+        if neighbour_id in metadatas:
+            question = metadata_to_question(metadatas[neighbour_id])
+            question['id'] = neighbour_id
+            question['distance'] = distance
+            similar_questions.append(question)
     return similar_questions
 
-def generate_question_from_conversation(conversation: str) -> dict:
-    """
-    Generate a JLPT-style listening comprehension question from a given Japanese conversation.
-    Returns a dict with Introduction, Conversation, Question, Options (3 hoặc 4), and CorrectAnswer.
-    """
-    prompt = (
+@listening_bp.route('/similar/<question_id>', methods=['GET'])
+def similar_to_question_route(question_id):
+    try:
+        n_results = min(max(int(request.args.get('n_results', 3)), 1), question_neighbours.k)
+    except ValueError:
+        return jsonify({'error': 'n_results must be an integer'}), 400
+    try:
+        questions = similar_to_question(question_id, n_results=n_results)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if questions is None:
+        return jsonify({'error': 'Question not indexed'}), 404
+    return jsonify({'success': True, 'question_id': question_id, 'questions': questions})
+
+def conversation_question_prompt(conversation: str) -> str:
+    return (
         "You are a JLPT listening comprehension question generator.\n\n"
         "Given the following Japanese conversation, create a new JLPT-style listening comprehension question.\n\n"
         "Output the question in this format (choose 3 or 4 options as appropriate):\n\n"
@@ -335,63 +789,163 @@ def generate_question_from_conversation(conversation: str) -> dict:
         "- Output only the <question>...</question> block.\n\n"
         f"Conversation:\n{conversation}\n"
     )
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": MODEL_ID,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
+
+def first_complete_question(result: str):
+    questions = parse_question_blocks(result)
+    if not questions or not questions[0].is_complete():
+        return None
+    return questions[0].to_dict()
+
+def generate_question_from_conversation(conversation: str) -> dict:
+    """
+    Generate a JLPT-style listening comprehension question from a given Japanese conversation.
+    Returns a dict with Introduction, Conversation, Question, Options (3 hoặc 4), and CorrectAnswer.
+    """
     try:
-        response = requests.post(GROQ_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()["choices"][0]["message"]["content"]
-        # Parse <question>...</question> block
-        match = re.search(r'<question>([\s\S]*?)</question>', result)
-        if not match:
-            return None
-        block = match.group(1)
-        # Parse fields
-        def get_field(label):
-            m = re.search(rf'{label}:\s*([\s\S]*?)(?=\n\s*(?:Introduction|Conversation|Question|Options|CorrectAnswer):|$)', block)
-            return m.group(1).strip() if m else ''
-        introduction = get_field('Introduction')
-        conversation_text = get_field('Conversation')
-        question_text = get_field('Question')
-        # Parse options
-        options_match = re.search(r'Options:\s*([\s\S]*?)(?=\n\s*CorrectAnswer:|$)', block)
-        options = []
-        if options_match:
-            lines = options_match.group(1).split('\n')
-            for line in lines:
-                opt = line.strip()
-                if re.match(r'^[1-4]\.', opt):
-                    options.append(opt[2:].strip())
-        # Parse correct answer
-        correct_match = re.search(r'CorrectAnswer:\s*([1-4])', block)
-        correct_answer = correct_match.group(1) if correct_match else None
-        if not (introduction and conversation_text and question_text and options and correct_answer):
-            return None
-        return {
-            'Introduction': introduction,
-            'Conversation': conversation_text,
-            'Question': question_text,
-            'Options': options,
-            'CorrectAnswer': correct_answer
-        }
+        result = get_llm_client().complete(conversation_question_prompt(conversation), model=MODEL_ID, temperature=0.7)
+        return first_complete_question(result)
     except Exception as e:
         print(f"Error generating question from conversation: {str(e)}")
         return None
 
+async def generate_question_from_conversation_async(conversation: str) -> dict:
+    try:
+        result = await get_async_llm_client().complete(conversation_question_prompt(conversation), model=MODEL_ID,
+                                                       temperature=0.7)
+        return first_complete_question(result)
+    except Exception as e:
+        print(f"Error generating question from conversation: {str(e)}")
+        return None
+
+def generate_question_job(ctx, payload):
+    result = generate_question_from_conversation(payload['conversation'])
+    if not result:
+        raise ValueError('Could not generate question')
+    return {'success': True, 'question': result}
+
 @listening_bp.route('/generate_question_from_conversation', methods=['POST'])
-def generate_question_from_conversation_route():
+async def generate_question_from_conversation_route():
     data = request.get_json()
     conversation = data.get('conversation')
     if not conversation:
         return jsonify({'error': 'conversation is required'}), 400
-    result = generate_question_from_conversation(conversation)
+    if is_async_request(data):
+        return job_accepted(*jobs.submit('generate_question', {'conversation': conversation}))
+    result = await generate_question_from_conversation_async(conversation)
     if not result:
         return jsonify({'success': False, 'error': 'Could not generate question'}), 500
-    return jsonify({'success': True, 'question': result}) 
\ No newline at end of file
+    return jsonify({'success': True, 'question': result})
+
+BATCH_MAX_TOKENS = int(os.getenv('QUESTION_BATCH_MAX_TOKENS', '6000'))
+MAX_BATCH_CONVERSATIONS = 100
+
+def generation_items(conversations, n_examples: int = 2):
+    """One GenerationItem per conversation, with similar indexed questions as few-shot examples."""
+    examples = [[] for _ in conversations]
+    if n_examples > 0:
+        try:
+            examples = search_similar_questions_many(conversations, n_results=n_examples)
+        except Exception as e:
+            print(f"Few-shot retrieval failed, generating without examples: {str(e)}")
+    return [GenerationItem(i, conversation, examples[i]) for i, conversation in enumerate(conversations)]
+
+def generate_batch(batch):
+    result = get_llm_client().complete(build_batch_prompt(batch), model=MODEL_ID, temperature=0.7)
+    return parse_batch_response(result, [item.index for item in batch])
+
+async def generate_batch_async(batch):
+    result = await get_async_llm_client().complete(build_batch_prompt(batch), model=MODEL_ID, temperature=0.7)
+    return parse_batch_response(result, [item.index for item in batch])
+
+def store_batch_outcomes(results, outcomes):
+    """Copy the questions of each batch outcome into results; failed batches are logged and skipped."""
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f"Error generating question batch: {str(outcome)}")
+            continue
+        for index, question in outcome.items():
+            results[index] = question.to_dict()
+
+def retry_batches(items, results):
+    """Single-item batches for the items a batched pass left without a question."""
+    if len(items) < 2:
+        return []
+    return [[item] for item in items if results[item.index] is None]
+
+def generate_questions_for_items(items, max_tokens: int = None):
+    """
+    Generate one question per GenerationItem, several items per LLM call, batches concurrently.
+    Items whose block is missing or incomplete in a batched answer are retried once on their own.
+    Returns (questions with None for failures, number of LLM calls).
+    """
+    results = [None] * len(items)
+    calls = 0
+    batches = pack_batches(items, max_tokens or BATCH_MAX_TOKENS)
+    for _ in range(2):  # batched pass, then one retry of the misses
+        calls += len(batches)
+        with ThreadPoolExecutor(max_workers=get_llm_client().max_concurrency) as pool:
+            futures = [pool.submit(generate_batch, batch) for batch in batches]
+        store_batch_outcomes(results, settled(futures))
+        batches = retry_batches(items, results)
+        if not batches:
+            break
+    return results, calls
+
+async def generate_questions_async(items, max_tokens: int = None):
+    """generate_questions_for_items with every batch of a pass awaited together."""
+    results = [None] * len(items)
+    calls = 0
+    batches = pack_batches(items, max_tokens or BATCH_MAX_TOKENS)
+    for _ in range(2):
+        calls += len(batches)
+        store_batch_outcomes(results, await asyncio.gather(*(generate_batch_async(batch) for batch in batches),
+                                                           return_exceptions=True))
+        batches = retry_batches(items, results)
+        if not batches:
+            break
+    return results, calls
+
+def generate_questions_batch(conversations, n_examples: int = 2, max_tokens: int = None):
+    """Generate one question per conversation, with similar indexed questions as few-shot examples."""
+    return generate_questions_for_items(generation_items(conversations, n_examples), max_tokens)
+
+def generate_questions_result(questions, calls):
+    return {'success': True, 'questions': questions, 'failed': [i for i, q in enumerate(questions) if q is None],
+            'llm_calls': calls}
+
+def generate_questions_job(ctx, payload):
+    return generate_questions_result(*generate_questions_batch(payload['conversations'], payload.get('examples', 2)))
+
+def generate_questions_payload(data):
+    """(job payload, None) for a /generate_questions body, or (None, error message)."""
+    conversations = data.get('conversations')
+    if (not isinstance(conversations, list) or not conversations
+            or not all(isinstance(c, str) and c.strip() for c in conversations)):
+        return None, 'conversations must be a non-empty list of strings'
+    if len(conversations) > MAX_BATCH_CONVERSATIONS:
+        return None, f'At most {MAX_BATCH_CONVERSATIONS} conversations per request'
+    try:
+        n_examples = min(max(int(data.get('examples', 2)), 0), 5)
+    except (TypeError, ValueError):
+        return None, 'examples must be an integer'
+    return {'conversations': conversations, 'examples': n_examples}, None
+
+@listening_bp.route('/generate_questions', methods=['POST'])
+async def generate_questions_route():
+    data = request.get_json(silent=True) or {}
+    payload, error = generate_questions_payload(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if is_async_request(data):
+        return job_accepted(*jobs.submit('generate_questions', payload))
+    try:
+        items = await get_embedding_executor().run(generation_items, payload['conversations'], payload['examples'])
+    except ExecutorBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify(generate_questions_result(*await generate_questions_async(items)))
+
+jobs.register('get_transcript', get_transcript_job)
+jobs.register('structure_section', structure_section_job)
+jobs.register('process_video', process_video)
+jobs.register('generate_question', generate_question_job)
+jobs.register('generate_questions', generate_questions_job)
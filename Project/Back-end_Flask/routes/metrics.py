@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from services.metrics import registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """HTTP, SQLite, LLM, embedding and cache metrics in the Prometheus text format."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,28 +1,147 @@
 import os
 import json
-import re
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from models.word import Word
 from models.word_progress import WordProgress
 from models.group import Group
 from models.database import Database
-# Nếu bạn dùng groq, cần cài đặt thư viện groq (pip install groq)
-try:
-    import groq
-except ImportError:
-    groq = None
-import json5
-import demjson3
+from services.llm_client import get_llm_client
+from services.async_llm_client import get_async_llm_client
+from services.jobs import jobs
+from services.llm_parsing import WordObjectStream, parse_word_objects
+from utils import is_async_request, job_accepted, wants_stream, sse_event, SSE_HEADERS
 
 word_import_bp = Blueprint('word_import', __name__)
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY") 
+MODEL_ID = "deepseek-r1-distill-llama-70b"
+# Cùng chủ đề + level thì dùng lại kết quả đã sinh trong khoảng thời gian này (giây)
+VOCAB_CACHE_TTL = int(os.getenv("VOCAB_CACHE_TTL", "86400"))
+
+# Fallback vocabulary for each JLPT level
+FALLBACK_VOCABULARY = {
+    'N5': [
+        {
+            "kanji": "水",
+            "romaji": "mizu",
+            "vietnamese": "nước",
+            "jlpt_level": "N5",
+            "parts": [{"kanji": "水", "romaji": ["mi", "zu"]}]
+        },
+        {
+            "kanji": "食べる",
+            "romaji": "taberu",
+            "vietnamese": "ăn",
+            "jlpt_level": "N5",
+            "parts": [{"kanji": "食", "romaji": ["ta"]}, {"kanji": "べ", "romaji": ["be"]}, {"kanji": "る", "romaji": ["ru"]}]
+        },
+        {
+            "kanji": "大きい",
+            "romaji": "ōkii",
+            "vietnamese": "to",
+            "jlpt_level": "N5",
+            "parts": [{"kanji": "大", "romaji": ["ō"]}, {"kanji": "き", "romaji": ["ki"]}, {"kanji": "い", "romaji": ["i"]}]
+        }
+    ],
+    'N4': [
+        {
+            "kanji": "準備",
+            "romaji": "junbi",
+            "vietnamese": "chuẩn bị",
+            "jlpt_level": "N4",
+            "parts": [{"kanji": "準", "romaji": ["jun"]}, {"kanji": "備", "romaji": ["bi"]}]
+        },
+        {
+            "kanji": "説明",
+            "romaji": "setsumei",
+            "vietnamese": "giải thích",
+            "jlpt_level": "N4",
+            "parts": [{"kanji": "説", "romaji": ["setsu"]}, {"kanji": "明", "romaji": ["mei"]}]
+        },
+        {
+            "kanji": "大切",
+            "romaji": "taisetsu",
+            "vietnamese": "quan trọng",
+            "jlpt_level": "N4",
+            "parts": [{"kanji": "大", "romaji": ["tai"]}, {"kanji": "切", "romaji": ["setsu"]}]
+        }
+    ],
+    'N3': [
+        {
+            "kanji": "改善",
+            "romaji": "kaizen",
+            "vietnamese": "cải thiện",
+            "jlpt_level": "N3",
+            "parts": [{"kanji": "改", "romaji": ["kai"]}, {"kanji": "善", "romaji": ["zen"]}]
+        },
+        {
+            "kanji": "確認",
+            "romaji": "kakunin",
+            "vietnamese": "xác nhận",
+            "jlpt_level": "N3",
+            "parts": [{"kanji": "確", "romaji": ["kaku"]}, {"kanji": "認", "romaji": ["nin"]}]
+        },
+        {
+            "kanji": "理解",
+            "romaji": "rikai",
+            "vietnamese": "hiểu",
+            "jlpt_level": "N3",
+            "parts": [{"kanji": "理", "romaji": ["ri"]}, {"kanji": "解", "romaji": ["kai"]}]
+        }
+    ],
+    'N2': [
+        {
+            "kanji": "実現",
+            "romaji": "jitsugen",
+            "vietnamese": "thực hiện",
+            "jlpt_level": "N2",
+            "parts": [{"kanji": "実", "romaji": ["jitsu"]}, {"kanji": "現", "romaji": ["gen"]}]
+        },
+        {
+            "kanji": "影響",
+            "romaji": "eikyō",
+            "vietnamese": "ảnh hưởng",
+            "jlpt_level": "N2",
+            "parts": [{"kanji": "影", "romaji": ["ei"]}, {"kanji": "響", "romaji": ["kyō"]}]
+        },
+        {
+            "kanji": "開発",
+            "romaji": "kaihatsu",
+            "vietnamese": "phát triển",
+            "jlpt_level": "N2",
+            "parts": [{"kanji": "開", "romaji": ["kai"]}, {"kanji": "発", "romaji": ["hatsu"]}]
+        }
+    ],
+    'N1': [
+        {
+            "kanji": "継続",
+            "romaji": "keizoku",
+            "vietnamese": "tiếp tục",
+            "jlpt_level": "N1",
+            "parts": [{"kanji": "継", "romaji": ["kei"]}, {"kanji": "続", "romaji": ["zoku"]}]
+        },
+        {
+            "kanji": "促進",
+            "romaji": "sokushin",
+            "vietnamese": "thúc đẩy",
+            "jlpt_level": "N1",
+            "parts": [{"kanji": "促", "romaji": ["soku"]}, {"kanji": "進", "romaji": ["shin"]}]
+        },
+        {
+            "kanji": "維持",
+            "romaji": "iji",
+            "vietnamese": "duy trì",
+            "jlpt_level": "N1",
+            "parts": [{"kanji": "維", "romaji": ["i"]}, {"kanji": "持", "romaji": ["ji"]}]
+        }
+    ]
+}
 
 def save_jlpt_level(word_id, jlpt_level):
     """Lưu JLPT level cho từ vựng vào database"""
     db = Database()
     cursor = db.cursor()
-    cursor.execute('INSERT OR REPLACE INTO jlpt_levels (word_id, level) VALUES (?, ?)',
+    cursor.execute('''INSERT INTO jlpt_levels (word_id, level) VALUES (?, ?)
+                      ON CONFLICT (word_id) DO UPDATE SET level = excluded.level''',
                    (word_id, jlpt_level))
     db.commit()
 
@@ -80,82 +199,28 @@ def import_words_to_database(words_data, thematic_category):
         'group': created_group
     }
 
-def extract_valid_json_objects(text):
-    import json
-    valid = []
-    seen = set()
-    brace_stack = []
-    start_idx = None
-    for i, c in enumerate(text):
-        if c == '{':
-            if not brace_stack:
-                start_idx = i
-            brace_stack.append('{')
-        elif c == '}':
-            if brace_stack:
-                brace_stack.pop()
-                if not brace_stack and start_idx is not None:
-                    obj_str = text[start_idx:i+1]
-                    try:
-                        obj = json.loads(obj_str)
-                        required = {"kanji", "romaji", "vietnamese", "jlpt_level", "parts"}
-                        if not required.issubset(obj):
-                            continue
-                        key = (obj["kanji"], obj["jlpt_level"])
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        valid.append(obj)
-                    except Exception:
-                        continue
-    return valid
-
 def parse_json_response(text, fallback_data):
-    import re
-    import json
-    import json5
-    import demjson3
-    # Loại bỏ <think>...</think> và markdown
-    text = re.sub(r'<think>[\s\S]*?</think>', '', text)
-    text = text.replace('```json', '').replace('```', '').strip()
-    # Tìm đoạn bắt đầu bằng [ hoặc {
-    match = re.search(r'(\[.*\]|\{.*\})', text, re.DOTALL)
-    if match:
-        json_candidate = match.group(1)
-        for parser in (json.loads, json5.loads, demjson3.decode):
-            try:
-                return parser(json_candidate)
-            except Exception as e:
-                print(f"Parser {parser.__name__} failed: {e}")
-    # Nếu vẫn lỗi, thì lọc object hợp lệ
-    valid_objs = extract_valid_json_objects(text)
-    if valid_objs:
-        return valid_objs
-    print("All parse attempts failed. Using fallback.")
+    """Lấy các object từ vựng hợp lệ từ output của LLM, dùng fallback nếu không có object nào"""
+    words = parse_word_objects(text)
+    if words:
+        return words
+    print("No valid word objects in LLM response. Using fallback.")
     return fallback_data
 
-@word_import_bp.route('/generate_words', methods=['POST'])
-def generate_words():
-    try:
-        data = request.json
-        thematic_category = data.get('thematicCategory')
-        jlpt_level = data.get('jlptLevel', 'N5')  # Default to N5 if not provided
-        
-        if not thematic_category:
-            return jsonify({"error": "Thematic category is required"}), 400
-
-        # Map JLPT levels to difficulty descriptions
-        jlpt_descriptions = {
-            'N5': 'cơ bản nhất (N5) - từ vựng đơn giản, thường dùng trong cuộc sống hàng ngày',
-            'N4': 'sơ cấp (N4) - từ vựng cơ bản đến trung cấp, thường gặp trong giao tiếp',
-            'N3': 'trung cấp (N3) - từ vựng trung cấp, phù hợp cho người học có nền tảng',
-            'N2': 'trung cao cấp (N2) - từ vựng khá phức tạp, thường dùng trong văn viết',
-            'N1': 'cao cấp (N1) - từ vựng nâng cao, thường gặp trong văn học và báo chí'
-        }
-        
-        jlpt_description = jlpt_descriptions.get(jlpt_level, jlpt_descriptions['N5'])
+def build_vocabulary_prompt(thematic_category, jlpt_level='N5'):
+    """Tạo prompt sinh từ vựng theo chủ đề và level JLPT"""
+    # Map JLPT levels to difficulty descriptions
+    jlpt_descriptions = {
+        'N5': 'cơ bản nhất (N5) - từ vựng đơn giản, thường dùng trong cuộc sống hàng ngày',
+        'N4': 'sơ cấp (N4) - từ vựng cơ bản đến trung cấp, thường gặp trong giao tiếp',
+        'N3': 'trung cấp (N3) - từ vựng trung cấp, phù hợp cho người học có nền tảng',
+        'N2': 'trung cao cấp (N2) - từ vựng khá phức tạp, thường dùng trong văn viết',
+        'N1': 'cao cấp (N1) - từ vựng nâng cao, thường gặp trong văn học và báo chí'
+    }
+    
+    jlpt_description = jlpt_descriptions.get(jlpt_level, jlpt_descriptions['N5'])
 
-        prompt = f'''
+    prompt = f'''
 Hãy tạo danh sách từ vựng tiếng Nhật theo chủ đề: "{thematic_category}" với độ khó {jlpt_description}.
 
 Yêu cầu:
@@ -257,144 +322,67 @@ Ví dụ định dạng đúng:
   }}
 ]
 '''
+    return prompt
 
-        if groq is None:
-            return jsonify({"error": "groq library not installed. Please run 'pip install groq'"}), 500
+def fallback_words(jlpt_level):
+    return FALLBACK_VOCABULARY.get(jlpt_level, FALLBACK_VOCABULARY['N5'])
 
-        client = groq.Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model="deepseek-r1-distill-llama-70b",  # hoặc model bạn muốn
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=2000,
-        ) 
-        text = response.choices[0].message.content
+def vocabulary_request(thematic_category, jlpt_level='N5'):
+    return dict(prompt=build_vocabulary_prompt(thematic_category, jlpt_level), model=MODEL_ID, temperature=0.7,
+                max_tokens=2000, cache_ttl=VOCAB_CACHE_TTL, cache_tag='generate_words')
 
-        print("===== RAW LLM RESPONSE START =====")
-        print(text)
-        print("===== RAW LLM RESPONSE END =====")
+def generate_vocabulary(thematic_category, jlpt_level='N5'):
+    """Sinh danh sách từ vựng theo chủ đề bằng LLM, dùng fallback nếu không parse được"""
+    text = get_llm_client().complete(**vocabulary_request(thematic_category, jlpt_level))
+    return parse_json_response(text, fallback_words(jlpt_level))
 
-        # Fallback vocabulary for each JLPT level
-        fallback_vocabulary = {
-            'N5': [
-                {
-                    "kanji": "水",
-                    "romaji": "mizu",
-                    "vietnamese": "nước",
-                    "jlpt_level": "N5",
-                    "parts": [{"kanji": "水", "romaji": ["mi", "zu"]}]
-                },
-                {
-                    "kanji": "食べる",
-                    "romaji": "taberu",
-                    "vietnamese": "ăn",
-                    "jlpt_level": "N5",
-                    "parts": [{"kanji": "食", "romaji": ["ta"]}, {"kanji": "べ", "romaji": ["be"]}, {"kanji": "る", "romaji": ["ru"]}]
-                },
-                {
-                    "kanji": "大きい",
-                    "romaji": "ōkii",
-                    "vietnamese": "to",
-                    "jlpt_level": "N5",
-                    "parts": [{"kanji": "大", "romaji": ["ō"]}, {"kanji": "き", "romaji": ["ki"]}, {"kanji": "い", "romaji": ["i"]}]
-                }
-            ],
-            'N4': [
-                {
-                    "kanji": "準備",
-                    "romaji": "junbi",
-                    "vietnamese": "chuẩn bị",
-                    "jlpt_level": "N4",
-                    "parts": [{"kanji": "準", "romaji": ["jun"]}, {"kanji": "備", "romaji": ["bi"]}]
-                },
-                {
-                    "kanji": "説明",
-                    "romaji": "setsumei",
-                    "vietnamese": "giải thích",
-                    "jlpt_level": "N4",
-                    "parts": [{"kanji": "説", "romaji": ["setsu"]}, {"kanji": "明", "romaji": ["mei"]}]
-                },
-                {
-                    "kanji": "大切",
-                    "romaji": "taisetsu",
-                    "vietnamese": "quan trọng",
-                    "jlpt_level": "N4",
-                    "parts": [{"kanji": "大", "romaji": ["tai"]}, {"kanji": "切", "romaji": ["setsu"]}]
-                }
-            ],
-            'N3': [
-                {
-                    "kanji": "改善",
-                    "romaji": "kaizen",
-                    "vietnamese": "cải thiện",
-                    "jlpt_level": "N3",
-                    "parts": [{"kanji": "改", "romaji": ["kai"]}, {"kanji": "善", "romaji": ["zen"]}]
-                },
-                {
-                    "kanji": "確認",
-                    "romaji": "kakunin",
-                    "vietnamese": "xác nhận",
-                    "jlpt_level": "N3",
-                    "parts": [{"kanji": "確", "romaji": ["kaku"]}, {"kanji": "認", "romaji": ["nin"]}]
-                },
-                {
-                    "kanji": "理解",
-                    "romaji": "rikai",
-                    "vietnamese": "hiểu",
-                    "jlpt_level": "N3",
-                    "parts": [{"kanji": "理", "romaji": ["ri"]}, {"kanji": "解", "romaji": ["kai"]}]
-                }
-            ],
-            'N2': [
-                {
-                    "kanji": "実現",
-                    "romaji": "jitsugen",
-                    "vietnamese": "thực hiện",
-                    "jlpt_level": "N2",
-                    "parts": [{"kanji": "実", "romaji": ["jitsu"]}, {"kanji": "現", "romaji": ["gen"]}]
-                },
-                {
-                    "kanji": "影響",
-                    "romaji": "eikyō",
-                    "vietnamese": "ảnh hưởng",
-                    "jlpt_level": "N2",
-                    "parts": [{"kanji": "影", "romaji": ["ei"]}, {"kanji": "響", "romaji": ["kyō"]}]
-                },
-                {
-                    "kanji": "開発",
-                    "romaji": "kaihatsu",
-                    "vietnamese": "phát triển",
-                    "jlpt_level": "N2",
-                    "parts": [{"kanji": "開", "romaji": ["kai"]}, {"kanji": "発", "romaji": ["hatsu"]}]
-                }
-            ],
-            'N1': [
-                {
-                    "kanji": "継続",
-                    "romaji": "keizoku",
-                    "vietnamese": "tiếp tục",
-                    "jlpt_level": "N1",
-                    "parts": [{"kanji": "継", "romaji": ["kei"]}, {"kanji": "続", "romaji": ["zoku"]}]
-                },
-                {
-                    "kanji": "促進",
-                    "romaji": "sokushin",
-                    "vietnamese": "thúc đẩy",
-                    "jlpt_level": "N1",
-                    "parts": [{"kanji": "促", "romaji": ["soku"]}, {"kanji": "進", "romaji": ["shin"]}]
-                },
-                {
-                    "kanji": "維持",
-                    "romaji": "iji",
-                    "vietnamese": "duy trì",
-                    "jlpt_level": "N1",
-                    "parts": [{"kanji": "維", "romaji": ["i"]}, {"kanji": "持", "romaji": ["ji"]}]
-                }
-            ]
-        }
+async def generate_vocabulary_async(thematic_category, jlpt_level='N5'):
+    text = await get_async_llm_client().complete(**vocabulary_request(thematic_category, jlpt_level))
+    return parse_json_response(text, fallback_words(jlpt_level))
 
-        json_response = parse_json_response(text, fallback_vocabulary.get(jlpt_level, fallback_vocabulary['N5']))
-        return jsonify(json_response)
+def generate_vocabulary_events(thematic_category, jlpt_level='N5'):
+    """Stream từ vựng dưới dạng SSE: mỗi object hợp lệ là một event `word`, kết thúc bằng `done`"""
+    words = WordObjectStream()
+    count = 0
+    try:
+        for delta in get_llm_client().stream_complete(build_vocabulary_prompt(thematic_category, jlpt_level),
+                                                      model=MODEL_ID, temperature=0.7, max_tokens=2000,
+                                                      cache_ttl=VOCAB_CACHE_TTL, cache_tag='generate_words'):
+            for word in words.feed(delta):
+                yield sse_event('word', word)
+                count += 1
+        for word in words.close():
+            yield sse_event('word', word)
+            count += 1
+        fallback = count == 0
+        if fallback:
+            # Không parse được từ nào thì trả về danh sách dự phòng
+            for word in fallback_words(jlpt_level):
+                yield sse_event('word', word)
+                count += 1
+        yield sse_event('done', {'count': count, 'fallback': fallback})
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+
+@word_import_bp.route('/generate_words', methods=['POST'])
+async def generate_words():
+    try:
+        data = request.json
+        thematic_category = data.get('thematicCategory')
+        jlpt_level = data.get('jlptLevel', 'N5')  # Default to N5 if not provided
+        
+        if not thematic_category:
+            return jsonify({"error": "Thematic category is required"}), 400
+
+        if is_async_request(data):
+            return job_accepted(*jobs.submit('generate_words', {'thematicCategory': thematic_category, 'jlptLevel': jlpt_level}))
+
+        if wants_stream():
+            # No stream_with_context from an async view; the events need no request context
+            return Response(generate_vocabulary_events(thematic_category, jlpt_level),
+                            mimetype='text/event-stream', headers=SSE_HEADERS)
+
+        return jsonify(await generate_vocabulary_async(thematic_category, jlpt_level))
     except Exception as e:
         import traceback
         print("Error generating vocabulary:", e)
@@ -428,4 +416,9 @@ def import_words():
         import traceback
         print("Error importing words:", e)
         traceback.print_exc()
-        return jsonify({"error": "Failed to import words"}), 500 
\ No newline at end of file
+        return jsonify({"error": "Failed to import words"}), 500
+
+def generate_words_job(ctx, payload):
+    return generate_vocabulary(payload['thematicCategory'], payload.get('jlptLevel', 'N5'))
+
+jobs.register('generate_words', generate_words_job)
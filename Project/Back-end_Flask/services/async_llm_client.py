@@ -0,0 +1,194 @@
+"""Non-blocking LLM calls for Flask async views.
+
+Flask runs each async view in a short-lived event loop of its own, so connections and
+semaphores cannot live there. Each worker process instead runs one background event loop
+(started on first use, rebuilt after fork) that owns a long-lived httpx.AsyncClient and an
+asyncio.Semaphore of LLM_ASYNC_MAX_CONCURRENCY (default 256) slots; views await their calls
+on that loop, so hundreds of calls can be in flight per worker over keep-alive connections.
+Payloads, the completion cache and metrics are shared with LLMClient. Sync callers keep
+using LLMClient and its requests.Session pool.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+
+from services.completion_cache import make_cache_key
+from services.llm_client import RETRY_STATUS_CODES, LLMError, OpenAICompatibleProvider, get_llm_client
+from services.metrics import LLM_ERRORS, LLM_LATENCY
+
+
+class WorkerLoop:
+    """One event loop per process, running in a daemon thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='llm-event-loop', daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule coro on the loop from any thread; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop())
+
+    async def run(self, coro):
+        """Await coro on the worker loop; cancelling the caller cancels it there too."""
+        loop = self.loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def reset(self):
+        # The loop thread does not survive fork
+        self._lock = threading.Lock()
+        self._loop = None
+
+
+worker_loop = WorkerLoop()
+
+
+class AsyncOpenAICompatibleProvider:
+    """OpenAI-style chat completions over one pooled httpx.AsyncClient, with the retry policy
+    of OpenAICompatibleProvider. Used from the worker loop only."""
+
+    name = 'openai-compatible-async'
+    _headers = OpenAICompatibleProvider._headers
+    _backoff = OpenAICompatibleProvider._backoff
+
+    def __init__(self, url, api_key=None, timeout=(5, 120), max_retries=3, backoff_base=0.5, backoff_max=20.0,
+                 max_connections=256):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._http = None
+
+    @classmethod
+    def from_provider(cls, provider, max_connections=256):
+        return cls(url=provider.url, api_key=provider.api_key, timeout=provider.timeout,
+                   max_retries=provider.max_retries, backoff_base=provider.backoff_base,
+                   backoff_max=provider.backoff_max, max_connections=max_connections)
+
+    def _client(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._http
+
+    async def chat(self, payload):
+        """POST with retries on connection errors, timeouts, 429 and 5xx responses."""
+        client = self._client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await client.post(self.url, headers=self._headers(), json=payload)
+            except httpx.TransportError as e:
+                last_error = LLMError(f"LLM request failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                last_error = LLMError(f"LLM request failed with status {response.status_code}: "
+                                      f"{response.text[:200]}", status_code=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise last_error
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response))
+        raise last_error
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class AsyncLLMClient:
+    """Async chat()/complete() over an LLMClient's provider settings and cache, bounded by
+    its own semaphore; providers without an async transport run in a worker thread."""
+
+    def __init__(self, client, max_concurrency=256):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.provider = None
+        if isinstance(client.provider, OpenAICompatibleProvider):
+            self.provider = AsyncOpenAICompatibleProvider.from_provider(client.provider,
+                                                                        max_connections=max_concurrency)
+        self._semaphore = None  # created on the worker loop
+
+    def in_flight(self):
+        """Slots currently taken (0 when no call has been made yet)."""
+        return 0 if self._semaphore is None else self.max_concurrency - self._semaphore._value
+
+    async def _chat(self, messages, model, cache_ttl, cache_tag, params):
+        client = self.client
+        if self.provider is None:
+            return await asyncio.to_thread(client.chat, messages, model=model, cache_ttl=cache_ttl,
+                                           cache_tag=cache_tag, **params)
+        payload = client.build_payload(messages, model=model, **params)
+        cacheable, ttl = client._cache_policy(payload, cache_ttl)
+        if cacheable:
+            key = make_cache_key(payload)
+            cached = await asyncio.to_thread(client.cache.get, key, tag=cache_tag)
+            if cached is not None:
+                return cached
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self.provider.chat(payload)
+            except LLMError as e:
+                LLM_ERRORS.inc(model=payload["model"], status=e.status_code or 'network')
+                raise
+            LLM_LATENCY.observe(time.perf_counter() - start, model=payload["model"], mode='chat')
+        client._count_tokens(payload["model"], response)
+        if cacheable:
+            await asyncio.to_thread(client.cache.set, key, response, model=payload["model"], ttl=ttl, tag=cache_tag)
+        return response
+
+    async def chat(self, messages, model=None, cache_ttl=None, cache_tag='default', **params):
+        return await worker_loop.run(self._chat(messages, model, cache_ttl, cache_tag, params))
+
+    async def complete(self, prompt, model=None, **params):
+        response = await self.chat([{"role": "user", "content": prompt}], model=model, **params)
+        try:
+            return response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("Malformed completion response")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_async_llm_client():
+    """Async client over the current get_llm_client(), rebuilt when that client is replaced."""
+    global _client
+    client = get_llm_client()
+    with _client_lock:
+        if _client is None or _client.client is not client:
+            previous = _client
+            _client = AsyncLLMClient(client, max_concurrency=int(os.getenv('LLM_ASYNC_MAX_CONCURRENCY', '256')))
+            if previous is not None and previous.provider is not None and previous.provider._http is not None:
+                worker_loop.submit(previous.provider.aclose())
+        return _client
+
+
+def _reset_after_fork():
+    global _client, _client_lock
+    _client, _client_lock = None, threading.Lock()
+    worker_loop.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'llm_cache.db')
+
+
+def make_cache_key(payload):
+    """Content address of a completion request: hash of model id, messages and sampling params."""
+    canonical = json.dumps({k: v for k, v in payload.items() if k != 'stream'},
+                           sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """Size-bounded LRU cache of LLM responses persisted in a local SQLite file."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_completions_accessed_at ON completions(accessed_at);
+        ''')
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stores': 0})
+        self._evictions = 0
+
+    def get(self, key, tag='default'):
+        """Return the cached response dict or None; expired entries count as misses."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM completions WHERE key = ?', (key,)).fetchone()
+            if row and row[1] is not None and row[1] <= now:
+                self._conn.execute('DELETE FROM completions WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self._counters[tag]['misses'] += 1
+                return None
+            self._conn.execute('UPDATE completions SET accessed_at = ? WHERE key = ?', (now, key))
+            self._counters[tag]['hits'] += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, model=None, ttl=None, tag='default'):
+        """Store a response; ttl in seconds, None means no expiry."""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO completions (key, model, value, size, created_at, accessed_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (key, model, data, size, now, now, expires_at))
+            self._counters[tag]['stores'] += 1
+            self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        self._conn.execute('DELETE FROM completions WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM completions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute('SELECT key, size FROM completions ORDER BY accessed_at').fetchall():
+            self._conn.execute('DELETE FROM completions WHERE key = ?', (key,))
+            self._evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM completions')
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions').fetchone()
+            by_tag = {}
+            hits = misses = 0
+            for tag, counter in self._counters.items():
+                lookups = counter['hits'] + counter['misses']
+                by_tag[tag] = {
+                    **counter,
+                    'hit_rate': round(counter['hits'] / lookups, 3) if lookups else 0.0
+                }
+                hits += counter['hits']
+                misses += counter['misses']
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                'evictions': self._evictions,
+                'by_tag': by_tag
+            }
@@ -0,0 +1,82 @@
+"""Bounded thread pool for CPU-bound embedding work called from async views.
+
+SentenceTransformer encoding and ChromaDB queries would stall the event loop, so async
+views run them here. At most EMBEDDING_WORKERS jobs run at once and at most
+EMBEDDING_MAX_PENDING are accepted in total; beyond that submit() raises ExecutorBusy
+instead of queueing without limit.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """Raised when the executor already holds max_pending jobs."""
+
+
+class EmbeddingExecutor:
+    def __init__(self, max_workers=2, max_pending=64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='embedding')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Start fn in the pool and return its concurrent Future."""
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusy(f"embedding executor is full ({self.max_pending} pending)")
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_embedding_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = EmbeddingExecutor(max_workers=int(os.getenv('EMBEDDING_WORKERS', '2')),
+                                              max_pending=int(os.getenv('EMBEDDING_MAX_PENDING', '64')))
+    return _executor
+
+
+def _reset_after_fork():
+    # Pool threads do not survive fork
+    global _executor, _executor_lock
+    _executor, _executor_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_embedding_executor(executor):
+    """Replace the process-wide executor (tests). Returns the previous one."""
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, executor
+    return previous
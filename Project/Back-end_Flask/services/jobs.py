@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'jobs.db')
+
+ACTIVE_STATUSES = ('queued', 'running')
+# Idle workers are woken by submits of their own process; jobs queued by other processes are
+# picked up by polling at this interval
+POLL_INTERVAL = 1.0
+# Each process refreshes heartbeat_at of the jobs it runs; a running job whose heartbeat is
+# older than JOB_STALE_AFTER seconds lost its process and is failed by the next claim
+HEARTBEAT_INTERVAL = 10.0
+STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '60'))
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class JobContext:
+    """Handle passed to job handlers for reporting progress and checking cancellation."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    @property
+    def cancelled(self):
+        return self.queue.is_cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def update_stage(self, stage, **fields):
+        self.queue.update_stage(self.job_id, stage, **fields)
+
+    def advance_stage(self, stage, step=1):
+        self.queue.advance_stage(self.job_id, stage, step)
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by in-process worker threads.
+
+    Handlers are registered per job kind and called as handler(ctx, payload); their
+    return value must be JSON-serialisable and becomes the job result. Several processes
+    (preforked workers) may share one jobs database: dedup, claiming and cancellation go
+    through the table, never through per-process state.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_PATH, workers=4):
+        self.path = path
+        self.workers = workers
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._running = set()
+        self._connect()
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL CHECK(status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+                dedup_key TEXT,
+                payload TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(kind, dedup_key, status);
+        ''')
+        with self._transaction():
+            columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+            if 'cancel_requested' not in columns:
+                # Cancel of a running job, read by whichever process runs it
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0')
+            if 'heartbeat_at' not in columns:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE: takes the write lock up front, so a read-then-write is atomic
+        across processes too. Caller holds self._lock (one connection per process)."""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def after_fork(self):
+        """In a forked child: own connection, fresh lock, no inherited worker threads.
+        Running jobs belong to other processes and keep their heartbeats."""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._running = set()
+        self._connect()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Start worker threads and the heartbeat thread (idempotent)."""
+        with self._lock:
+            if self._threads or not self.workers:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind, payload, stages=(), dedup_key=None):
+        """Queue a job; an identical in-flight job (same kind + dedup key) is reused.
+
+        Returns (job_id, created).
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        if dedup_key is None:
+            dedup_key = hashlib.sha256(payload_json.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                row = self._conn.execute(f'''
+                    SELECT id FROM jobs WHERE kind = ? AND dedup_key = ? AND status IN {ACTIVE_STATUSES}
+                    ORDER BY created_at LIMIT 1
+                ''', (kind, dedup_key)).fetchone()
+                if row:
+                    return row['id'], False
+                job_id = uuid.uuid4().hex
+                stages_json = json.dumps({name: {'status': 'pending', 'done': 0, 'total': None} for name in stages})
+                self._conn.execute('''
+                    INSERT INTO jobs (id, kind, status, dedup_key, payload, stages, created_at, updated_at)
+                    VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)
+                ''', (job_id, kind, dedup_key, payload_json, stages_json, now, now))
+            self._wakeup.notify()
+        self.start()
+        return job_id, True
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query = 'SELECT * FROM jobs'
+        params = []
+        if status:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately or ask a running one to stop. Returns False if already finished."""
+        now = time.time()
+        with self._lock:
+            # Each UPDATE re-checks the status, so a job claimed meanwhile by another process
+            # gets the cancel request instead
+            cursor = self._conn.execute('''
+                UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? WHERE id = ? AND status = 'queued'
+            ''', (now, now, job_id))
+            if cursor.rowcount:
+                return True
+            cursor = self._conn.execute('''
+                UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'running'
+            ''', (now, job_id))
+            return cursor.rowcount > 0
+
+    def is_cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def update_stage(self, job_id, stage, **fields):
+        with self._lock:
+            stages = self._load_stages(job_id)
+            stages.setdefault(stage, {'status': 'pending', 'done': 0, 'total': None}).update(fields)
+            self._save_stages(job_id, stages)
+
+    def advance_stage(self, job_id, stage, step=1):
+        with self._lock:
+            stages = self._load_stages(job_id)
+            stages[stage]['done'] += step
+            self._save_stages(job_id, stages)
+
+    def _load_stages(self, job_id):
+        return json.loads(self._conn.execute('SELECT stages FROM jobs WHERE id = ?', (job_id,)).fetchone()[0])
+
+    def _save_stages(self, job_id, stages):
+        self._conn.execute('UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?',
+                           (json.dumps(stages), time.time(), job_id))
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                self._touch_running()
+
+    def _touch_running(self):
+        """Refresh heartbeat_at of the jobs this process runs; caller holds the lock."""
+        if self._running:
+            ids = list(self._running)
+            self._conn.execute(f'''
+                UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND id IN ({', '.join('?' * len(ids))})
+            ''', [time.time(), *ids])
+
+    def _reclaim_stale(self):
+        """Fail running jobs whose process stopped heartbeating (crash, restart); caller holds the lock.
+        They cannot be resumed."""
+        now = time.time()
+        self._conn.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', updated_at = ?, finished_at = ?
+            WHERE status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?
+        ''', (now, now, now - STALE_AFTER))
+
+    def _claim(self):
+        """Mark the oldest queued job as running and return it; caller holds the lock.
+
+        The UPDATE only succeeds while the row is still queued, so when another process
+        claims the same job first this one moves on to the next.
+        """
+        self._reclaim_stale()
+        while True:
+            row = self._conn.execute('''
+                SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1
+            ''').fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            cursor = self._conn.execute('''
+                UPDATE jobs SET status = 'running', owner_pid = ?, started_at = ?, updated_at = ?, heartbeat_at = ?
+                WHERE id = ? AND status = 'queued'
+            ''', (os.getpid(), now, now, now, row['id']))
+            if cursor.rowcount:
+                self._running.add(row['id'])
+                return row['id'], row['kind'], json.loads(row['payload'])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            self._running.discard(job_id)
+            self._conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?
+            ''', (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                  error, now, now, job_id))
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                claimed = self._claim()
+                while claimed is None:
+                    self._wakeup.wait(timeout=POLL_INTERVAL)
+                    claimed = self._claim()
+            job_id, kind, payload = claimed
+            ctx = JobContext(self, job_id)
+            try:
+                result = self._handlers[kind](ctx, payload)
+                if ctx.cancelled:
+                    self._finish(job_id, 'cancelled')
+                else:
+                    self._finish(job_id, 'succeeded', result=result)
+            except JobCancelled:
+                self._finish(job_id, 'cancelled')
+            except Exception as e:
+                logger.warning("job failed id=%s kind=%s error=%s", job_id, kind, e)
+                self._finish(job_id, 'failed', error=str(e))
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job.pop('dedup_key', None)
+        job['cancel_requested'] = bool(job.get('cancel_requested'))
+        job['payload'] = json.loads(job['payload'])
+        job['stages'] = json.loads(job['stages'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+
+jobs = JobQueue(path=os.getenv('JOBS_DB_PATH', DEFAULT_JOBS_PATH), workers=int(os.getenv('JOB_WORKERS', '4')))
+os.register_at_fork(after_in_child=jobs.after_fork)
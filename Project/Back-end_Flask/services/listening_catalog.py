@@ -0,0 +1,197 @@
+"""Catalog of already processed listening videos.
+
+Everything the practice UI needs for a processed video (sections, their times and parsed
+questions) is collected from Data/split, Data/questions and the transcript indexes into one
+manifest (Data/catalog.json), so a video can be opened with a single request instead of the
+transcript -> structure -> index waterfall.
+
+The manifest remembers the mtime of every source file. A refresh only stats the source
+directories and re-reads the videos whose files changed, appeared or disappeared; reads
+trigger a refresh at most every `min_interval` seconds.
+
+Run `python -m services.listening_catalog` to (re)build the manifest.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from services.question_parser import load_questions
+from services.transcript_store import load_index, index_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = 'catalog.json'
+
+_SPLIT_FILE = re.compile(r'(.+)_section(\d+)\.txt')
+_QUESTIONS_FILE = re.compile(r'(.+)_section(\d+)_questions\.txt')
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ListeningCatalog:
+    def __init__(self, data_dir, manifest_path=None, min_interval=2.0):
+        self.data_dir = data_dir
+        self.manifest_path = manifest_path or os.path.join(data_dir, MANIFEST_NAME)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_scan = None
+        self._videos = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('videos', {})
+
+    def _write_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'generated_at': time.time(), 'videos': self._videos},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _scan(self):
+        """{video_id: {'split': {num: mtime}, 'questions': {num: mtime}, 'index': mtime}} from a stat pass."""
+        sources = {}
+
+        def source(video_id):
+            return sources.setdefault(video_id, {'split': {}, 'questions': {}, 'index': None})
+
+        split_dir = os.path.join(self.data_dir, 'split')
+        if os.path.isdir(split_dir):
+            for video_id in os.listdir(split_dir):
+                video_dir = os.path.join(split_dir, video_id)
+                if not os.path.isdir(video_dir):
+                    continue
+                for entry in os.scandir(video_dir):
+                    match = _SPLIT_FILE.fullmatch(entry.name)
+                    if match and match.group(1) == video_id:
+                        source(video_id)['split'][match.group(2)] = entry.stat().st_mtime
+        questions_dir = os.path.join(self.data_dir, 'questions')
+        if os.path.isdir(questions_dir):
+            for entry in os.scandir(questions_dir):
+                match = _QUESTIONS_FILE.fullmatch(entry.name)
+                if match:
+                    source(match.group(1))['questions'][match.group(2)] = entry.stat().st_mtime
+        transcripts_dir = os.path.join(self.data_dir, 'transcripts')
+        for video_id, src in sources.items():
+            src['index'] = _mtime(index_path(transcripts_dir, video_id))
+        return sources
+
+    def _build_video(self, video_id, src, old):
+        """Manifest entry for one video; sections whose questions file is unchanged are reused."""
+        old_sections = {str(s['section_num']): s for s in old['sections']} if old else {}
+        old_questions = old['sources']['questions'] if old else {}
+        index = load_index(os.path.join(self.data_dir, 'transcripts'), video_id) if src['index'] else None
+        times = {str(s['section_num']): (s['start'], s['end']) for s in index['sections']} if index else {}
+        sections = []
+        for num in sorted(set(src['split']) | set(src['questions']), key=int):
+            if num in src['questions'] and old_questions.get(num) == src['questions'][num] and num in old_sections:
+                questions = old_sections[num]['questions']
+            elif num in src['questions']:
+                questions = load_questions(os.path.join(self.data_dir, 'questions', f"{video_id}_section{num}_questions.txt"))
+            else:
+                questions = []
+            start, end = times.get(num, (None, None))
+            sections.append({
+                'section_num': int(num),
+                'has_split': num in src['split'],
+                'has_questions': num in src['questions'],
+                'start': start,
+                'end': end,
+                'num_questions': len(questions),
+                'questions': questions,
+            })
+        return {
+            'video_id': video_id,
+            'sources': src,
+            'sections': sections,
+            'total_questions': sum(s['num_questions'] for s in sections),
+            'processed': bool(sections) and all(s['has_questions'] for s in sections),
+        }
+
+    def refresh(self, force=False):
+        """Re-read changed videos; returns the ids that were added, updated or removed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_scan is not None and now - self._last_scan < self.min_interval:
+                return []
+            self._last_scan = now
+            sources = self._scan()
+            changed = []
+            for video_id, src in sources.items():
+                old = self._videos.get(video_id)
+                if old is None or old['sources'] != src:
+                    self._videos[video_id] = self._build_video(video_id, src, old)
+                    changed.append(video_id)
+            for video_id in set(self._videos) - set(sources):
+                del self._videos[video_id]
+                changed.append(video_id)
+            if changed:
+                try:
+                    self._write_manifest()
+                except OSError as e:
+                    logger.warning("could not write listening catalog path=%s error=%s", self.manifest_path, e)
+            return changed
+
+    def invalidate(self):
+        """Make the next read rescan, e.g. right after new questions were saved."""
+        with self._lock:
+            self._last_scan = None
+
+    def videos(self):
+        """Summaries of every video in the catalog (without questions)."""
+        self.refresh()
+        with self._lock:
+            return [{
+                'video_id': video['video_id'],
+                'sections': [{k: v for k, v in s.items() if k != 'questions'} for s in video['sections']],
+                'total_questions': video['total_questions'],
+                'processed': video['processed'],
+            } for _, video in sorted(self._videos.items())]
+
+    def video(self, video_id):
+        """Full catalog entry with parsed questions, or None."""
+        self.refresh()
+        with self._lock:
+            video = self._videos.get(video_id)
+            if video is None:
+                return None
+            return {k: v for k, v in video.items() if k != 'sources'}
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_listening_catalog(data_dir):
+    """Shared catalog per data directory; CATALOG_REFRESH_INTERVAL sets the rescan interval."""
+    key = os.path.abspath(data_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = ListeningCatalog(key, min_interval=float(os.getenv('CATALOG_REFRESH_INTERVAL', '2')))
+            _catalogs[key] = catalog
+    return catalog
+
+
+if __name__ == '__main__':
+    catalog = ListeningCatalog(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Data'))
+    changed = catalog.refresh(force=True)
+    videos = catalog.videos()
+    print(f"{len(videos)} videos, {sum(v['total_questions'] for v in videos)} questions "
+          f"({len(changed)} updated) -> {catalog.manifest_path}")
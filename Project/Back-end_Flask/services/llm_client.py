@@ -0,0 +1,307 @@
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from services.completion_cache import CompletionCache, DEFAULT_CACHE_PATH, make_cache_key
+from services.metrics import LLM_LATENCY, LLM_TOKENS, LLM_ERRORS, register_cache
+
+GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+DEFAULT_MODEL = "deepseek-r1-distill-llama-70b"
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Ask for a final chunk carrying the token usage of a streamed completion
+STREAM_OPTIONS = {"include_usage": True}
+
+
+class LLMError(Exception):
+    """Raised when a completion cannot be obtained after all retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_stream_event(data):
+    """(content delta, usage) of one SSE `data:` payload. Usage comes on the last chunk (with
+    empty choices) when STREAM_OPTIONS is sent; Groq also reports it under x_groq."""
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None, None
+    if not isinstance(chunk, dict):
+        return None, None
+    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+    choices = chunk.get("choices") or []
+    delta = (choices[0].get("delta") or {}).get("content") if choices else None
+    return delta, usage
+
+
+class LLMProvider:
+    """Interface for chat-completion backends used by LLMClient."""
+
+    name = 'base'
+
+    def chat(self, payload):
+        """Send an OpenAI-style chat-completions payload and return the decoded response."""
+        raise NotImplementedError
+
+    def stream(self, payload, usage=None):
+        """Yield completion text deltas as they arrive; the usage dict, if given, is filled
+        with the token usage the provider reports."""
+        raise NotImplementedError
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat completions over HTTP for Groq or any server speaking the same API (e.g. a local stub)."""
+
+    name = 'openai-compatible'
+
+    def __init__(self, url=GROQ_URL, api_key=None, timeout=(5, 120), max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, pool_size=10):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # One keep-alive session shared by all threads; the pool is sized to the concurrency limit
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before the next attempt, honouring Retry-After when present."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay + random.uniform(0, self.backoff_base), self.backoff_max)
+
+    def post(self, payload, stream=False):
+        """POST with retries on connection errors, timeouts, 429 and 5xx responses."""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.post(self.url, headers=self._headers(), json=payload,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = LLMError(f"LLM request failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response
+                last_error = LLMError(f"LLM request failed with status {response.status_code}: {response.text[:200]}",
+                                      status_code=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise last_error
+                response.close()
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+        raise last_error
+
+    def chat(self, payload):
+        return self.post(payload).json()
+
+    def stream(self, payload, usage=None):
+        """Read the server-sent event stream of a `stream: true` request, yielding content deltas."""
+        response = self.post({**payload, "stream": True, "stream_options": STREAM_OPTIONS}, stream=True)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                delta, reported = parse_stream_event(data)
+                if reported and usage is not None:
+                    usage.update(reported)
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+
+
+class LLMClient:
+    """Shared entry point for LLM calls with a bounded number of in-flight requests.
+
+    Deterministic calls (temperature 0) are served from the completion cache when one is
+    attached; sampled calls are cached only when the caller passes a cache_ttl.
+    """
+
+    def __init__(self, provider, max_concurrency=4, default_model=DEFAULT_MODEL, cache=None):
+        self.provider = provider
+        self.default_model = default_model
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def build_payload(self, messages, model=None, **params):
+        payload = {"model": model or self.default_model, "messages": messages}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return payload
+
+    def _cache_policy(self, payload, cache_ttl):
+        """Return (cacheable, ttl) for a payload."""
+        if self.cache is None:
+            return False, None
+        if payload.get("temperature") == 0:
+            return True, cache_ttl
+        return bool(cache_ttl), cache_ttl
+
+    def chat(self, messages, model=None, cache_ttl=None, cache_tag='default', **params):
+        """Run a chat completion and return the raw response dict."""
+        payload = self.build_payload(messages, model=model, **params)
+        cacheable, ttl = self._cache_policy(payload, cache_ttl)
+        if cacheable:
+            key = make_cache_key(payload)
+            cached = self.cache.get(key, tag=cache_tag)
+            if cached is not None:
+                return cached
+        with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = self.provider.chat(payload)
+            except LLMError as e:
+                LLM_ERRORS.inc(model=payload["model"], status=e.status_code or 'network')
+                raise
+            LLM_LATENCY.observe(time.perf_counter() - start, model=payload["model"], mode='chat')
+        self._count_tokens(payload["model"], response)
+        if cacheable:
+            self.cache.set(key, response, model=payload["model"], ttl=ttl, tag=cache_tag)
+        return response
+
+    @staticmethod
+    def _count_tokens(model, response):
+        usage = response.get("usage") if isinstance(response, dict) else None
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, type='prompt')
+            LLM_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, type='completion')
+
+    def stream(self, messages, model=None, cache_ttl=None, cache_tag='default', **params):
+        """Yield completion text as it is generated; cached completions are replayed in one chunk.
+
+        The concurrency slot is taken on the first next() and given back when the stream ends,
+        fails or is closed (Flask closes the response iterable when an SSE client goes away).
+        """
+        payload = self.build_payload(messages, model=model, **params)
+        cacheable, ttl = self._cache_policy(payload, cache_ttl)
+        if cacheable:
+            key = make_cache_key(payload)
+            cached = self.cache.get(key, tag=cache_tag)
+            if cached is not None:
+                yield cached["choices"][0]["message"]["content"]
+                return
+        chunks = []
+        usage = {}
+        self._semaphore.acquire()
+        deltas = None
+        try:
+            start = time.perf_counter()
+            deltas = self.provider.stream(payload, usage=usage)
+            try:
+                for delta in deltas:
+                    chunks.append(delta)
+                    yield delta
+            except LLMError as e:
+                LLM_ERRORS.inc(model=payload["model"], status=e.status_code or 'network')
+                raise
+            LLM_LATENCY.observe(time.perf_counter() - start, model=payload["model"], mode='stream')
+        finally:
+            # Closes the upstream HTTP response before the slot is reused
+            if deltas is not None:
+                deltas.close()
+            self._semaphore.release()
+            # Tokens of a stream cut short are still spent when the provider reported them
+            self._count_tokens(payload["model"], {"usage": usage})
+        if cacheable:
+            response = {"model": payload["model"],
+                        "choices": [{"message": {"role": "assistant", "content": ''.join(chunks)}}]}
+            self.cache.set(key, response, model=payload["model"], ttl=ttl, tag=cache_tag)
+
+    def stream_complete(self, prompt, model=None, **params):
+        """Streaming counterpart of complete()."""
+        return self.stream([{"role": "user", "content": prompt}], model=model, **params)
+
+    def complete(self, prompt, model=None, **params):
+        """Send a single user prompt and return the completion text."""
+        response = self.chat([{"role": "user", "content": prompt}], model=model, **params)
+        try:
+            return response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("Malformed completion response")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_llm_client_from_env():
+    """Build the default client; LLM_API_URL lets a local stub server stand in for Groq."""
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    provider = OpenAICompatibleProvider(
+        url=os.getenv("LLM_API_URL", GROQ_URL),
+        api_key=os.getenv("GROQ_API_KEY"),
+        timeout=(float(os.getenv("LLM_CONNECT_TIMEOUT", "5")), float(os.getenv("LLM_READ_TIMEOUT", "120"))),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+        pool_size=max_concurrency,
+    )
+    cache = None
+    if os.getenv("LLM_CACHE_ENABLED", "1") == "1":
+        cache = CompletionCache(path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+    return LLMClient(provider, max_concurrency=max_concurrency,
+                     default_model=os.getenv("LLM_MODEL", DEFAULT_MODEL), cache=cache)
+
+
+def _completion_cache_stats():
+    # Only report once a client exists; scraping must not create one
+    if _client is None or _client.cache is None:
+        return None
+    stats = _client.cache.stats()
+    return {'hits': stats['hits'], 'misses': stats['misses'], 'entries': stats['entries']}
+
+
+register_cache('llm_completions', _completion_cache_stats)
+
+
+def get_llm_client():
+    """Return the process-wide LLM client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_llm_client_from_env()
+    return _client
+
+
+def _reset_after_fork():
+    # The HTTP session and the cache connection belong to the parent; build a new client lazily
+    global _client, _client_lock
+    _client, _client_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_llm_client(client):
+    """Replace the process-wide client (tests, benchmarks). Returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
@@ -0,0 +1,329 @@
+import json
+import re
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+QUESTION_OPEN = '<question>'
+QUESTION_CLOSE = '</question>'
+
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+# Characters that can change brace-matching state inside an object / inside a string
+_IN_OBJECT = re.compile(r'["\'{}]')
+_IN_STRING = {'"': re.compile(r'["\\\\]'), "'": re.compile(r"['\\\\]")}
+
+
+class QuestionBlockStream:
+    """Incrementally cut complete <question>...</question> blocks out of streamed LLM text.
+
+    <think> sections are skipped so reasoning that quotes the tags is never emitted.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, text):
+        """Add a chunk of text; return the blocks completed by it."""
+        self._buffer += text
+        blocks = []
+        while True:
+            start = self._buffer.find(QUESTION_OPEN)
+            think = self._buffer.find(THINK_OPEN)
+            if think != -1 and (start == -1 or think < start):
+                think_end = self._buffer.find(THINK_CLOSE, think)
+                if think_end == -1:
+                    break
+                self._buffer = self._buffer[think_end + len(THINK_CLOSE):]
+                continue
+            if start == -1:
+                # Keep a tail that may be the beginning of a tag split across chunks
+                self._buffer = self._buffer[-(len(QUESTION_OPEN) - 1):]
+                break
+            end = self._buffer.find(QUESTION_CLOSE, start)
+            if end == -1:
+                self._buffer = self._buffer[start:]
+                break
+            blocks.append(self._buffer[start:end + len(QUESTION_CLOSE)])
+            self._buffer = self._buffer[end + len(QUESTION_CLOSE):]
+        return blocks
+
+
+class TolerantJSONParser:
+    """Recursive-descent parser for the JSON dialect LLMs actually emit.
+
+    Accepts strict JSON plus single-quoted strings, bare keys, trailing or missing commas,
+    //- and /* */-comments, raw newlines inside strings and Python literals.
+    Raises ValueError on anything it cannot make sense of.
+    """
+
+    LITERALS = {'true': True, 'false': False, 'null': None,
+                'True': True, 'False': False, 'None': None}
+    ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '/': '/', '\\': '\\', '"': '"', "'": "'"}
+    BARE_STOP = set(' \t\r\n:,{}[]"\'/')
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        value = self._value()
+        self._skip()
+        if self.pos != len(self.text):
+            raise ValueError(f"Trailing data at {self.pos}")
+        return value
+
+    def _skip(self):
+        text = self.text
+        while True:
+            self.pos = _WHITESPACE.match(text, self.pos).end()
+            if text.startswith('//', self.pos):
+                end = text.find('\n', self.pos)
+                self.pos = len(text) if end == -1 else end + 1
+            elif text.startswith('/*', self.pos):
+                end = text.find('*/', self.pos + 2)
+                if end == -1:
+                    raise ValueError("Unterminated comment")
+                self.pos = end + 2
+            else:
+                return
+
+    def _value(self):
+        self._skip()
+        if self.pos >= len(self.text):
+            raise ValueError("Unexpected end of input")
+        c = self.text[self.pos]
+        if c == '{':
+            return self._object()
+        if c == '[':
+            return self._array()
+        if c == '"' or c == "'":
+            return self._string()
+        return self._bare()
+
+    def _object(self):
+        self.pos += 1
+        obj = {}
+        while True:
+            self._skip()
+            if self.pos >= len(self.text):
+                raise ValueError("Unterminated object")
+            c = self.text[self.pos]
+            if c == '}':
+                self.pos += 1
+                return obj
+            if c == ',':
+                self.pos += 1
+                continue
+            key = self._string() if c in '"\'' else self._bare_word()
+            self._skip()
+            if not self.text.startswith(':', self.pos):
+                raise ValueError(f"Expected ':' at {self.pos}")
+            self.pos += 1
+            obj[key] = self._value()
+
+    def _array(self):
+        self.pos += 1
+        items = []
+        while True:
+            self._skip()
+            if self.pos >= len(self.text):
+                raise ValueError("Unterminated array")
+            c = self.text[self.pos]
+            if c == ']':
+                self.pos += 1
+                return items
+            if c == ',':
+                self.pos += 1
+                continue
+            items.append(self._value())
+
+    def _string(self):
+        text = self.text
+        quote = text[self.pos]
+        self.pos += 1
+        parts = []
+        start = self.pos
+        while True:
+            end = text.find(quote, self.pos)
+            backslash = text.find('\\', self.pos, end if end != -1 else len(text))
+            if end == -1:
+                raise ValueError("Unterminated string")
+            if backslash == -1:
+                parts.append(text[start:end])
+                self.pos = end + 1
+                return ''.join(parts)
+            parts.append(text[start:backslash])
+            code = text[backslash + 1:backslash + 2]
+            if code == 'u':
+                try:
+                    parts.append(chr(int(text[backslash + 2:backslash + 6], 16)))
+                except ValueError:
+                    raise ValueError(f"Bad unicode escape at {backslash}")
+                self.pos = backslash + 6
+            else:
+                parts.append(self.ESCAPES.get(code, code))
+                self.pos = backslash + 2
+            start = self.pos
+
+    def _bare_word(self):
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in self.BARE_STOP:
+            self.pos += 1
+        if self.pos == start:
+            raise ValueError(f"Unexpected character {self.text[start]!r} at {start}")
+        return self.text[start:self.pos]
+
+    def _bare(self):
+        word = self._bare_word()
+        if word in self.LITERALS:
+            return self.LITERALS[word]
+        try:
+            return int(word)
+        except ValueError:
+            pass
+        try:
+            return float(word)
+        except ValueError:
+            raise ValueError(f"Unexpected token {word!r}")
+
+
+def loads_tolerant(text):
+    """json.loads with a TolerantJSONParser fallback for almost-JSON."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return TolerantJSONParser(text).parse()
+
+
+class WordObjectStream:
+    """Single-pass extractor for vocabulary word objects in (streamed) LLM output.
+
+    Text outside objects is skipped, so prose, code fences and the enclosing array need no
+    special handling; <think> sections are dropped. Top-level objects are cut out with
+    string/escape-aware brace matching as soon as their closing brace arrives, decoded
+    with loads_tolerant and kept if they carry every required key and have not been seen
+    before (same kanji + jlpt_level). A wrapper object such as {"words": [...]} is unpacked.
+    """
+
+    REQUIRED_KEYS = {"kanji", "romaji", "vietnamese", "jlpt_level", "parts"}
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._start = None
+        self._quote = None
+        self._escape = False
+        self._in_think = False
+        self._seen = set()
+
+    def feed(self, text):
+        """Add a chunk of text; return the word objects completed by it."""
+        self._buffer += text
+        words = []
+        buffer = self._buffer
+        i = self._pos
+        n = len(buffer)
+        while i < n:
+            if self._in_think:
+                end = buffer.find(THINK_CLOSE, i)
+                if end == -1:
+                    i = max(i, n - len(THINK_CLOSE) + 1)
+                    break
+                self._in_think = False
+                i = end + len(THINK_CLOSE)
+                continue
+            if self._start is None:
+                # Jump straight to the next character that can start an object or a think block
+                brace = buffer.find('{', i)
+                tag = buffer.find('<', i, brace if brace != -1 else n)
+                if tag != -1:
+                    if buffer.startswith(THINK_OPEN, tag):
+                        self._in_think = True
+                        i = tag + len(THINK_OPEN)
+                        continue
+                    if THINK_OPEN.startswith(buffer[tag:]):
+                        i = tag
+                        break  # possibly a split tag, wait for more text
+                if brace == -1:
+                    i = n
+                    break
+                self._start = brace
+                self._depth = 1
+                i = brace + 1
+                continue
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            # Skip ordinary characters in one regex search instead of a Python-level loop
+            match = (_IN_STRING[self._quote] if self._quote is not None else _IN_OBJECT).search(buffer, i)
+            if match is None:
+                i = n
+                break
+            i = match.start()
+            c = buffer[i]
+            if self._quote is not None:
+                if c == '\\':
+                    self._escape = True
+                else:
+                    self._quote = None
+            elif c == '"' or c == "'":
+                self._quote = c
+            elif c == '{':
+                self._depth += 1
+            elif c == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    accepted = self._accept(buffer[self._start:i + 1])
+                    if accepted is None:
+                        # Undecodable wrapper: rescan its inside for complete word objects
+                        i = self._start + 1
+                        self._start = None
+                        continue
+                    words.extend(accepted)
+                    self._start = None
+            i += 1
+        # Drop consumed text so the buffer only holds the object in progress
+        cut = self._start if self._start is not None else i
+        self._buffer = buffer[cut:]
+        self._pos = i - cut
+        if self._start is not None:
+            self._start = 0
+        return words
+
+    def close(self):
+        """Signal end of input; recover objects nested in a wrapper that never closed (e.g. truncated output)."""
+        words = []
+        while self._start is not None:
+            remaining = self._buffer[self._start + 1:]
+            self._buffer, self._pos, self._start, self._depth = '', 0, None, 0
+            self._quote, self._escape = None, False
+            words.extend(self.feed(remaining))
+        return words
+
+    def _accept(self, candidate):
+        """Return the new word objects in a top-level object, or None if it cannot be decoded."""
+        try:
+            obj = loads_tolerant(candidate)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict):
+            return []
+        if self.REQUIRED_KEYS.issubset(obj):
+            candidates = [obj]
+        else:
+            candidates = [item for value in obj.values() if isinstance(value, list)
+                          for item in value if isinstance(item, dict) and self.REQUIRED_KEYS.issubset(item)]
+        accepted = []
+        for word in candidates:
+            key = (word["kanji"], word["jlpt_level"])
+            if key not in self._seen:
+                self._seen.add(key)
+                accepted.append(word)
+        return accepted
+
+
+def parse_word_objects(text):
+    """Extract every valid word object from a complete LLM response."""
+    stream = WordObjectStream()
+    return stream.feed(text) + stream.close()
@@ -0,0 +1,107 @@
+"""Minimal OpenAI-compatible chat-completions server for tests and load benchmarks.
+
+Run with `python -m services.llm_stub --port 8001` and point LLM_API_URL at
+http://127.0.0.1:8001/v1/chat/completions.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, reply="<question>\n</question>", latency=0.0, fail_first=0, fail_status=429):
+        self.reply = reply
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = []
+        self.peers = set()  # client (host, port) pairs, i.e. connections used
+        self.lock = threading.Lock()
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, reply, chunk_size=16, include_usage=False):
+            """Send the reply as OpenAI-style SSE deltas using chunked transfer encoding."""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            events = [
+                'data: ' + json.dumps({'choices': [{'index': 0, 'delta': {'content': reply[i:i + chunk_size]}}]}) + '\n\n'
+                for i in range(0, len(reply), chunk_size)
+            ]
+            if include_usage:
+                usage = {'prompt_tokens': 0, 'completion_tokens': len(reply), 'total_tokens': len(reply)}
+                events.append('data: ' + json.dumps({'choices': [], 'usage': usage}) + '\n\n')
+            events.append('data: [DONE]\n\n')
+            for event in events:
+                data = event.encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            with state.lock:
+                state.requests.append(payload)
+                state.peers.add(self.client_address)
+                failing = len(state.requests) <= state.fail_first
+            if failing:
+                self._send_json(state.fail_status, {'error': {'message': 'stub failure'}})
+                return
+            if state.latency:
+                time.sleep(state.latency)
+            reply = state.reply(payload) if callable(state.reply) else state.reply
+            if payload.get('stream'):
+                self._send_stream(reply, include_usage=(payload.get('stream_options') or {}).get('include_usage', False))
+                return
+            self._send_json(200, {
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(reply), 'total_tokens': len(reply)}
+            })
+
+    return Handler
+
+
+def start_stub_server(host='127.0.0.1', port=0, **kwargs):
+    """Start the stub in a daemon thread. Returns (server, state, url)."""
+    state = StubState(**kwargs)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    return server, state, url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub LLM server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep per request')
+    parser.add_argument('--reply', default='<question>\n</question>', help='completion text returned for every request')
+    args = parser.parse_args()
+    server, _, url = start_stub_server(args.host, args.port, reply=args.reply, latency=args.latency)
+    print(f"Stub LLM server listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
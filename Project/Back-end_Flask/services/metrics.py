@@ -0,0 +1,288 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms keep one small record per label set behind a lock, so recording is
+a dict lookup plus a few integer additions. Values that already live elsewhere (cache
+sizes, hit counts) are read by callbacks only when /metrics is scraped.
+
+The registry is per process: every sample carries a pid label and a forked worker starts
+from zero, so each gunicorn worker reports only its own work (see README).
+
+    REQUESTS = registry.counter('app_requests_total', 'Requests', ('route',))
+    REQUESTS.inc(route='/api/words/')
+    with LATENCY.time(route='/api/words/'):
+        ...
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast SQLite reads up to slow LLM completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self, const=()):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key, const)} {_number(value)}"
+                                for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            record = self._values.get(key)
+            if record is None:
+                # per-bucket (not cumulative) counts, sum, count
+                record = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            record[0][index] += 1
+            record[1] += value
+            record[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            record = self._values.get(self._key(labels))
+            return record[2] if record else 0
+
+    def collect(self, const=()):
+        with self._lock:
+            items = sorted((key, (list(r[0]), r[1], r[2])) for key, r in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bucket = list(const) + [('le', _number(float(bound)))]
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key, const)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key, const)} {count}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples come from fn() -> {label values tuple: number} at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, fn):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def collect(self, const=()):
+        try:
+            samples = self.fn() or {}
+        except Exception:
+            samples = {}
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key, const)} {_number(value)}"
+                                for key, value in sorted(samples.items())]
+
+
+class CallbackCounter(CallbackGauge):
+    """Monotonic total kept elsewhere (e.g. cache hits), read at scrape time."""
+
+    kind = 'counter'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-importing a module (tests, reloads) keeps the original metric
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _replace(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+            return metric
+
+    def gauge_callback(self, name, documentation, labelnames, fn):
+        """Register (or replace) a gauge read from fn at scrape time."""
+        return self._replace(CallbackGauge(name, documentation, labelnames, fn))
+
+    def counter_callback(self, name, documentation, labelnames, fn):
+        """Register (or replace) a counter read from fn at scrape time."""
+        return self._replace(CallbackCounter(name, documentation, labelnames, fn))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        const = (('pid', os.getpid()),)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect(const))
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+registry = MetricsRegistry()
+# Samples recorded by a preforking master (schema work, preloading) are not the worker's
+os.register_at_fork(after_in_child=registry.clear)
+
+# --- Shared metrics, recorded from the modules that own the work ---
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by blueprint, route template, method and status',
+    ('blueprint', 'route', 'method', 'status'))
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by blueprint and route template',
+    ('blueprint', 'route', 'method'))
+SQL_LATENCY = registry.histogram(
+    'sqlite_query_duration_seconds', 'SQLite statement execution time by statement type', ('statement',))
+SQL_CONNECT_WAIT = registry.histogram(
+    'sqlite_connection_wait_seconds', 'Time spent opening a SQLite connection for a request')
+LLM_LATENCY = registry.histogram(
+    'llm_request_duration_seconds', 'LLM call latency (provider calls only, cache hits excluded)', ('model', 'mode'))
+LLM_TOKENS = registry.counter(
+    'llm_tokens_total', 'Tokens reported by the LLM provider', ('model', 'type'))
+LLM_ERRORS = registry.counter(
+    'llm_errors_total', 'Failed LLM calls after retries', ('model', 'status'))
+EMBEDDING_ENCODE = registry.histogram(
+    'embedding_encode_seconds', 'SentenceTransformer encode time per call', ('model',))
+EMBEDDING_TEXTS = registry.counter(
+    'embedding_texts_total', 'Texts encoded by SentenceTransformer', ('model',))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def register_cache(name, stats):
+    """Expose a cache through the cache_* metrics; stats() returns hits, misses and size (or entries)."""
+    with _caches_lock:
+        _caches[name] = stats
+
+
+def _cache_samples(field):
+    def collect():
+        with _caches_lock:
+            caches = list(_caches.items())
+        samples = {}
+        for name, stats in caches:
+            values = stats()
+            if values is None:
+                continue
+            value = values.get(field, values.get('entries')) if field == 'size' else values.get(field)
+            if value is not None:
+                samples[(name,)] = value
+        return samples
+    return collect
+
+
+registry.counter_callback('cache_hits_total', 'Cache hits since start', ('cache',), _cache_samples('hits'))
+registry.counter_callback('cache_misses_total', 'Cache misses since start', ('cache',), _cache_samples('misses'))
+registry.gauge_callback('cache_entries', 'Entries currently cached', ('cache',), _cache_samples('size'))
+
+
+def statement_type(sql):
+    word = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    return word if word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'PRAGMA') else 'OTHER'
+
+
+def _start_timer():
+    from flask import g
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    from flask import g, request
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    blueprint = request.blueprint or 'app'
+    HTTP_LATENCY.observe(time.perf_counter() - started, blueprint=blueprint, route=rule, method=request.method)
+    HTTP_REQUESTS.inc(blueprint=blueprint, route=rule, method=request.method, status=response.status_code)
+    return response
+
+
+def init_app(app):
+    """Time every request of app into the HTTP metrics."""
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
@@ -0,0 +1,133 @@
+"""Prompt packing for batched, retrieval-augmented question generation.
+
+Several conversations go into one LLM request as long as the estimated prompt plus answer
+fits a token budget. Each conversation brings its similar indexed questions as few-shot
+examples; examples shared by conversations in the same batch are written once. The model
+answers with one `<question id="N">` block per conversation, which parse_batch_response
+maps back to its input.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from services.question_parser import parse_question_blocks
+
+# Rough token estimate without a tokenizer: Japanese is about one token per character,
+# Latin text about four characters per token
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+# Answer tokens per question besides the copied conversation (intro, question, options)
+ANSWER_OVERHEAD_TOKENS = 200
+
+_THINK = re.compile(r'<think>.*?(?:</think>|\Z)', re.DOTALL)
+_TAGGED_BLOCK = re.compile(r'<question\s+id\s*=\s*["\']?(\d+)["\']?\s*>(.*?)(?:</question>|(?=<question)|\Z)', re.DOTALL)
+
+INSTRUCTIONS = (
+    "You are a JLPT listening comprehension question generator.\n\n"
+    "For every conversation below, create one new JLPT-style listening comprehension question. "
+    "The example questions show the expected style and difficulty.\n\n"
+    "Output one block per conversation, in this format (choose 3 or 4 options as appropriate):\n\n"
+    "<question id=\"[conversation id]\">\n"
+    "Introduction:\n[short context in Japanese]\n\n"
+    "Conversation:\n[copy exactly as provided]\n\n"
+    "Question:\n[question in Japanese]\n\n"
+    "Options:\n1. [Option 1 in Japanese]\n2. [Option 2 in Japanese]\n3. [Option 3 in Japanese]\n[4. [Option 4 in Japanese]]\n"
+    "CorrectAnswer: [1|2|3|4] (the number of the correct option)\n</question>\n\n"
+    "Rules:\n"
+    "- Use each conversation exactly as provided, do not change or summarize it.\n"
+    "- Generate exactly one question per conversation and keep its id.\n"
+    "- There must be exactly one correct answer, indicated by the CorrectAnswer field.\n"
+    "- If the conversation only supports 3 options, use 3. Otherwise, use 4.\n"
+    "- Do not add any explanation, translation, or extra text.\n"
+    "- Output only the <question id=\"...\">...</question> blocks.\n"
+)
+
+
+def estimate_tokens(text):
+    non_ascii = len(_NON_ASCII.findall(text))
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+@dataclass
+class GenerationItem:
+    index: int
+    conversation: str
+    examples: List[dict] = field(default_factory=list)  # indexed questions with an 'id'
+
+    @property
+    def cost(self):
+        # The conversation is sent once and copied back once
+        return 2 * estimate_tokens(self.conversation) + ANSWER_OVERHEAD_TOKENS
+
+
+def render_example(question):
+    options = '\n'.join(f"{i}. {option}" for i, option in enumerate(question.get('Options', []), start=1))
+    return (
+        "<question>\n"
+        f"Introduction:\n{question.get('Introduction', '')}\n\n"
+        f"Conversation:\n{question.get('Conversation', '')}\n\n"
+        f"Question:\n{question.get('Question', '')}\n\n"
+        f"Options:\n{options}\n"
+        f"CorrectAnswer: {question.get('CorrectAnswer', '')}\n"
+        "</question>"
+    )
+
+
+def pack_batches(items, max_tokens, max_items=8):
+    """Group items in order into batches whose estimated size stays within max_tokens.
+
+    An item larger than the budget on its own still gets a batch of its own.
+    """
+    base = estimate_tokens(INSTRUCTIONS)
+    batches = []
+    batch, used, seen = [], base, set()
+    for item in items:
+        new_examples = {e['id']: e for e in item.examples if e['id'] not in seen}
+        cost = item.cost + sum(estimate_tokens(render_example(e)) for e in new_examples.values())
+        if batch and (used + cost > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch, used, seen = [], base, set()
+            cost = item.cost + sum(estimate_tokens(render_example(e)) for e in item.examples)
+        batch.append(item)
+        used += cost
+        seen.update(e['id'] for e in item.examples)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_prompt(batch):
+    examples = {}
+    for item in batch:
+        for example in item.examples:
+            examples.setdefault(example['id'], example)
+    parts = [INSTRUCTIONS]
+    if examples:
+        parts.append("Example questions:\n\n" + '\n\n'.join(render_example(e) for e in examples.values()) + "\n")
+    parts.append("Conversations:\n")
+    for item in batch:
+        parts.append(f"<conversation id=\"{item.index}\">\n{item.conversation}\n</conversation>\n")
+    return '\n'.join(parts)
+
+
+def parse_batch_response(text, ids):
+    """{input id: ParsedQuestion} for the complete questions in a batched response.
+
+    Untagged <question> blocks are matched by position when there is exactly one per input.
+    """
+    text = _THINK.sub('', text)
+    parsed = {}
+    tagged = list(_TAGGED_BLOCK.finditer(text))
+    if tagged:
+        wanted = set(ids)
+        for match in tagged:
+            number = int(match.group(1))
+            if number not in wanted or number in parsed:
+                continue
+            questions = parse_question_blocks(f"<question>{match.group(2)}</question>")
+            if questions and questions[0].is_complete():
+                parsed[number] = questions[0]
+        return parsed
+    questions = parse_question_blocks(text)
+    if len(questions) == len(ids):
+        parsed = {number: q for number, q in zip(ids, questions) if q.is_complete()}
+    return parsed
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the parsed output changes so cached JSON files are rebuilt
+PARSER_VERSION = 1
+
+FIELDS = ('Introduction', 'Conversation', 'Question', 'Options', 'CorrectAnswer')
+
+# One pass over the text: think sections are consumed whole, everything else is a block
+# delimiter or a field label at the start of a line. Text between tokens is field content.
+_TOKEN = re.compile(
+    r'<think>.*?(?:</think>|\Z)'
+    r'|<question>|</question>'
+    r'|^[ \t]*(' + '|'.join(FIELDS) + r')[ \t]*[:：]',
+    re.DOTALL | re.MULTILINE,
+)
+_OPTION = re.compile(r'^[ \t]*([1-4])[ \t]*[.)．、]\s*(.*?)\s*$', re.MULTILINE)
+_ANSWER = re.compile(r'[1-4]')
+
+
+@dataclass
+class ParsedQuestion:
+    introduction: str = ''
+    conversation: str = ''
+    question: str = ''
+    options: List[str] = field(default_factory=list)
+    correct_answer: Optional[int] = None
+
+    @property
+    def option_count(self):
+        return len(self.options)
+
+    def is_complete(self):
+        return bool(self.introduction and self.conversation and self.question and self.options
+                    and self.correct_answer)
+
+    def to_dict(self):
+        """Dict in the shape the API and vector index already use."""
+        question = {
+            'Introduction': self.introduction,
+            'Conversation': self.conversation,
+            'Question': self.question,
+            'Options': self.options,
+            'OptionCount': self.option_count,
+        }
+        if self.correct_answer is not None:
+            question['CorrectAnswer'] = str(self.correct_answer)
+        return question
+
+
+def _clean_lines(content):
+    return '\n'.join(line.strip() for line in content.strip().splitlines()).strip()
+
+
+def _set_field(question, label, content):
+    if label == 'Options':
+        question.options = [m.group(2) for m in _OPTION.finditer(content)]
+    elif label == 'CorrectAnswer':
+        match = _ANSWER.search(content)
+        question.correct_answer = int(match.group(0)) if match else None
+    else:
+        setattr(question, label.lower(), _clean_lines(content))
+
+
+def parse_question_blocks(text):
+    """Parse every <question> block in LLM output into ParsedQuestion records (linear time)."""
+    questions = []
+    current = None
+    label = None
+    content_start = 0
+    for match in _TOKEN.finditer(text):
+        if current is not None and label is not None:
+            _set_field(current, label, text[content_start:match.start()])
+            label = None
+        token = match.group(0)
+        if token.startswith('<think>'):
+            continue
+        if token == '<question>':
+            current = ParsedQuestion()
+        elif token == '</question>':
+            if current is not None and (current.question or current.options):
+                questions.append(current)
+            current = None
+        elif current is not None:
+            label = match.group(1)
+            content_start = match.end()
+    return questions
+
+
+def parse_questions(text):
+    """Parsed questions as API dicts."""
+    return [q.to_dict() for q in parse_question_blocks(text)]
+
+
+def cache_path(questions_path):
+    return os.path.splitext(questions_path)[0] + '.json'
+
+
+def write_questions_cache(questions_path, questions):
+    """Store parsed questions next to the .txt so later reads skip parsing."""
+    path = cache_path(questions_path)
+    data = {
+        'parser_version': PARSER_VERSION,
+        'source_mtime': os.path.getmtime(questions_path),
+        'questions': questions,
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_questions(questions_path):
+    """Return parsed questions for a questions .txt file, using the JSON cache when it is fresh."""
+    path = cache_path(questions_path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if (cached.get('parser_version') == PARSER_VERSION
+                and cached.get('source_mtime') == os.path.getmtime(questions_path)):
+            return cached['questions']
+    except (OSError, ValueError):
+        pass
+    with open(questions_path, 'r', encoding='utf-8') as f:
+        questions = parse_questions(f.read())
+    try:
+        write_questions_cache(questions_path, questions)
+    except OSError as e:
+        logger.warning("could not write questions cache path=%s error=%s", questions_path, e)
+    return questions
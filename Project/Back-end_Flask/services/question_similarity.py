@@ -0,0 +1,227 @@
+"""Similar-question lookups without repeated model inference.
+
+- QueryEmbeddingCache: LRU of query embeddings keyed by a hash of the normalized text, so
+  asking for the same conversation again (or with different spacing / full-width
+  characters) skips the SentenceTransformer call.
+- NeighbourIndex: nearest neighbours of every indexed question, computed from the
+  embeddings already stored in the vector store and persisted as JSON, so "more like this"
+  for an indexed question is a dictionary lookup. Newly indexed questions only refresh the
+  lists they can change, and every worker reloads the file when another one rewrites it.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """NFKC (full-width -> half-width), collapsed whitespace."""
+    return _SPACES.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query embeddings."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, text, embed):
+        """Embedding of text, calling embed(normalized_text) only on a miss."""
+        key = text_key(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+        embedding = [float(x) for x in embed(normalize_text(text))]
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+def _distance_rows(vectors, norms, rows):
+    """Squared L2 distances from vectors[rows] to every vector, self-distances set to inf."""
+    rows = np.asarray(rows, dtype=int)
+    distances = norms[rows, None] + norms[None, :] - 2.0 * vectors[rows] @ vectors.T
+    distances[np.arange(len(rows)), rows] = np.inf  # never your own neighbour
+    return distances
+
+
+def _nearest(ids, vectors, norms, rows, k, block_size=512):
+    """{ids[row]: [[neighbour_id, distance], ...]} for the given row indices."""
+    k = min(k, len(ids) - 1)
+    neighbours = {}
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        distances = _distance_rows(vectors, norms, block)
+        if k <= 0:
+            nearest = np.empty((len(block), 0), dtype=int)
+        else:
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        for i, candidates in enumerate(nearest):
+            order = candidates[np.argsort(distances[i, candidates])]
+            neighbours[ids[block[i]]] = [[ids[j], max(float(distances[i, j]), 0.0)] for j in order]
+    return neighbours
+
+
+def _vectors(embeddings):
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    return vectors, np.einsum('ij,ij->i', vectors, vectors)
+
+
+def build_neighbours(ids, embeddings, k=10, block_size=512):
+    """{id: [[neighbour_id, distance], ...]} for the k nearest other ids.
+
+    Distances are squared L2, the same metric the vector store reports for queries.
+    Rows are processed in blocks so memory stays at block_size x len(ids).
+    """
+    if not ids:
+        return {}
+    vectors, norms = _vectors(embeddings)
+    return _nearest(ids, vectors, norms, list(range(len(ids))), k, block_size)
+
+
+def update_neighbours(neighbours, ids, embeddings, changed, k=10):
+    """Neighbour lists after the `changed` ids were added or re-embedded, from the lists of the
+    other ids (exact, as build_neighbours would give).
+
+    Changed ids get a full row (len(changed) x N distances). Every other list merges the
+    changed ids into its old entries; it is recomputed only when it lost an entry and a
+    farther id it never listed could now belong to it.
+    """
+    vectors, norms = _vectors(embeddings)
+    position = {question_id: i for i, question_id in enumerate(ids)}
+    changed = [question_id for question_id in dict.fromkeys(changed) if question_id in position]
+    changed_set = set(changed)
+    k_eff = min(k, len(ids) - 1)
+    updated = _nearest(ids, vectors, norms, [position[c] for c in changed], k)
+    # distance of every id to each changed id (column j = changed[j])
+    to_changed = _distance_rows(vectors, norms, [position[c] for c in changed]).T if changed else None
+    stale = []
+    for question_id, row in position.items():
+        if question_id in changed_set:
+            continue
+        old = neighbours[question_id]
+        kept = [entry for entry in old if entry[0] not in changed_set]
+        merged = kept + [[c, max(float(to_changed[row, j]), 0.0)] for j, c in enumerate(changed)]
+        merged.sort(key=lambda entry: entry[1])
+        merged = merged[:k_eff]
+        # Ids left out of a full old list are at least as far as its last entry
+        if len(kept) < len(old) and len(old) >= k and (len(merged) < k_eff or merged[-1][1] > old[-1][1]):
+            stale.append(row)
+        else:
+            updated[question_id] = merged
+    if stale:
+        updated.update(_nearest(ids, vectors, norms, stale, k))
+    return updated
+
+
+class NeighbourIndex:
+    """Precomputed neighbour lists persisted next to the vector store."""
+
+    def __init__(self, path, k=10):
+        self.path = path
+        self.k = k
+        self._lock = threading.Lock()
+        self._neighbours = None
+        self._version = None
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        # os.replace gives every rewrite a new inode
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data['neighbours'] if data.get('k') == self.k else None
+
+    def _current(self):
+        """Lists in memory, reloaded when another process has rewritten or removed the file."""
+        version = self._file_version()
+        if version != self._version:
+            self._neighbours = self._load() if version is not None else None
+            self._version = version
+        return self._neighbours
+
+    def _save(self, neighbours):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'k': self.k, 'neighbours': neighbours}, f)
+        os.replace(tmp_path, self.path)
+        self._neighbours = neighbours
+        self._version = self._file_version()
+        return len(neighbours)
+
+    def rebuild(self, ids, embeddings):
+        neighbours = build_neighbours(list(ids), embeddings, k=self.k)
+        with self._lock:
+            return self._save(neighbours)
+
+    def update(self, ids, embeddings, changed):
+        """Refresh the lists after `changed` ids were upserted; rebuild() when the stored lists
+        do not cover every other id."""
+        ids = list(ids)
+        with self._lock:
+            current = self._current()
+            expected = set(ids) - set(changed)
+            if current is None or not expected <= set(current) <= set(ids):
+                neighbours = build_neighbours(ids, embeddings, k=self.k)
+            else:
+                neighbours = update_neighbours(current, ids, embeddings, changed, k=self.k)
+            return self._save(neighbours)
+
+    def invalidate(self):
+        with self._lock:
+            self._neighbours = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self._version = None
+
+    def matches(self, count):
+        """True if a stored index exists and covers `count` questions."""
+        with self._lock:
+            neighbours = self._current()
+            return neighbours is not None and len(neighbours) == count
+
+    def lookup(self, question_id):
+        """[[neighbour_id, distance], ...] for an indexed question, or None."""
+        with self._lock:
+            return (self._current() or {}).get(question_id)
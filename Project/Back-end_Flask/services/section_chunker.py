@@ -0,0 +1,62 @@
+"""Token-budgeted chunking of 問題 sections for the structuring prompt.
+
+A section is cut only where a numbered question starts (1番, 2番, ...), so every question
+reaches the LLM whole. Consecutive questions are packed into a chunk while the estimated
+size stays within the budget; the instructions before 1番 stay with the first chunk. The
+per-chunk answers are merged back into one list of <question> blocks without duplicates.
+"""
+from services.llm_parsing import QuestionBlockStream
+from services.question_generation import estimate_tokens
+from services.question_parser import parse_question_blocks
+from services.question_similarity import normalize_text
+from services.transcript_store import find_question_markers
+
+
+def question_segments(text):
+    """Text cut at each question marker: [preamble + 1番..., 2番..., ...]."""
+    starts = [offset for _, offset in find_question_markers(text) if offset > 0]
+    bounds = [0] + starts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def chunk_section(text, max_tokens):
+    """Pack question segments into chunks of at most max_tokens (estimated).
+
+    A single question longer than the budget becomes a chunk of its own instead of being cut.
+    """
+    chunks = []
+    current, used = [], 0
+    for segment in question_segments(text):
+        cost = estimate_tokens(segment)
+        if current and used + cost > max_tokens:
+            chunks.append(''.join(current).strip())
+            current, used = [], 0
+        current.append(segment)
+        used += cost
+    if current:
+        chunks.append(''.join(current).strip())
+    return chunks
+
+
+def _block_key(block):
+    parsed = parse_question_blocks(block)
+    if not parsed:
+        return normalize_text(block)
+    question = parsed[0]
+    return normalize_text(question.conversation), normalize_text(question.question), tuple(question.options)
+
+
+def merge_question_blocks(outputs):
+    """Concatenate the <question> blocks of several LLM answers in order, dropping repeats.
+
+    A question repeated by two chunks (e.g. the worked example quoted again) keeps its first copy.
+    """
+    blocks = []
+    seen = set()
+    for output in outputs:
+        for block in QuestionBlockStream().feed(output):
+            key = _block_key(block)
+            if key not in seen:
+                seen.add(key)
+                blocks.append(block)
+    return '\n\n'.join(blocks)
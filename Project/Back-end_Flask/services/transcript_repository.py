@@ -0,0 +1,180 @@
+"""Cache-first access to video transcripts.
+
+Transcripts already on disk are served without touching the network; missing or stale ones
+are downloaded through a pluggable fetcher and written with services.transcript_store.
+Concurrent requests for the same video share one download.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from services.transcript_store import write_transcript, text_path
+
+DEFAULT_LANGUAGES = ('ja', 'en')
+
+
+class TranscriptNotFound(LookupError):
+    """Raised by a fetcher that has no transcript for the video."""
+
+
+class TranscriptFetcher:
+    """Interface for transcript sources."""
+
+    name = 'base'
+
+    def fetch(self, video_id):
+        """Return caption entries (dicts or objects with text/start/duration)."""
+        raise NotImplementedError
+
+
+class YouTubeFetcher(TranscriptFetcher):
+    name = 'youtube'
+
+    def __init__(self, languages=DEFAULT_LANGUAGES):
+        self.languages = list(languages)
+
+    def fetch(self, video_id):
+        from youtube_transcript_api import YouTubeTranscriptApi
+        if hasattr(YouTubeTranscriptApi, 'get_transcript'):
+            # youtube-transcript-api < 1.0
+            return YouTubeTranscriptApi.get_transcript(video_id, languages=self.languages)
+        return list(YouTubeTranscriptApi().fetch(video_id, languages=self.languages))
+
+
+class FixtureDirFetcher(TranscriptFetcher):
+    """Reads `<video_id>.jsonl` (timed) or `<video_id>.txt` (one caption per line) from a directory."""
+
+    name = 'fixture'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, video_id):
+        jsonl = os.path.join(self.directory, f"{video_id}.jsonl")
+        if os.path.exists(jsonl):
+            with open(jsonl, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        txt = os.path.join(self.directory, f"{video_id}.txt")
+        if os.path.exists(txt):
+            with open(txt, 'r', encoding='utf-8') as f:
+                return [{'text': line.rstrip('\n'), 'start': 0.0, 'duration': 0.0} for line in f]
+        raise TranscriptNotFound(f"No fixture transcript for {video_id}")
+
+
+def meta_path(transcripts_dir, video_id):
+    return os.path.join(transcripts_dir, f"{video_id}.meta.json")
+
+
+class TranscriptRepository:
+    """Transcripts stored under one directory, fetched on a miss.
+
+    max_age (seconds) marks a stored transcript stale once it is older than that; None keeps
+    stored transcripts forever. Files without metadata (e.g. a checked-in corpus) count as
+    fetched at their modification time.
+    """
+
+    def __init__(self, transcripts_dir, fetcher=None, max_age=None):
+        self.transcripts_dir = transcripts_dir
+        self._fetcher = fetcher
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def fetcher(self):
+        return self._fetcher or get_transcript_fetcher()
+
+    def meta(self, video_id):
+        """Freshness metadata for a stored transcript, or None if it is not on disk."""
+        path = text_path(self.transcripts_dir, video_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(meta_path(self.transcripts_dir, video_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'video_id': video_id, 'source': 'local', 'fetched_at': os.path.getmtime(path)}
+
+    def is_fresh(self, meta):
+        return meta is not None and (self.max_age is None or time.time() - meta['fetched_at'] < self.max_age)
+
+    def get(self, video_id, refresh=False):
+        """Return {'video_id', 'lines', 'cached', 'meta'}, fetching only on a miss, when stale or on refresh."""
+        meta = self.meta(video_id)
+        if not refresh and self.is_fresh(meta):
+            return self._read(video_id, meta, cached=True)
+        with self._lock:
+            future = self._inflight.get(video_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[video_id] = future
+        if owner:
+            try:
+                future.set_result(self._fetch(video_id))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(video_id, None)
+        meta = future.result()
+        return self._read(video_id, meta, cached=not owner)
+
+    def _fetch(self, video_id):
+        fetcher = self.fetcher
+        entries = fetcher.fetch(video_id)
+        index = write_transcript(self.transcripts_dir, video_id, entries)
+        meta = {'video_id': video_id, 'source': fetcher.name, 'fetched_at': time.time(),
+                'entries': index['entries'], 'duration': index['duration']}
+        with open(meta_path(self.transcripts_dir, video_id), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return meta
+
+    def _read(self, video_id, meta, cached):
+        with open(text_path(self.transcripts_dir, video_id), 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        return {'video_id': video_id, 'lines': lines, 'cached': cached, 'meta': meta}
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+_repositories = {}
+
+
+def create_fetcher_from_env():
+    """TRANSCRIPT_FIXTURE_DIR replaces YouTube with a local directory (tests, offline work)."""
+    fixture_dir = os.getenv('TRANSCRIPT_FIXTURE_DIR')
+    if fixture_dir:
+        return FixtureDirFetcher(fixture_dir)
+    return YouTubeFetcher()
+
+
+def get_transcript_fetcher():
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = create_fetcher_from_env()
+    return _fetcher
+
+
+def set_transcript_fetcher(fetcher):
+    """Replace the process-wide fetcher. Returns the previous one."""
+    global _fetcher
+    with _fetcher_lock:
+        previous, _fetcher = _fetcher, fetcher
+    return previous
+
+
+def get_transcript_repository(transcripts_dir):
+    """Shared repository per directory, so in-flight fetches are deduplicated across requests."""
+    key = os.path.abspath(transcripts_dir)
+    with _fetcher_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            max_age = os.getenv('TRANSCRIPT_MAX_AGE')
+            repository = TranscriptRepository(key, max_age=float(max_age) if max_age else None)
+            _repositories[key] = repository
+    return repository
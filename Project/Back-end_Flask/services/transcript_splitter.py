@@ -0,0 +1,137 @@
+"""Streaming segmentation of JLPT listening transcripts into 問題 sections.
+
+Transcripts are read in blocks and each block goes through precompiled patterns that
+
+1. join a number that the captioner left at the end of a line with the 番 that starts
+   a following line ("1\n番" -> "1番");
+2. put each "N番" that follows "選んでください" on its own line;
+3. cut sections at every 問題1-7 header.
+
+A block is only processed up to its last character that cannot be part of any pattern,
+the rest is carried into the next block, so results match splitting the whole text at once
+while a section is yielded as soon as the next header is seen.
+
+Run `python -m services.transcript_splitter` to split every file in Data/transcripts.
+"""
+import argparse
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+BLOCK_SIZE = 64 * 1024
+
+_COUNTER_BREAK = re.compile(r'(\d+)\s*\n\s*番')
+_PROMPT_ITEM = re.compile(r'(選んでください)\s*(\d+番)')
+_SECTION_HEADER = re.compile(r'問題([1-7])')
+# Characters that may sit inside a match of the patterns above; a block is never cut after one
+_UNSAFE_CUT = set('選んでください問題0123456789')
+
+
+class Section(NamedTuple):
+    number: str
+    text: str
+    first_line: int  # 0-based line of the source transcript where the 問題 header is
+
+
+def _safe_cut(buffer):
+    i = len(buffer)
+    while i > 0 and (buffer[i - 1] in _UNSAFE_CUT or buffer[i - 1].isspace()):
+        i -= 1
+    return i
+
+
+def iter_sections(stream, block_size=BLOCK_SIZE):
+    """Lazily yield a Section for every 問題 header in a text stream (e.g. an open file)."""
+    carry = ''
+    line_base = 0
+    current = None  # (number, first_line, [text parts])
+    eof = False
+    while not eof:
+        block = stream.read(block_size)
+        eof = not block
+        buffer = carry + block.replace('\u3000', ' ')
+        cut = len(buffer) if eof else _safe_cut(buffer)
+        piece, carry = buffer[:cut], buffer[cut:]
+        if not piece:
+            continue
+        text = _PROMPT_ITEM.sub('\\1\n\\2', _COUNTER_BREAK.sub('\\1番', piece))
+        # Neither substitution creates or removes a header, so headers line up one to one
+        # with those in the raw piece, which is where line numbers are counted
+        line_no, counted_to = line_base, 0
+        start = 0
+        for raw, match in zip(_SECTION_HEADER.finditer(piece), _SECTION_HEADER.finditer(text)):
+            line_no += piece.count('\n', counted_to, raw.start())
+            counted_to = raw.start()
+            if current is not None:
+                current[2].append(text[start:match.start()])
+                yield Section(current[0], ''.join(current[2]).strip(), current[1])
+            current = (match.group(1), line_no, [])
+            start = match.start()
+        if current is not None:
+            current[2].append(text[start:])
+        line_base += piece.count('\n')
+    if current is not None:
+        yield Section(current[0], ''.join(current[2]).strip(), current[1])
+
+
+def split_text(text):
+    return list(iter_sections(io.StringIO(text, newline=None)))
+
+
+def iter_file_sections(path):
+    with open(path, encoding='utf-8') as f:
+        yield from iter_sections(f)
+
+
+def section_path(split_dir, video_id, section_num):
+    return os.path.join(split_dir, video_id, f"{video_id}_section{section_num}.txt")
+
+
+def split_file(input_path, split_dir, video_id=None):
+    """Stream a transcript into <split_dir>/<video_id>/<video_id>_section<N>.txt files.
+
+    Returns (section, path) pairs; a repeated section number overwrites the earlier file.
+    """
+    video_id = video_id or os.path.splitext(os.path.basename(input_path))[0]
+    os.makedirs(os.path.join(split_dir, video_id), exist_ok=True)
+    saved = []
+    for section in iter_file_sections(input_path):
+        out_path = section_path(split_dir, video_id, section.number)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            f.write(section.text)
+        saved.append((section, out_path))
+    return saved
+
+
+def _split_file_paths(args):
+    input_path, split_dir = args
+    return input_path, [path for _, path in split_file(input_path, split_dir)]
+
+
+def split_directory(transcripts_dir, split_dir, workers=None):
+    """Split every .txt transcript in a directory using a process pool (workers=1 runs inline).
+
+    Returns {video_id: [paths]}.
+    """
+    inputs = sorted(os.path.join(transcripts_dir, name) for name in os.listdir(transcripts_dir)
+                    if name.endswith('.txt'))
+    jobs = [(path, split_dir) for path in inputs]
+    if workers == 1:
+        done = list(map(_split_file_paths, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_split_file_paths, jobs))
+    return {os.path.splitext(os.path.basename(input_path))[0]: paths for input_path, paths in done}
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Data')
+    parser = argparse.ArgumentParser(description='Split all transcripts into 問題 sections')
+    parser.add_argument('--transcripts', default=os.path.join(data_dir, 'transcripts'))
+    parser.add_argument('--out', default=os.path.join(data_dir, 'split'))
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    for video_id, paths in split_directory(args.transcripts, args.out, args.workers).items():
+        print(f"{video_id}: {len(paths)} sections")
@@ -0,0 +1,183 @@
+"""Timestamped transcript storage.
+
+Next to the plain `<video_id>.txt` (one caption per line, as the splitter expects) each
+fetched transcript gets:
+
+- `<video_id>.jsonl`: one {"start", "duration", "text"} object per caption line;
+- `<video_id>.index.json`: byte offset and start time of every line plus the 問題 sections
+  and numbered questions found in it, with their line ranges and times.
+
+Reading a section or a time range is then a bisect on the index and a single seek into the
+JSONL file instead of re-splitting the text.
+"""
+import bisect
+import io
+import json
+import os
+import re
+
+from services.transcript_splitter import iter_sections
+
+INDEX_VERSION = 1
+
+# "3番" followed shortly by the scene-setting line ("…で男の人と女の人が話しています")
+# that opens every JLPT listening question; "1番いい" is the answer phrase, not a number
+_QUESTION_MARKER = re.compile(r'(\d+)\s*番(?!いい|目)(?=[^番]{0,60}?話して)')
+# Short-response sections have no scene line; fall back to any "N番"
+_LOOSE_QUESTION_MARKER = re.compile(r'(\d+)\s*番(?!いい|目)')
+
+
+def text_path(transcripts_dir, video_id):
+    return os.path.join(transcripts_dir, f"{video_id}.txt")
+
+
+def jsonl_path(transcripts_dir, video_id):
+    return os.path.join(transcripts_dir, f"{video_id}.jsonl")
+
+
+def index_path(transcripts_dir, video_id):
+    return os.path.join(transcripts_dir, f"{video_id}.index.json")
+
+
+def normalize_entry(entry):
+    """Caption entry as a plain dict, from either a dict or a transcript snippet object."""
+    if isinstance(entry, dict):
+        text, start, duration = entry['text'], entry.get('start', 0.0), entry.get('duration', 0.0)
+    else:
+        text, start, duration = entry.text, entry.start, entry.duration
+    # Captions are stored one per line, so embedded newlines become spaces
+    return {'start': round(float(start), 3), 'duration': round(float(duration), 3),
+            'text': ' '.join(text.splitlines())}
+
+
+def find_question_markers(text):
+    """[(number, offset)] of the numbered question markers (1番, 2番, ...) in text, in increasing order."""
+    for pattern in (_QUESTION_MARKER, _LOOSE_QUESTION_MARKER):
+        markers = []
+        previous = 0
+        for match in pattern.finditer(text):
+            number = int(match.group(1))
+            if previous < number <= previous + 2:  # tolerate one marker lost in captioning
+                markers.append((number, match.start()))
+                previous = number
+        if markers:
+            return markers
+    return []
+
+
+def _find_questions(entries, first, last):
+    """Numbered questions in entries[first:last + 1] with the caption line each starts on."""
+    texts = [entries[i]['text'] for i in range(first, last + 1)]
+    line_starts = []
+    position = 0
+    for text in texts:
+        line_starts.append(position)
+        position += len(text) + 1
+    questions = []
+    for number, offset in find_question_markers('\n'.join(texts)):
+        entry = first + bisect.bisect_right(line_starts, offset) - 1
+        questions.append({'question_num': number, 'entry': entry, 'start': entries[entry]['start']})
+    return questions
+
+
+def build_sections(entries):
+    """Locate 問題 sections (by caption line) and their questions."""
+    if not entries:
+        return []
+    found = list(iter_sections(io.StringIO(''.join(entry['text'] + '\n' for entry in entries))))
+    # Instructions repeat the header ("問題1では…", "問題1の例…"); a run of the same
+    # number is one section for timing purposes
+    starts = [s for i, s in enumerate(found) if i == 0 or s.number != found[i - 1].number]
+    sections = []
+    for i, section in enumerate(starts):
+        first = section.first_line
+        last = starts[i + 1].first_line - 1 if i + 1 < len(starts) else len(entries) - 1
+        last = max(last, first)
+        sections.append({
+            'section_num': int(section.number),
+            'first_entry': first,
+            'last_entry': last,
+            'start': entries[first]['start'],
+            'end': round(entries[last]['start'] + entries[last]['duration'], 3),
+            'questions': _find_questions(entries, first, last),
+        })
+    return sections
+
+
+def write_transcript(transcripts_dir, video_id, transcript):
+    """Save a fetched transcript as .txt, .jsonl and index; returns the index."""
+    entries = [normalize_entry(entry) for entry in transcript]
+    os.makedirs(transcripts_dir, exist_ok=True)
+    offsets = []
+    position = 0
+    with open(jsonl_path(transcripts_dir, video_id), 'wb') as f:
+        for entry in entries:
+            line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+            offsets.append(position)
+            f.write(line)
+            position += len(line)
+    offsets.append(position)
+    with open(text_path(transcripts_dir, video_id), 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(f"{entry['text']}\n")
+    index = {
+        'version': INDEX_VERSION,
+        'video_id': video_id,
+        'entries': len(entries),
+        'duration': round(entries[-1]['start'] + entries[-1]['duration'], 3) if entries else 0.0,
+        'offsets': offsets,
+        'starts': [entry['start'] for entry in entries],
+        'sections': build_sections(entries),
+    }
+    with open(index_path(transcripts_dir, video_id), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    return index
+
+
+def load_index(transcripts_dir, video_id):
+    """Index of a timestamped transcript, or None if only plain text is stored."""
+    try:
+        with open(index_path(transcripts_dir, video_id), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == INDEX_VERSION else None
+
+
+def read_entries(transcripts_dir, video_id, index, first, last):
+    """Caption entries first..last (inclusive) with one seek into the JSONL file."""
+    first = max(first, 0)
+    last = min(last, index['entries'] - 1)
+    if first > last:
+        return []
+    offsets = index['offsets']
+    with open(jsonl_path(transcripts_dir, video_id), 'rb') as f:
+        f.seek(offsets[first])
+        data = f.read(offsets[last + 1] - offsets[first])
+    return [json.loads(line) for line in data.decode('utf-8').split('\n') if line]
+
+
+def get_section(index, section_num):
+    # A repeated header (e.g. "問題1問題1では") keeps the last one, like the split files do
+    for section in reversed(index['sections']):
+        if section['section_num'] == int(section_num):
+            return section
+    return None
+
+
+def read_section(transcripts_dir, video_id, index, section_num):
+    section = get_section(index, section_num)
+    if section is None:
+        return None, []
+    return section, read_entries(transcripts_dir, video_id, index, section['first_entry'], section['last_entry'])
+
+
+def read_time_range(transcripts_dir, video_id, index, start=None, end=None):
+    """Entries overlapping [start, end) seconds."""
+    starts = index['starts']
+    first = 0 if start is None else max(bisect.bisect_right(starts, start) - 1, 0)
+    stop = len(starts) if end is None else bisect.bisect_left(starts, end)
+    entries = read_entries(transcripts_dir, video_id, index, first, stop - 1)
+    if start is not None:
+        entries = [e for e in entries if e['start'] + e['duration'] > start]
+    return entries
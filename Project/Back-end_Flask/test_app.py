@@ -12,6 +12,28 @@ def client():
             db.init(app)
             yield client
 
+@pytest.fixture
+def stub_llm():
+    """stub_llm(reply=..., latency=..., fail_first=..., fail_status=..., provider={...}, **client_kwargs)
+    starts a stub LLM server and installs an LLMClient pointed at it; returns (llm, state).
+    The previous client is restored and the server stopped on teardown."""
+    from services.llm_client import LLMClient, OpenAICompatibleProvider, set_llm_client
+    from services.llm_stub import start_stub_server
+    started = []
+
+    def start(reply="<question>\n</question>", latency=0.0, fail_first=0, fail_status=429, provider=None,
+              **client_kwargs):
+        server, state, url = start_stub_server(reply=reply, latency=latency, fail_first=fail_first,
+                                               fail_status=fail_status)
+        llm = LLMClient(OpenAICompatibleProvider(url=url, **(provider or {})), **client_kwargs)
+        started.append((server, set_llm_client(llm)))
+        return llm, state
+
+    yield start
+    for server, previous in reversed(started):
+        set_llm_client(previous)
+        server.shutdown()
+
 def test_root_endpoint(client):
     response = client.get('/')
     assert response.status_code == 200
@@ -205,13 +227,13 @@ def test_index_questions_api(client):
     section_num = 1
     video_id = "WjTK_u1JI8c"
     # Đảm bảo file questions đã tồn tại (nếu chưa, tạo trước)
-    questions_path = os.path.join(os.path.dirname(__file__), "data", "questions", f"{video_id}_section{section_num}_questions.txt")
+    questions_path = os.path.join(os.path.dirname(__file__), "Data", "questions", f"{video_id}_section{section_num}_questions.txt")
     if not os.path.exists(questions_path):
         # Đảm bảo section cũng tồn tại
-        split_path = os.path.join(os.path.dirname(__file__), "data", "split", video_id, f"{video_id}_section{section_num}.txt")
+        split_path = os.path.join(os.path.dirname(__file__), "Data", "split", video_id, f"{video_id}_section{section_num}.txt")
         if not os.path.exists(split_path):
             # Đảm bảo transcript cũng tồn tại
-            transcript_path = os.path.join(os.path.dirname(__file__), "data", "transcripts", f"{video_id}.txt")
+            transcript_path = os.path.join(os.path.dirname(__file__), "Data", "transcripts", f"{video_id}.txt")
             if not os.path.exists(transcript_path):
                 resp = client.post('/api/listening/get_transcript', data=youtube_url, content_type='text/plain')
                 assert resp.status_code == 200
@@ -241,7 +263,7 @@ def test_listening_pipeline(client):
     assert data["success"] is True
     assert "transcript" in data
     # Kiểm tra file transcript đã tạo
-    transcript_path = os.path.join(os.path.dirname(__file__), "data", "transcripts", f"{video_id}.txt")
+    transcript_path = os.path.join(os.path.dirname(__file__), "Data", "transcripts", f"{video_id}.txt")
     assert os.path.exists(transcript_path)
 
     # 2. split_transcript
@@ -251,7 +273,7 @@ def test_listening_pipeline(client):
     assert data["success"] is True
     assert "sections_saved" in data
     # Kiểm tra file section đã tạo
-    split_path = os.path.join(os.path.dirname(__file__), "data", "split", video_id, f"{video_id}_section{section_num}.txt")
+    split_path = os.path.join(os.path.dirname(__file__), "Data", "split", video_id, f"{video_id}_section{section_num}.txt")
     assert os.path.exists(split_path)
 
     # 3. structure_section
@@ -261,7 +283,7 @@ def test_listening_pipeline(client):
     assert data["success"] is True
     assert "questions_saved" in data
     # Kiểm tra file questions đã tạo
-    questions_path = os.path.join(os.path.dirname(__file__), "data", "questions", f"{video_id}_section{section_num}_questions.txt")
+    questions_path = os.path.join(os.path.dirname(__file__), "Data", "questions", f"{video_id}_section{section_num}_questions.txt")
     assert os.path.exists(questions_path)
 
     # 4. index_questions
@@ -285,7 +307,7 @@ def test_split_transcript_api(client):
     section_num = 1
     video_id = "WjTK_u1JI8c"
     # Đảm bảo transcript đã tồn tại (nếu chưa, tạo trước)
-    transcript_path = os.path.join(os.path.dirname(__file__), "data", "transcripts", f"{video_id}.txt")
+    transcript_path = os.path.join(os.path.dirname(__file__), "Data", "transcripts", f"{video_id}.txt")
     if not os.path.exists(transcript_path):
         resp = client.post('/api/listening/get_transcript', data=youtube_url, content_type='text/plain')
         assert resp.status_code == 200
@@ -296,7 +318,7 @@ def test_split_transcript_api(client):
     assert data["success"] is True
     assert "sections_saved" in data
     # Kiểm tra file section đã tạo
-    split_path = os.path.join(os.path.dirname(__file__), "data", "split", video_id, f"{video_id}_section{section_num}.txt")
+    split_path = os.path.join(os.path.dirname(__file__), "Data", "split", video_id, f"{video_id}_section{section_num}.txt")
     assert os.path.exists(split_path)
 
 def test_structure_section_api(client):
@@ -304,10 +326,10 @@ def test_structure_section_api(client):
     section_num = 1
     video_id = "WjTK_u1JI8c"
     # Đảm bảo section đã tồn tại (nếu chưa, tạo trước)
-    split_path = os.path.join(os.path.dirname(__file__), "data", "split", video_id, f"{video_id}_section{section_num}.txt")
+    split_path = os.path.join(os.path.dirname(__file__), "Data", "split", video_id, f"{video_id}_section{section_num}.txt")
     if not os.path.exists(split_path):
         # Đảm bảo transcript cũng tồn tại
-        transcript_path = os.path.join(os.path.dirname(__file__), "data", "transcripts", f"{video_id}.txt")
+        transcript_path = os.path.join(os.path.dirname(__file__), "Data", "transcripts", f"{video_id}.txt")
         if not os.path.exists(transcript_path):
             resp = client.post('/api/listening/get_transcript', data=youtube_url, content_type='text/plain')
             assert resp.status_code == 200
@@ -320,5 +342,1283 @@ def test_structure_section_api(client):
     assert data["success"] is True
     assert "questions_saved" in data
     # Kiểm tra file questions đã tạo
-    questions_path = os.path.join(os.path.dirname(__file__), "data", "questions", f"{video_id}_section{section_num}_questions.txt")
+    questions_path = os.path.join(os.path.dirname(__file__), "Data", "questions", f"{video_id}_section{section_num}_questions.txt")
     assert os.path.exists(questions_path)
+
+def test_question_metadata_roundtrip():
+    from routes.listening import question_to_metadata, metadata_to_question
+    question = {
+        "Introduction": "男の人と女の人が話しています。",
+        "Conversation": "1. はい\n2. いいえ\n3. どうぞ",
+        "Question": "一番いいものはどれですか?",
+        "Options": ["はい", "いいえ", "どうぞ"],
+        "CorrectAnswer": "2"
+    }
+    meta = question_to_metadata(question, "abcdefghijk", 3, 0)
+    assert meta["section"] == 3
+    assert meta["option_count"] == 3
+    assert all(not isinstance(v, (list, dict)) for v in meta.values())
+    restored = metadata_to_question(meta)
+    assert restored["Options"] == question["Options"]
+    assert restored["CorrectAnswer"] == "2"
+    assert restored["video_id"] == "abcdefghijk"
+
+def test_build_question_filter():
+    from routes.listening import build_question_filter
+    assert build_question_filter() is None
+    assert build_question_filter(section=3) == {"section": 3}
+    assert build_question_filter(section="3", option_count=3) == {"$and": [{"section": 3}, {"option_count": 3}]}
+
+def test_llm_client_retries_on_rate_limit(stub_llm):
+    client, state = stub_llm(reply="ok", fail_first=2, provider=dict(backoff_base=0.01), max_concurrency=2)
+    assert client.complete("hello", temperature=0) == "ok"
+    assert len(state.requests) == 3
+    assert state.requests[-1]["temperature"] == 0
+
+def test_llm_client_stream_counts_tokens_and_releases_slot(stub_llm):
+    from services.metrics import LLM_TOKENS
+    reply = "x" * 40
+    client, state = stub_llm(reply=reply, max_concurrency=1)
+    before = LLM_TOKENS.value(model="stub-stream", type="completion")
+    assert ''.join(client.stream_complete("hello", model="stub-stream")) == reply
+    assert state.requests[0]["stream_options"] == {"include_usage": True}
+    assert LLM_TOKENS.value(model="stub-stream", type="completion") == before + len(reply)
+    # A stream abandoned half-way (client disconnected) gives its slot back
+    partial = client.stream_complete("hello", model="stub-stream")
+    next(partial)
+    partial.close()
+    assert client._semaphore.acquire(blocking=False)
+    client._semaphore.release()
+
+def test_generate_words_with_stub_llm(client, stub_llm):
+    reply = '<think>...</think>```json\n[{"kanji": "水", "romaji": "mizu", "vietnamese": "nước", "jlpt_level": "N5", "parts": [{"kanji": "水", "romaji": ["mi", "zu"]}]}]\n```'
+    _, state = stub_llm(reply=reply, max_concurrency=1)
+    response = client.post('/api/generate_words', json={"thematicCategory": "drinks"})
+    assert response.status_code == 200
+    assert response.get_json()[0]["kanji"] == "水"
+    assert len(state.requests) == 1
+
+def test_completion_cache_lru_and_ttl(tmp_path):
+    import time
+    from services.completion_cache import CompletionCache
+    cache = CompletionCache(path=str(tmp_path / "cache.db"), max_bytes=250)
+    cache.set("a", {"text": "x" * 100})
+    cache.set("b", {"text": "y" * 100})
+    assert cache.get("a") is not None  # a becomes most recently used
+    cache.set("c", {"text": "z" * 100})  # evicts b
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.set("d", {"text": "short"}, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert 0 < stats["hit_rate"] < 1
+
+def test_llm_client_serves_deterministic_calls_from_cache(client, tmp_path, stub_llm):
+    from services.completion_cache import CompletionCache
+    llm, state = stub_llm(reply="cached", cache=CompletionCache(path=str(tmp_path / "cache.db")))
+    assert llm.complete("same prompt", temperature=0, cache_tag="t") == "cached"
+    assert llm.complete("same prompt", temperature=0, cache_tag="t") == "cached"
+    llm.complete("same prompt", temperature=0.7)  # sampled call without ttl is not cached
+    assert len(state.requests) == 2
+    stats = client.get('/api/admin/llm_cache').get_json()
+    assert stats["enabled"] is True
+    assert stats["by_tag"]["t"]["hits"] == 1
+
+STUB_QUESTION_BLOCK = """<think>reasoning</think>
+<question>
+Introduction:
+男の人と女の人が話しています。
+
+Conversation:
+男：明日は何時に来ますか。
+女：9時に来ます。
+
+Question:
+女の人は何時に来ますか。
+
+Options:
+1. 8時
+2. 9時
+3. 10時
+4. 11時
+CorrectAnswer: 2
+</question>
+"""
+
+def test_process_video_job(client, tmp_path, monkeypatch, stub_llm):
+    import shutil
+    import time
+    import routes.listening as listening
+    video_id = "7cDxxYs6wKg"
+    os.makedirs(tmp_path / "transcripts")
+    shutil.copy(os.path.join(os.path.dirname(__file__), "Data", "transcripts", f"{video_id}.txt"), tmp_path / "transcripts")
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    indexed = []
+    monkeypatch.setattr(listening, "index_questions", lambda entries: indexed.extend(entries) or sum(len(q) for _, _, q in entries))
+    _, state = stub_llm(reply=STUB_QUESTION_BLOCK, max_concurrency=4)
+    resp = client.post('/api/listening/process_video', json={"youtube_url": f"https://youtu.be/{video_id}"})
+    assert resp.status_code == 202
+    status_url = resp.get_json()["status_url"]
+    for _ in range(100):
+        job = client.get(status_url).get_json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded", job
+    sections = job["result"]["sections"]
+    assert len(sections) == len(state.requests) == job["stages"]["structure"]["total"]
+    assert all(s["num_questions"] == 1 for s in sections)
+    assert len(indexed) == len(sections)  # one batch covering every section
+    assert job["stages"]["index"]["status"] == "done"
+
+def _wait_for_job(queue, job_id, timeout=5):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_job_queue_dedup_and_cancel(tmp_path):
+    import threading
+    from services.jobs import JobQueue
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), workers=1)
+    release = threading.Event()
+    queue.register("echo", lambda ctx, payload: payload)
+    def blocking(ctx, payload):
+        release.wait(5)
+        ctx.check_cancelled()
+        return "done"
+    queue.register("block", blocking)
+
+    running_id, created = queue.submit("block", {"n": 1})
+    assert created
+    same_id, created = queue.submit("block", {"n": 1})
+    assert same_id == running_id and not created
+    queued_id, _ = queue.submit("echo", {"n": 2})  # waits behind the blocking job
+    assert queue.cancel(queued_id)
+    assert queue.get(queued_id)["status"] == "cancelled"
+    assert queue.cancel(running_id)
+    release.set()
+    assert _wait_for_job(queue, running_id)["status"] == "cancelled"
+    assert not queue.cancel(running_id)
+
+    echo_id, _ = queue.submit("echo", {"value": "日本"})
+    job = _wait_for_job(queue, echo_id)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"value": "日本"}
+
+def test_job_queue_shared_between_processes(tmp_path):
+    import collections
+    import threading
+    import time
+    from services.jobs import JobQueue
+
+    # Two queues on one database stand in for two preforked workers
+    path = str(tmp_path / "jobs.db")
+    runs = collections.Counter()
+    counter_lock = threading.Lock()
+    def count(ctx, payload):
+        with counter_lock:
+            runs[payload["n"]] += 1
+        return payload["n"]
+    started = threading.Event()
+    def blocking(ctx, payload):
+        started.set()
+        for _ in range(100):
+            ctx.check_cancelled()
+            time.sleep(0.05)
+        return "not cancelled"
+    first, second = JobQueue(path=path, workers=3), JobQueue(path=path, workers=3)
+    # API-only processes (no worker threads) submit and cancel
+    api, other_api = JobQueue(path=path, workers=0), JobQueue(path=path, workers=0)
+    for queue in (first, second, api, other_api):
+        queue.register("count", count)
+        queue.register("block", blocking)
+
+    # Dedup holds across processes
+    job_id, created = api.submit("count", {"n": 0})
+    assert created and other_api.submit("count", {"n": 0}) == (job_id, False)
+    ids = [(api if n % 2 else other_api).submit("count", {"n": n})[0] for n in range(1, 40)]
+    first.start()
+    second.start()
+    for job in ids + [job_id]:
+        assert _wait_for_job(first, job)["status"] == "succeeded"
+    assert set(runs) == set(range(40)) and set(runs.values()) == {1}  # each job ran exactly once
+
+    # A cancel served by a process that does not run the job reaches the running handler
+    block_id, _ = other_api.submit("block", {"n": 1})
+    assert started.wait(10)
+    assert api.cancel(block_id)
+    job = _wait_for_job(first, block_id)
+    assert job["status"] == "cancelled" and job["cancel_requested"]
+
+def test_job_queue_reclaims_only_stale_running_jobs(tmp_path):
+    import sqlite3
+    import threading
+    import time
+    from services.jobs import JobQueue
+    path = str(tmp_path / "jobs.db")
+    release = threading.Event()
+    worker = JobQueue(path=path, workers=2)
+    worker.register("block", lambda ctx, payload: release.wait(5) and "done")
+    worker.register("echo", lambda ctx, payload: payload)
+    live_id, _ = worker.submit("block", {"n": 1})
+    for _ in range(100):
+        if worker.get(live_id)["status"] == "running":
+            break
+        time.sleep(0.02)
+    assert worker.get(live_id)["owner_pid"] is not None
+
+    # A process starting up (or importing services.jobs) leaves live jobs alone
+    restarted = JobQueue(path=path, workers=0)
+    assert restarted.get(live_id)["status"] == "running"
+
+    # A running job whose process stopped heartbeating is failed by the next claim
+    restarted.register("echo", lambda ctx, payload: payload)
+    dead_id, _ = restarted.submit("echo", {"n": 2})
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE jobs SET status = 'running', heartbeat_at = ? WHERE id = ?", (time.time() - 3600, dead_id))
+    conn.commit()
+    conn.close()
+    echo_id, _ = worker.submit("echo", {"n": 3})
+    assert _wait_for_job(worker, echo_id)["status"] == "succeeded"
+    assert worker.get(dead_id)["status"] == "failed"
+    assert worker.get(live_id)["status"] == "running"
+    release.set()
+    assert _wait_for_job(worker, live_id)["status"] == "succeeded"
+
+def test_generate_words_async_job(client, stub_llm):
+    import time
+    reply = '[{"kanji": "山", "romaji": "yama", "vietnamese": "núi", "jlpt_level": "N5", "parts": [{"kanji": "山", "romaji": ["ya", "ma"]}]}]'
+    stub_llm(reply=reply, latency=0.1, max_concurrency=1)
+    resp = client.post('/api/generate_words?async=1', json={"thematicCategory": "nature-async", "jlptLevel": "N5"})
+    assert resp.status_code == 202
+    body = resp.get_json()
+    for _ in range(100):
+        result = client.get(body["result_url"])
+        if result.status_code != 202:
+            break
+        time.sleep(0.05)
+    assert result.status_code == 200
+    assert result.get_json()[0]["kanji"] == "山"
+    assert client.get(body["status_url"]).get_json()["status"] == "succeeded"
+
+def test_streaming_parsers_handle_split_chunks():
+    from services.llm_parsing import QuestionBlockStream, WordObjectStream
+    text = '<think>maybe <question>draft</question> {"a": 1}</think>' + STUB_QUESTION_BLOCK + '\n' + STUB_QUESTION_BLOCK
+    blocks = QuestionBlockStream()
+    found = []
+    for i in range(0, len(text), 7):
+        found.extend(blocks.feed(text[i:i + 7]))
+    block = STUB_QUESTION_BLOCK[STUB_QUESTION_BLOCK.index('<question>'):STUB_QUESTION_BLOCK.index('</question>') + len('</question>')]
+    assert found == [block] * 2
+
+    word = '{"kanji": "水", "romaji": "mizu", "vietnamese": "nước {lạnh}", "jlpt_level": "N5", "parts": [{"kanji": "水", "romaji": ["mi", "zu"]}]}'
+    text = '<think>{"kanji": "x"}</think>```json\n[' + word + ', ' + word + ', {"kanji": "bad"}]\n```'
+    words = WordObjectStream()
+    found = []
+    for i in range(0, len(text), 5):
+        found.extend(words.feed(text[i:i + 5]))
+    assert [w["vietnamese"] for w in found] == ["nước {lạnh}"]
+
+def test_generate_words_stream_sse(client, stub_llm):
+    reply = '[{"kanji": "水", "romaji": "mizu", "vietnamese": "nước", "jlpt_level": "N5", "parts": [{"kanji": "水", "romaji": ["mi", "zu"]}]},' \
+            ' {"kanji": "茶", "romaji": "cha", "vietnamese": "trà", "jlpt_level": "N5", "parts": [{"kanji": "茶", "romaji": ["cha"]}]}]'
+    _, state = stub_llm(reply=reply, max_concurrency=1)
+    response = client.post('/api/generate_words?stream=1', json={"thematicCategory": "drinks"})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.count('event: word') == 2
+    assert '"fallback": false' in body
+    assert state.requests[0]["stream"] is True
+
+def test_structure_section_stream_sse(client, tmp_path, monkeypatch, stub_llm):
+    import routes.listening as listening
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    os.makedirs(os.path.dirname(listening.section_file("abcdefghijk", 1)))
+    with open(listening.section_file("abcdefghijk", 1), "w", encoding="utf-8") as f:
+        f.write("1番\n男：明日は何時に来ますか。")
+    stub_llm(reply=STUB_QUESTION_BLOCK, max_concurrency=1)
+    response = client.post('/api/listening/structure_section', json={"youtube_url": "https://youtu.be/abcdefghijk", "section_num": 1},
+                           headers={"Accept": "text/event-stream"})
+    body = response.get_data(as_text=True)
+    assert body.count('event: question') == 1
+    assert 'event: done' in body
+    with open(listening.questions_file("abcdefghijk", 1), encoding="utf-8") as f:
+        assert f.read() == STUB_QUESTION_BLOCK
+
+def test_word_parser_recovers_malformed_corpus():
+    import random
+    from benchmarks.vocab_corpus import build_corpus, chunked
+    from services.llm_parsing import WordObjectStream, parse_word_objects
+    rng = random.Random(1)
+    for name, text, expected in build_corpus(seed=1, size=150):
+        assert [w["kanji"] for w in parse_word_objects(text)] == expected, name
+        stream = WordObjectStream()
+        found = [w for chunk in chunked(text, rng) for w in stream.feed(chunk)] + stream.close()
+        assert [w["kanji"] for w in found] == expected, name
+
+def test_parse_json_response_fallback():
+    from routes.wordImport import parse_json_response, fallback_words
+    assert parse_json_response("<think>{}</think>Xin lỗi, tôi không thể.", fallback_words('N4')) == fallback_words('N4')
+    words = parse_json_response("[{kanji: '水', romaji: 'mizu', vietnamese: 'nước', jlpt_level: 'N5', parts: [],},]", [])
+    assert words[0]["vietnamese"] == "nước"
+
+def test_question_parser_fields_and_cache(client, tmp_path, monkeypatch):
+    import json
+    import routes.listening as listening
+    from services.question_parser import parse_question_blocks, cache_path
+    text = "<think>dùng thẻ <question> và Options:</think>\n" + STUB_QUESTION_BLOCK + """
+<question>
+Introduction: 3番
+Conversation:
+女：すみません。
+Options:
+1) はい
+2. いいえ
+3．どうも
+CorrectAnswer: 3
+</question>"""
+    first, second = parse_question_blocks(text)
+    assert first.question == "女の人は何時に来ますか。" and first.is_complete()
+    assert first.to_dict()["CorrectAnswer"] == "2" and first.option_count == 4
+    assert second.introduction == "3番" and second.options == ["はい", "いいえ", "どうも"]
+    assert second.correct_answer == 3 and not second.is_complete()
+
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    path = listening.questions_file("abcdefghijk", 2)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    response = client.get('/api/listening/questions/abcdefghijk/2')
+    assert [q["OptionCount"] for q in response.get_json()["questions"]] == [4, 3]
+    # A fresh cache is served as-is without reparsing the text file
+    with open(cache_path(path), encoding="utf-8") as f:
+        cached = json.load(f)
+    cached["questions"] = cached["questions"][:1]
+    with open(cache_path(path), "w", encoding="utf-8") as f:
+        json.dump(cached, f)
+    assert len(listening.parse_questions_from_file(path)) == 1
+    os.utime(path, (0, 0))
+    assert len(listening.parse_questions_from_file(path)) == 2
+    response = client.get('/api/listening/questions/abcdefghijk')
+    assert response.get_json()["sections"][0]["section_num"] == 2
+    assert client.get('/api/listening/questions/zzzzzzzzzzz').status_code == 404
+
+def test_transcript_splitter_matches_checked_in_splits(tmp_path):
+    import io
+    from services.transcript_splitter import iter_sections, split_directory
+    base = os.path.join(os.path.dirname(__file__), "Data")
+    results = split_directory(os.path.join(base, "transcripts"), str(tmp_path), workers=1)
+    for video_id in os.listdir(os.path.join(base, "split")):
+        expected_files = sorted(os.listdir(os.path.join(base, "split", video_id)))
+        assert sorted(os.path.basename(p) for p in set(results[video_id])) == expected_files
+        for name in expected_files:
+            with open(os.path.join(base, "split", video_id, name), encoding="utf-8") as f:
+                expected = f.read()
+            with open(tmp_path / video_id / name, encoding="utf-8") as f:
+                assert f.read() == expected, name
+    # Tiny blocks exercise the carry-over between reads
+    text = "前置き\n問題1\n1\n\n番 選んでください\n 2番です\n問題2です"
+    sections = list(iter_sections(io.StringIO(text), block_size=3))
+    assert [(s.number, s.first_line) for s in sections] == [("1", 1), ("2", 6)]
+    assert sections[0].text == "問題1\n1番 選んでください\n2番です"
+
+def test_timed_transcript_index_and_routes(client, tmp_path, monkeypatch):
+    import routes.listening as listening
+    from services.transcript_store import write_transcript
+    with open(os.path.join(os.path.dirname(__file__), "Data", "transcripts", "7cDxxYs6wKg.txt"), encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    entries = [{"text": text, "start": i * 2.0, "duration": 2.0} for i, text in enumerate(lines)]
+    index = write_transcript(str(tmp_path / "transcripts"), "7cDxxYs6wKg", entries)
+    assert [s["section_num"] for s in index["sections"]] == [1, 2, 3, 4]
+    first = index["sections"][0]
+    assert lines[first["questions"][0]["entry"]].startswith("1番デパート")
+    with open(tmp_path / "transcripts" / "7cDxxYs6wKg.txt", encoding="utf-8") as f:
+        assert f.read().splitlines() == lines
+
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    body = client.get('/api/listening/transcript/7cDxxYs6wKg/sections/2').get_json()
+    second = index["sections"][1]
+    assert body["section"]["start"] == second["start"]
+    assert [e["text"] for e in body["entries"]] == lines[second["first_entry"]:second["last_entry"] + 1]
+    body = client.get('/api/listening/transcript/7cDxxYs6wKg?start=11&end=16').get_json()
+    assert [e["start"] for e in body["entries"]] == [10.0, 12.0, 14.0]
+    assert client.get('/api/listening/transcript/7cDxxYs6wKg/sections/9').status_code == 404
+    assert client.get('/api/listening/transcript/A1TqRr1jTdI').status_code == 404
+
+
+def test_transcript_repository_cache_refresh_and_staleness(tmp_path):
+    import json
+    from services.transcript_repository import FixtureDirFetcher, TranscriptRepository, TranscriptNotFound
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    with open(fixtures / "vid00000001.jsonl", "w", encoding="utf-8") as f:
+        for i, text in enumerate(["問題1", "1番 男の人と女の人が話しています"]):
+            f.write(json.dumps({"text": text, "start": i * 3.0, "duration": 3.0}, ensure_ascii=False) + "\n")
+    repo = TranscriptRepository(str(tmp_path / "transcripts"), fetcher=FixtureDirFetcher(str(fixtures)))
+    first = repo.get("vid00000001")
+    assert first["cached"] is False and first["meta"]["source"] == "fixture"
+    assert first["lines"] == ["問題1", "1番 男の人と女の人が話しています"]
+    second = repo.get("vid00000001")
+    assert second["cached"] is True and second["meta"]["fetched_at"] == first["meta"]["fetched_at"]
+    assert repo.get("vid00000001", refresh=True)["cached"] is False
+    repo.max_age = 0
+    assert repo.get("vid00000001")["cached"] is False
+    with pytest.raises(TranscriptNotFound):
+        repo.get("missing0000")
+
+
+def test_transcript_repository_dedupes_concurrent_fetches(tmp_path):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from services.transcript_repository import TranscriptFetcher, TranscriptRepository
+
+    class SlowFetcher(TranscriptFetcher):
+        name = 'slow'
+        calls = 0
+        lock = threading.Lock()
+
+        def fetch(self, video_id):
+            with self.lock:
+                SlowFetcher.calls += 1
+            time.sleep(0.2)
+            return [{"text": "問題1", "start": 0.0, "duration": 1.0}]
+
+    repo = TranscriptRepository(str(tmp_path), fetcher=SlowFetcher())
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: repo.get("vid00000002"), range(8)))
+    assert SlowFetcher.calls == 1
+    assert [r["cached"] for r in results].count(False) == 1
+    assert all(r["lines"] == ["問題1"] for r in results)
+
+
+def test_get_transcript_serves_stored_transcript_first(client, tmp_path, monkeypatch):
+    import shutil
+    import routes.listening as listening
+    from services.transcript_repository import TranscriptFetcher, set_transcript_fetcher
+
+    class FailingFetcher(TranscriptFetcher):
+        name = 'failing'
+
+        def fetch(self, video_id):
+            raise AssertionError("stored transcript should not be fetched")
+
+    (tmp_path / "transcripts").mkdir()
+    shutil.copy(os.path.join(os.path.dirname(__file__), "Data", "transcripts", "7cDxxYs6wKg.txt"),
+                tmp_path / "transcripts" / "7cDxxYs6wKg.txt")
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    previous = set_transcript_fetcher(FailingFetcher())
+    try:
+        response = client.post('/api/listening/get_transcript',
+                               json={"youtube_url": "https://www.youtube.com/watch?v=7cDxxYs6wKg"})
+    finally:
+        set_transcript_fetcher(previous)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["cached"] is True and body["source"] == "local"
+    assert body["transcript"][0] == "日本語能力"
+
+
+def test_listening_catalog_incremental_refresh(client, tmp_path, monkeypatch):
+    import shutil
+    import routes.listening as listening
+    from services.listening_catalog import ListeningCatalog
+    data_dir = os.path.join(os.path.dirname(__file__), "Data")
+    shutil.copytree(os.path.join(data_dir, "split", "7cDxxYs6wKg"), tmp_path / "split" / "7cDxxYs6wKg")
+    (tmp_path / "questions").mkdir()
+    for num in (1, 2):
+        shutil.copy(os.path.join(data_dir, "questions", f"7cDxxYs6wKg_section{num}_questions.txt"), tmp_path / "questions")
+
+    catalog = ListeningCatalog(str(tmp_path), min_interval=0)
+    assert catalog.refresh() == ["7cDxxYs6wKg"]
+    video = catalog.video("7cDxxYs6wKg")
+    assert [s["section_num"] for s in video["sections"]] == [1, 2, 3, 4]
+    assert [s["has_questions"] for s in video["sections"]] == [True, True, False, False]
+    assert video["processed"] is False
+    assert video["total_questions"] == sum(s["num_questions"] for s in video["sections"]) > 0
+    assert catalog.refresh() == []
+    # A fresh instance picks up the manifest and finds nothing to redo
+    assert ListeningCatalog(str(tmp_path), min_interval=0).refresh() == []
+
+    questions_path = tmp_path / "questions" / "7cDxxYs6wKg_section2_questions.txt"
+    questions_path.write_text(questions_path.read_text(encoding="utf-8").split("</question>")[0] + "</question>",
+                              encoding="utf-8")
+    os.utime(questions_path, (1, 1))
+    assert catalog.refresh() == ["7cDxxYs6wKg"]
+    assert catalog.video("7cDxxYs6wKg")["sections"][1]["num_questions"] == 1
+
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    body = client.get('/api/listening/videos').get_json()
+    assert [v["video_id"] for v in body["videos"]] == ["7cDxxYs6wKg"]
+    assert "questions" not in body["videos"][0]["sections"][0]
+    body = client.get('/api/listening/videos/7cDxxYs6wKg').get_json()
+    assert body["sections"][0]["questions"][0]["Options"]
+    shutil.rmtree(tmp_path / "split")
+    for name in os.listdir(tmp_path / "questions"):
+        os.remove(tmp_path / "questions" / name)
+    listening.listening_catalog().invalidate()
+    assert client.get('/api/listening/videos/7cDxxYs6wKg').status_code == 404
+
+
+def test_similar_questions_cache_and_neighbours(client, tmp_path, monkeypatch):
+    import uuid
+    import numpy as np
+    import chromadb
+    from chromadb.utils import embedding_functions
+    import routes.listening as listening
+    from services.question_similarity import QueryEmbeddingCache, NeighbourIndex, normalize_text, build_neighbours
+
+    class CharEmbedding(embedding_functions.EmbeddingFunction):
+        calls = 0
+
+        def __init__(self):
+            pass
+
+        def __call__(self, input):
+            CharEmbedding.calls += len(input)
+            vectors = []
+            for text in input:
+                vector = [0.0] * 16
+                for ch in text:
+                    vector[ord(ch) % 16] += 1.0
+                vectors.append(vector)
+            return vectors
+
+        def name(self):
+            return "char-embedding"
+
+    embedding = CharEmbedding()
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        name=f"test_{uuid.uuid4().hex}", embedding_function=embedding)
+    monkeypatch.setattr(listening, "_embedding_function", embedding)
+    monkeypatch.setattr(listening, "_question_collection", collection)
+    monkeypatch.setattr(listening, "query_embeddings", QueryEmbeddingCache(maxsize=2))
+    monkeypatch.setattr(listening, "question_neighbours", NeighbourIndex(str(tmp_path / "neighbours.json"), k=3))
+
+    questions = [{"Introduction": f"{i}番", "Conversation": text, "Question": "どうしますか",
+                  "Options": ["a", "b", "c"], "CorrectAnswer": "1"}
+                 for i, text in enumerate(["ああああ", "あああい", "かきくけこ", "かきくけさ"], start=1)]
+    assert listening.index_questions([("vid", 1, questions)]) == 4
+    assert os.path.exists(tmp_path / "neighbours.json")
+
+    calls = CharEmbedding.calls
+    body = client.get('/api/listening/similar/vid_1_0?n_results=2').get_json()
+    assert [q["id"] for q in body["questions"]][0] == "vid_1_1" and len(body["questions"]) == 2
+    assert body["questions"][0]["Conversation"] == "あああい"
+    assert CharEmbedding.calls == calls  # pure lookup, no encoding
+    assert client.get('/api/listening/similar/missing').status_code == 404
+
+    for text in ("かきくけこ", " かきくけこ\n", "ｶｷｸｹｺ"):
+        response = client.post('/api/listening/similar', json={"conversation": text, "n_results": 1})
+        assert response.status_code == 200
+    assert normalize_text(" かきくけこ\n") == "かきくけこ"
+    stats = listening.query_embeddings.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert CharEmbedding.calls == calls + 2
+
+    neighbours = build_neighbours(["a", "b", "c"], [[0, 0], [1, 0], [5, 0]], k=5, block_size=2)
+    assert neighbours["a"] == [["b", 1.0], ["c", 25.0]]
+    assert neighbours["c"][0] == ["b", 16.0]
+
+    # indexing more questions refreshes the stored lists incrementally, with the same result
+    more = [dict(questions[0], Conversation=text) for text in ("あああう", "かきくけし")]
+    other_worker = NeighbourIndex(str(tmp_path / "neighbours.json"), k=3)
+    assert other_worker.lookup("vid_1_0") is not None
+    assert listening.index_questions([("vid", 2, more)]) == 2
+    stored = collection.get(include=["embeddings"])
+    full = build_neighbours(stored["ids"], stored["embeddings"], k=3)
+    assert all([d for _, d in listening.question_neighbours.lookup(i)] == [d for _, d in full[i]] for i in stored["ids"])
+    assert other_worker.lookup("vid_2_0") is not None  # reloaded after the file changed
+
+    rng = np.random.default_rng(0)
+    ids = [f"q{i}" for i in range(60)]
+    vectors = rng.normal(size=(60, 8))
+    index = NeighbourIndex(str(tmp_path / "random.json"), k=5)
+    index.rebuild(ids[:50], vectors[:50])
+    vectors[[3, 7]] = rng.normal(size=(2, 8))  # re-embedded, possibly far from their old neighbours
+    index.update(ids, vectors, ids[50:] + ["q3", "q7"])
+    expected = build_neighbours(ids, vectors, k=5)
+    assert all([n for n, _ in index.lookup(i)] == [n for n, _ in expected[i]] for i in ids)
+
+
+def test_generate_questions_batched_with_examples(client, monkeypatch, stub_llm):
+    import re
+    import routes.listening as listening
+    from services.question_generation import GenerationItem, pack_batches, parse_batch_response
+
+    def reply(payload):
+        prompt = payload["messages"][0]["content"]
+        ids = re.findall(r'<conversation id="(\d+)">', prompt)
+        if len(ids) > 1:
+            ids = ids[:-1]  # lose the last block of every batch; it must be retried alone
+        return "<think>...</think>" + "".join(
+            STUB_QUESTION_BLOCK.split("</think>")[1].replace("<question>", f'<question id="{i}">') for i in ids)
+
+    example = {"id": "vid_1_0", "Introduction": "例", "Conversation": "例の会話", "Question": "何ですか",
+               "Options": ["a", "b", "c"], "CorrectAnswer": "1"}
+    monkeypatch.setattr(listening, "search_similar_questions_many",
+                        lambda conversations, n_results=3, **kw: [[example] for _ in conversations])
+    _, state = stub_llm(reply=reply, max_concurrency=4)
+    conversations = [f"男：{i}時に会いましょう。\n女：はい。" for i in range(6)]
+    response = client.post('/api/listening/generate_questions', json={"conversations": conversations})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["failed"] == [] and all(q["CorrectAnswer"] == "2" for q in body["questions"])
+    # one packed call plus one retry for the dropped block
+    assert body["llm_calls"] == len(state.requests) == 2
+    assert state.requests[0]["messages"][0]["content"].count("例の会話") == 1
+
+    # a budget below one conversation's size sends each one alone
+    items = [GenerationItem(i, c, [example]) for i, c in enumerate(conversations)]
+    assert len(pack_batches(items, 300)) == 6 and len(pack_batches(items, 6000)) == 1
+    questions, calls = listening.generate_questions_batch(conversations, max_tokens=300)
+    assert all(questions) and calls == 6
+    assert client.post('/api/listening/generate_questions', json={"conversations": []}).status_code == 400
+
+    untagged = STUB_QUESTION_BLOCK * 2
+    assert sorted(parse_batch_response(untagged, [4, 7])) == [4, 7]
+    assert parse_batch_response(untagged, [1, 2, 3]) == {}
+
+
+def test_structure_section_chunks_long_sections(client, tmp_path, monkeypatch, stub_llm):
+    import routes.listening as listening
+    from services.question_generation import estimate_tokens
+    from services.section_chunker import chunk_section, merge_question_blocks
+    from services.transcript_store import find_question_markers
+    with open(os.path.join(os.path.dirname(__file__), "Data", "split", "7cDxxYs6wKg", "7cDxxYs6wKg_section2.txt"),
+              encoding="utf-8") as f:
+        text = listening.clean_text(f.read())
+    chunks = chunk_section(text, 400)
+    assert len(chunks) > 2
+    assert ''.join(chunks).replace(' ', '') == text.replace(' ', '')
+    starts = [text[offset:offset + 6].replace(' ', '') for _, offset in find_question_markers(text)]
+    for chunk in chunks[1:]:
+        assert chunk[:6].replace(' ', '') in starts  # every later chunk starts at a question
+    assert max(estimate_tokens(c) for c in chunks) <= 400
+    assert chunk_section(text, 100000) == [text]
+
+    example = STUB_QUESTION_BLOCK.split("</think>")[1]
+
+    def reply(payload):
+        transcript = payload["messages"][0]["content"].split("Here is the transcript:\n")[1]
+        # every chunk answers its own question plus the same worked example
+        return example + example.replace("明日は何時に来ますか。", transcript[:20])
+
+    monkeypatch.setattr(listening, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(listening, "STRUCTURE_CHUNK_TOKENS", 400)
+    _, state = stub_llm(reply=reply, fail_first=1, fail_status=500, provider=dict(max_retries=0), max_concurrency=4)
+    result = listening.structure_section("abcdefghijk", 2, text)
+    questions = listening.load_questions(listening.questions_file("abcdefghijk", 2))
+    # one failed call retried, one call per chunk
+    assert len(state.requests) == len(chunks) + 1
+    assert len(questions) == len(chunks) + 1  # example kept once
+    assert result.count("<question>") == len(questions)
+    assert merge_question_blocks([example, "<think><question>x</question></think>" + example]) == example.strip()
+
+
+def test_sql_instrumentation_server_timing_and_metrics(client, monkeypatch):
+    import logging
+    import models.query_metrics as query_metrics
+    client.delete('/api/admin/sql_metrics')
+    response = client.get('/api/word_progress/all-groups/stats')
+    assert response.status_code == 200
+    timing = response.headers.getlist('Server-Timing')
+    assert timing[0].startswith('db;dur=') and timing[0].endswith('queries"') and timing[1].startswith('app;dur=')
+
+    word_progress_logger = logging.getLogger('models.word_progress')
+    level = word_progress_logger.level
+    word_progress_logger.setLevel(logging.DEBUG)
+    try:
+        client.get('/api/word_progress/all-groups/stats')
+    finally:
+        word_progress_logger.setLevel(level)
+    endpoint = client.get('/api/admin/sql_metrics').get_json()["endpoints"]["word_progress.get_all_groups_stats"]
+    # the debug-only COUNT query runs only when DEBUG is enabled
+    assert (endpoint["requests"], endpoint["queries"], endpoint["max_queries"]) == (2, 3, 2)
+    assert endpoint["rows"] > 0
+
+    monkeypatch.setattr(query_metrics, 'SLOW_QUERY_MS', 0)
+    client.get('/api/words/1')
+    slow = client.get('/api/admin/sql_metrics').get_json()["slow_queries"]
+    assert slow and slow[-1]["endpoint"] and any("words" in line or "SEARCH" in line or "SCAN" in line
+                                                   for entry in slow for line in entry["plan"])
+
+
+def test_sql_instrumentation_times_fetches_and_skips_failed_statements(monkeypatch):
+    import sqlite3
+    import time
+    import models.query_metrics as query_metrics
+    slow = []
+    monkeypatch.setattr(query_metrics, 'SLOW_QUERY_MS', 50)
+    monkeypatch.setattr(query_metrics, 'log_slow_query',
+                        lambda connection, sql, parameters, duration_ms: slow.append(duration_ms))
+    conn = sqlite3.connect(':memory:')
+    conn.create_function('slow', 1, lambda x: time.sleep(0.01) or x)
+    cursor = query_metrics.InstrumentedCursor(conn.cursor())
+    # SQLite computes one row per step: execute() runs the first, fetchall() the other nine
+    cursor.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10) "
+                   "SELECT slow(i) FROM n")
+    assert not slow
+    assert len(cursor.fetchall()) == 10
+    record = cursor._record
+    assert record.duration_ms >= 100 and record.rows == 10
+    assert len(slow) == 1 and slow[0] == record.duration_ms
+
+    monkeypatch.setattr(query_metrics, 'SLOW_QUERY_MS', 0)
+    with pytest.raises(sqlite3.OperationalError):
+        cursor.execute("SELECT * FROM missing_table")
+    assert len(slow) == 1 and cursor._record is record
+
+def test_prometheus_metrics_endpoint(client, tmp_path, stub_llm):
+    import re
+    import numpy as np
+    import routes.listening as listening
+    from services.completion_cache import CompletionCache
+    from services.metrics import Histogram
+
+    client.get('/api/words/')
+    client.get('/api/word_progress/all-groups/stats')
+    stub_llm(reply="ok", fail_first=1, fail_status=400, cache=CompletionCache(path=str(tmp_path / "cache.db")))
+    with pytest.raises(Exception):
+        listening.get_llm_client().complete("hi", model="stub-model", temperature=0)
+    listening.get_llm_client().complete("hi", model="stub-model", temperature=0)
+    listening.get_llm_client().complete("hi", model="stub-model", temperature=0)  # cache hit
+
+    embedding = listening.LocalEmbeddingFunction.__new__(listening.LocalEmbeddingFunction)
+    embedding.model_id = "fake-model"
+    embedding.model = type("FakeModel", (), {"encode": lambda self, texts, show_progress_bar=False: np.zeros((len(texts), 4))})()
+    assert len(embedding(["a", "b"])) == 2
+
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    raw = response.get_data(as_text=True)
+    # every sample is labelled with the worker that recorded it
+    assert f'llm_tokens_total{{model="stub-model",type="completion",pid="{os.getpid()}"}}' in raw
+    text = re.sub(r'\{pid="\d+"\}|,pid="\d+"', '', raw)
+
+    def sample(pattern):
+        match = re.search(pattern + r' ([0-9.e+-]+)$', text, re.MULTILINE)
+        assert match, pattern
+        return float(match.group(1))
+
+    assert sample(r'http_request_duration_seconds_count\{blueprint="words",route="/api/words/",method="GET"\}') >= 1
+    assert sample(r'http_requests_total\{blueprint="word_progress",route="/api/word_progress/all-groups/stats",method="GET",status="200"\}') >= 1
+    assert sample(r'sqlite_query_duration_seconds_count\{statement="SELECT"\}') >= 2
+    assert sample(r'sqlite_connection_wait_seconds_count') >= 1
+    assert sample(r'llm_request_duration_seconds_count\{model="stub-model",mode="chat"\}') == 1
+    assert sample(r'llm_errors_total\{model="stub-model",status="400"\}') == 1
+    assert sample(r'llm_tokens_total\{model="stub-model",type="completion"\}') == 2
+    assert sample(r'cache_hits_total\{cache="llm_completions"\}') == 1
+    assert '# TYPE cache_hits_total counter' in text and '# TYPE cache_misses_total counter' in text
+    assert 'cache_entries{cache="query_embeddings"}' in text
+    assert sample(r'embedding_texts_total\{model="fake-model"\}') >= 2
+
+    histogram = Histogram("h", "test", ("k",), buckets=(1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value, k="x")
+    assert histogram.collect()[2:] == ['h_bucket{k="x",le="1"} 2', 'h_bucket{k="x",le="2"} 3', 'h_bucket{k="x",le="+Inf"} 4',
+                                       'h_sum{k="x"} 6', 'h_count{k="x"} 4']
+
+def test_load_harness_synthetic_database(tmp_path, monkeypatch):
+    import sqlite3
+    from benchmarks.load_test import compare, percentile, run_load
+    from benchmarks.synthetic_db import build_database
+
+    path = str(tmp_path / "bench.db")
+    dataset = build_database(path, words=300, groups=20, review_items=1000, seed=1)
+    assert dataset["words"] == 300 and dataset["study_sessions"] == 20
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM words").fetchone()[0] == 300
+        assert conn.execute("SELECT COUNT(*) FROM word_review_items").fetchone()[0] == 1000
+        # words_count recomputed after the bulk load, triggers restored
+        assert conn.execute("SELECT SUM(words_count) FROM groups").fetchone()[0] == dataset["word_groups"]
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert "update_group_words_count_insert" in triggers
+    finally:
+        conn.close()
+
+    assert percentile([1, 2, 3, 4], 50) == 2 and percentile([1, 2, 3, 4], 99) == 4
+
+    from app import create_app
+    only = ["words_search", "group_words", "all_groups_stats", "dashboard_quick_stats"]
+    results = run_load(create_app({"DATABASE_URL": None, "DATABASE_PATH": path}), groups=20, clients=3, requests=12, warmup=2, only=only)
+    assert sorted(results) == sorted(only)
+    for stats in results.values():
+        assert stats["errors"] == 0 and stats["requests"] == 12
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+        assert stats["throughput_rps"] > 0
+
+    ratios = compare({"scenarios": results}, {"scenarios": results})
+    assert ratios["group_words"]["p95_ms"] == 1.0
+
+def test_async_views_gather_llm_calls(client, monkeypatch, stub_llm):
+    import time
+    import threading
+    import routes.listening as listening
+    from services.async_llm_client import get_async_llm_client
+    from services.embedding_executor import EmbeddingExecutor, ExecutorBusy, set_embedding_executor
+    from services.metrics import HTTP_REQUESTS
+
+    # The async views have their own limit (LLM_ASYNC_MAX_CONCURRENCY), not the sync one
+    llm, state = stub_llm(reply=STUB_QUESTION_BLOCK, latency=0.3, provider=dict(max_retries=0), max_concurrency=1)
+    previous_executor = set_embedding_executor(EmbeddingExecutor(max_workers=1, max_pending=4))
+    monkeypatch.setattr(listening, "BATCH_MAX_TOKENS", 1)  # one LLM call per conversation
+    monkeypatch.setattr(listening, "search_similar_questions",
+                        lambda conversation, **kw: [{"Conversation": conversation, "distance": 0.0}])
+    route = dict(blueprint="listening", route="/api/listening/generate_questions", method="POST", status=200)
+    before = HTTP_REQUESTS.value(**route)
+    try:
+        start = time.perf_counter()
+        response = client.post("/api/listening/generate_questions",
+                               json={"conversations": [f"会話{i}" for i in range(8)], "examples": 0})
+        elapsed = time.perf_counter() - start
+        body = response.get_json()
+        assert response.status_code == 200 and body["failed"] == [] and body["llm_calls"] == 8
+        assert len(state.requests) == 8
+        # 8 calls of 0.3 s are awaited together inside the view
+        assert elapsed < 1.5
+        # the async view goes through the app's own request hooks
+        assert HTTP_REQUESTS.value(**route) == before + 1
+        assert get_async_llm_client().in_flight() == 0
+
+        # a second round reuses the pooled keep-alive connections
+        client.post("/api/listening/generate_questions",
+                    json={"conversations": [f"会話{i}" for i in range(8, 16)], "examples": 0})
+        assert len(state.requests) == 16 and len(state.peers) <= 8
+        assert get_async_llm_client().client is llm
+
+        single = client.post("/api/listening/generate_question_from_conversation", json={"conversation": "会話"})
+        assert single.get_json()["question"]["CorrectAnswer"] == "2"
+        similar = client.post("/api/listening/similar", json={"conversation": "会話"})
+        assert similar.get_json()["questions"][0]["Conversation"] == "会話"
+        assert client.post("/api/listening/similar", json={}).status_code == 400
+    finally:
+        set_embedding_executor(previous_executor)
+
+    executor = EmbeddingExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    future = executor.submit(release.wait)
+    with pytest.raises(ExecutorBusy):
+        executor.submit(release.wait)
+    release.set()
+    future.result(timeout=5)
+    assert executor.submit(lambda: 1).result(timeout=5) == 1
+    executor.shutdown()
+
+def test_create_app_factory_schema_once_and_fork_reset(tmp_path, monkeypatch):
+    import sqlite3
+    from app import create_app
+    from models.database import Database, SCHEMA_VERSION
+    from services import jobs as jobs_module, llm_client
+    from services.llm_client import LLMClient, OpenAICompatibleProvider, set_llm_client
+
+    path = str(tmp_path / "factory.db")
+    fresh = create_app({"DATABASE_URL": None, "DATABASE_PATH": path})
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM words").fetchone()[0] > 0
+    conn.close()
+
+    # a second app (another worker, a restart) does no schema work on a current database
+    def fail(self, cursor):
+        raise AssertionError("schema setup repeated")
+    monkeypatch.setattr(Database, "setup_tables", fail)
+    worker = create_app({"DATABASE_URL": None, "DATABASE_PATH": path})
+    with worker.test_client() as http:
+        body = http.get("/api/words/?per_page=1").get_json()
+        assert body["data"]["total"] > 0 and http.get("/api/test").status_code == 200
+    assert fresh.url_map is not worker.url_map and app.config["DATABASE_PATH"] == "word.db"
+
+    previous = set_llm_client(LLMClient(OpenAICompatibleProvider(url="http://127.0.0.1:9")))
+    parent_conn = jobs_module.jobs._conn
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = jobs_module.jobs._conn is not parent_conn and llm_client._client is None
+        ok = ok and jobs_module.jobs.get("missing") is None
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    try:
+        os.close(write_fd)
+        assert os.read(read_fd, 1) == b"1"
+        os.waitpid(pid, 0)
+        assert jobs_module.jobs._conn is parent_conn and llm_client._client is not None
+    finally:
+        os.close(read_fd)
+        set_llm_client(previous)
+
+def test_analytics_reads_use_read_only_connection(tmp_path):
+    import sqlite3
+    from app import create_app
+    from models import Dashboard
+    from models.database import ReadOnlyDatabase
+    from models.snapshot import snapshots, snapshot_path
+
+    path = str(tmp_path / "analytics.db")
+    wal_app = create_app({"DATABASE_URL": None, "DATABASE_PATH": path, "ANALYTICS_DB_MODE": "wal"})
+    with wal_app.app_context():
+        before = Dashboard.get_study_progress()["total_sessions"]
+        with pytest.raises(sqlite3.OperationalError):
+            ReadOnlyDatabase().cursor().execute("DELETE FROM study_sessions")
+
+        # an open analytics read transaction does not block a writer (timeout 0)
+        reader = ReadOnlyDatabase().cursor()
+        reader.execute("SELECT id FROM study_sessions")
+        reader.fetchone()
+        writer = sqlite3.connect(path, timeout=0)
+        writer.execute("INSERT INTO study_sessions (group_id, study_activity_id) VALUES (1, 1)")
+        writer.commit()
+        # and a pending write transaction does not block analytics
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO study_sessions (group_id, study_activity_id) VALUES (1, 1)")
+    with wal_app.app_context():
+        assert Dashboard.get_study_progress()["total_sessions"] == before + 1
+    writer.rollback()
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    snapshot_app = create_app({"DATABASE_URL": None, "DATABASE_PATH": path, "ANALYTICS_DB_MODE": "snapshot", "INIT_DB": False})
+    previous_interval, snapshots.interval = snapshots.interval, 3600
+    try:
+        with snapshot_app.test_client() as http:
+            words = http.get("/api/dashboard/quick_stats").get_json()["total_words"]
+            assert os.path.exists(snapshot_path(path))
+            writer.execute("INSERT INTO words (kanji, romaji, vietnamese, parts) VALUES ('新', 'shin', 'mới', '[]')")
+            writer.commit()
+            # served from the snapshot until it is refreshed
+            assert http.get("/api/dashboard/quick_stats").get_json()["total_words"] == words
+            snapshots.refresh(path)
+            assert http.get("/api/dashboard/quick_stats").get_json()["total_words"] == words + 1
+            stats = http.get("/api/word_progress/all-groups/stats").get_json()
+            assert stats["groups"] and "overall_progress" in stats["overall"]
+    finally:
+        snapshots.interval = previous_interval
+        writer.close()
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    """$TEST_POSTGRES_URL, else a throwaway cluster when initdb/pg_ctl are on PATH, else skip."""
+    import shutil
+    import socket
+    import subprocess
+    pytest.importorskip("psycopg")
+    pytest.importorskip("psycopg_pool")
+    if os.getenv("TEST_POSTGRES_URL"):
+        yield os.environ["TEST_POSTGRES_URL"]
+        return
+    if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+        pytest.skip("PostgreSQL not available (set TEST_POSTGRES_URL or put initdb/pg_ctl on PATH)")
+    data = tmp_path_factory.mktemp("pgdata")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    subprocess.run(["initdb", "-D", str(data), "-U", "postgres", "--auth=trust"], check=True, capture_output=True)
+    subprocess.run(["pg_ctl", "-D", str(data), "-l", str(data / "server.log"), "-w",
+                    "-o", f"-h 127.0.0.1 -p {port} -k {data}", "start"], check=True, capture_output=True)
+    try:
+        yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run(["pg_ctl", "-D", str(data), "-m", "fast", "stop"], capture_output=True)
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def backend_app(request, tmp_path):
+    """A freshly seeded app on each storage backend."""
+    from app import create_app
+    if request.param == "sqlite":
+        return create_app({"DATABASE_URL": None, "DATABASE_PATH": str(tmp_path / "backend.db")})
+    url = request.getfixturevalue("postgres_url")
+    import psycopg
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+    return create_app({"DATABASE_URL": url})
+
+def test_models_on_each_storage_backend(backend_app):
+    from models.database import Database
+    from models.word_progress import WordProgress
+    from routes.wordImport import save_jlpt_level
+
+    with backend_app.test_client() as http:
+        stats = http.get("/api/dashboard/quick_stats").get_json()
+        assert stats["total_words"] > 0 and stats["total_activities"] > 0
+        word = http.post("/api/words/", json={"kanji": "猫", "romaji": "neko", "vietnamese": "con mèo",
+                                              "parts": "[]"}).get_json()["data"]
+        assert word["kanji"] == "猫" and word["jlpt_level"] is None
+        assert http.get("/api/words/?search=NEKO").get_json()["data"]["total"] == 1
+
+        with backend_app.app_context():
+            group = Group.create("Backend test")
+            assert Group.add_word_to_group(group["id"], word["id"])
+            assert not Group.add_word_to_group(group["id"], word["id"])
+            assert Group.get_by_id(group["id"])["words_count"] == 1  # trigger
+            session = StudySession.create(group["id"], 1)
+            assert session["group_id"] == group["id"] and len(session["created_at"]) == 19
+            WordProgress.create(word["id"], "learned")
+            assert word["id"] in [p["word_id"] for p in WordProgress.get_by_status("learned")]
+            save_jlpt_level(word["id"], "N5")
+            save_jlpt_level(word["id"], "N4")  # upsert
+            assert Word.get_by_id(word["id"])["jlpt_level"] == "N4"
+            # streamed in small batches (server-side cursor on PostgreSQL)
+            ids = [row[0] for row in Database().iterate("SELECT id FROM words ORDER BY id", batch_size=7)]
+            assert len(ids) == stats["total_words"] + 1 and ids == sorted(ids)
+
+        group_stats = http.get(f"/api/word_progress/group/{group['id']}/stats").get_json()
+        assert group_stats["total_words"] == 1 and group_stats["learned_words"] == 1
+        performance = http.get("/api/dashboard/performance_graph").get_json()
+        assert performance[0]["date"] == session["created_at"][:10]
+        assert http.get("/api/dashboard/last_session").get_json()["id"] == session["id"]
+        assert http.delete(f"/api/words/{word['id']}").status_code == 200
+        overall = http.get("/api/word_progress/all-groups/stats").get_json()["groups"]
+        assert [g["total_words"] for g in overall if g["group_id"] == group["id"]] == [0]
+
+def test_progress_and_sessions_are_per_user(backend_app):
+    from models.database import Database
+    from models.query_metrics import explain
+
+    alice, bob = {"X-User-Id": "alice"}, {"X-User-Id": "bob"}
+    with backend_app.test_client() as http:
+        default_sessions = http.get("/api/dashboard/study_progress").get_json()["total_sessions"]
+        assert default_sessions > 0  # seed data belongs to the default user
+        assert http.get("/api/dashboard/study_progress", headers=alice).get_json()["total_sessions"] == 0
+        assert http.get("/api/dashboard/last_session", headers=alice).status_code in (200, 404)
+
+        session = http.post("/api/study_sessions/", json={"group_id": 1, "study_activity_id": 1}, headers=alice).get_json()
+        assert http.get(f"/api/study_sessions/{session['id']}", headers=alice).status_code == 200
+        assert http.get(f"/api/study_sessions/{session['id']}", headers=bob).status_code == 404
+        assert http.get("/api/study_sessions/", headers=alice).get_json()["total"] == 1
+        assert http.get("/api/dashboard/performance_graph", headers=alice).get_json()[0]["sessions_count"] == 1
+
+        assert http.post("/api/word_progress/", json={"word_id": 1, "status": "learned"}, headers=alice).status_code == 201
+        assert http.get("/api/word_progress/1", headers=alice).get_json()["status"] == "learned"
+        assert http.get("/api/word_progress/1", headers=bob).status_code == 404
+        stats = lambda headers: http.get("/api/word_progress/group/1/stats", headers=headers).get_json()
+        assert stats(alice)["learned_words"] == 1 and stats(bob)["learned_words"] == 0
+        overall = http.get("/api/word_progress/all-groups/stats", headers=bob).get_json()["overall"]
+        assert overall["learned_words"] == 0 and overall["total_words"] > 0
+
+        http.post("/api/dashboard/reset", headers=alice)
+        assert http.get("/api/dashboard/study_progress", headers=alice).get_json()["total_sessions"] == 0
+        assert http.get("/api/dashboard/study_progress").get_json()["total_sessions"] == default_sessions
+        assert http.get("/api/dashboard/quick_stats", headers={"X-User-Id": "bad user!"}).status_code == 400
+
+    with backend_app.app_context():
+        db = Database()
+        if db.backend.name == "sqlite":
+            plan = " ".join(explain(db.get(), "SELECT COUNT(*) FROM study_sessions WHERE user_id = ?", ("alice",)))
+            assert "idx_study_sessions_user" in plan
+            plan = " ".join(explain(db.get(), "SELECT status FROM word_progress WHERE user_id = ? AND word_id = ?",
+                                    ("alice", 1)))
+            assert "idx_word_progress_user_word" in plan
+
+def test_group_stats_count_unstudied_words_as_new(backend_app):
+    fresh = {"X-User-Id": "carol"}
+    with backend_app.test_client() as http:
+        stats = http.get("/api/word_progress/group/1/stats", headers=fresh).get_json()
+        assert stats["total_words"] > 0 and stats["new_words"] == stats["total_words"]
+        overall = http.get("/api/word_progress/all-groups/stats", headers=fresh).get_json()["overall"]
+        assert overall["new_words"] == overall["total_words"] > 0
+
+        assert http.post("/api/word_progress/", json={"word_id": 1, "status": "learning"}, headers=fresh).status_code == 201
+        stats = http.get("/api/word_progress/group/1/stats", headers=fresh).get_json()
+        assert stats["learning_words"] == 1 and stats["new_words"] == stats["total_words"] - 1
+
+def test_schema_migration_adds_user_columns(tmp_path):
+    import sqlite3
+    from app import create_app
+    from models.backends.sqlite import SCHEMA
+    from models.database import SCHEMA_VERSION
+
+    path = str(tmp_path / "v1.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO study_sessions (group_id, study_activity_id) VALUES (1, 1)")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    app_v2 = create_app({"DATABASE_URL": None, "DATABASE_PATH": path})
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT user_id FROM study_sessions").fetchall() == [("default",)]
+    columns = {table: [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+               for table in ("word_progress", "word_review_items")}
+    assert all("user_id" in cols for cols in columns.values())
+    conn.close()
+    with app_v2.test_client() as http:
+        assert http.get("/api/dashboard/study_progress").get_json()["total_sessions"] == 1
+
+def test_word_export_streams_and_imports(backend_app):
+    import csv
+    import gzip
+    import io
+    import json
+    from models.database import Database
+
+    with backend_app.test_client() as http:
+        response = http.get("/api/export/words")
+        assert response.mimetype == "application/x-ndjson"
+        records = [json.loads(line) for line in response.data.decode().splitlines()]
+        total = http.get("/api/dashboard/quick_stats").get_json()["total_words"]
+        assert len(records) == total and [r["id"] for r in records] == sorted(r["id"] for r in records)
+        assert all(r["groups"] and r["progress"] for r in records)  # seed words are grouped and tracked
+
+        response = http.get("/api/export/words?format=csv&gzip=1")
+        assert response.mimetype == "application/gzip"
+        assert response.headers["Content-Disposition"].endswith("words.csv.gz")
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode())))
+        assert [int(row["id"]) for row in rows] == [r["id"] for r in records]
+        assert json.loads(rows[0]["groups"]) == records[0]["groups"] and rows[0]["status"] == records[0]["progress"]["status"]
+
+        # Same rows back as another learner, one word moved into a new group, one new word
+        extra = dict(records[0], id=records[-1]["id"] + 1, kanji="猫", progress=None, groups=["Exported"])
+        body = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records + [extra]).encode()
+        carol = {"X-User-Id": "carol"}
+        counts = http.post("/api/import/words", data=gzip.compress(body), headers=carol).get_json()
+        assert counts["words"] == total + 1 and counts["groups_created"] == 1 and counts["progress"] == total
+        assert http.get("/api/dashboard/quick_stats").get_json()["total_words"] == total + 1
+        exported = [json.loads(line) for line in http.get("/api/export/words", headers=carol).data.decode().splitlines()]
+        assert exported[-1]["kanji"] == "猫" and exported[-1]["groups"] == ["Exported"]
+        assert [r["progress"] for r in exported[:-1]] == [r["progress"] for r in records]
+        with backend_app.app_context():
+            database = Database()
+            cursor = database.cursor()
+            cursor.execute("SELECT words_count FROM groups WHERE name = ?", ("Exported",))
+            assert cursor.fetchone()[0] == 1
+            cursor.execute("SELECT g.words_count, COUNT(wg.word_id) FROM groups g "
+                           "LEFT JOIN word_groups wg ON wg.group_id = g.id GROUP BY g.id, g.words_count")
+            assert all(stored == actual for stored, actual in cursor.fetchall())
+            if database.backend.name == "postgresql":
+                import psycopg
+                # an import in progress does not lock other sessions out of word_groups
+                with database.backend.bulk_load(database.get()):
+                    with psycopg.connect(database.backend.url) as other:
+                        other.execute("SET lock_timeout = '1s'")
+                        assert other.execute("SELECT COUNT(*) FROM word_groups").fetchone()[0] > 0
+                        other.execute("INSERT INTO word_groups (word_id, group_id) VALUES (1, 1) ON CONFLICT DO NOTHING")
+                        other.rollback()
+        # a new word through the API still gets a fresh id after explicit ids were imported
+        word = http.post("/api/words/", json={"kanji": "犬", "romaji": "inu", "vietnamese": "con chó",
+                                              "parts": "[]"}).get_json()["data"]
+        assert word["id"] > extra["id"]
+
+        # CSV imports too; a bad line is a 400 naming it and leaves the data alone
+        csv_body = http.get("/api/export/words?format=csv").data
+        assert http.post("/api/import/words?format=csv", data=csv_body).get_json()["words"] == total + 2
+        bad = http.post("/api/import/words", data=body.splitlines()[0] + b"\n{not json\n")
+        assert bad.status_code == 400 and "line 2" in bad.get_json()["error"]
+        assert http.get("/api/export/words?format=xml").status_code == 400
+
+def test_word_export_memory_stays_flat(tmp_path):
+    import tracemalloc
+    from app import create_app
+    from benchmarks.synthetic_db import build_database
+
+    path = str(tmp_path / "export.db")
+    build_database(path, words=20000, groups=50, review_items=0, seed=2)
+    app = create_app({"DATABASE_URL": None, "DATABASE_PATH": path})
+    with app.test_client() as http:
+        response = http.get("/api/export/words", buffered=False)
+        tracemalloc.start()
+        size = chunks = 0
+        for chunk in response.response:
+            size += len(chunk)
+            chunks += 1
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        response.close()
+    # ~5.6 MB of NDJSON, but only a chunk and a fetchmany batch are held at once
+    assert chunks > 1 and peak < 4 * 1024 * 1024 < size
+
+def test_online_backup_restore_and_retention(tmp_path, monkeypatch, capsys):
+    import json
+    import sqlite3
+    import threading
+    import time
+    from app import create_app
+    from models import backup
+    from models.backup import BackupError, BackupManager, BackupScheduler
+
+    path = str(tmp_path / "live.db")
+    directory = str(tmp_path / "backups")
+    app = create_app({"DATABASE_URL": None, "DATABASE_PATH": path, "BACKUP_DIR": directory,
+                      "BACKUP_KEEP": 3, "BACKUP_BEFORE_DESTRUCTIVE": True})
+    with app.test_client() as http:
+        created = http.post("/api/admin/backups", json={"label": "manual"})
+        assert created.status_code == 201
+        manifest = created.get_json()
+        assert manifest["counts"]["words"] > 0 and manifest["file"].endswith("-manual.db")
+        assert http.post("/api/admin/backups", json={"label": "../x"}).status_code == 400
+
+        sessions = http.get("/api/dashboard/study_progress").get_json()["total_sessions"]
+        assert sessions > 0
+        reset = http.post("/api/dashboard/reset").get_json()
+        assert reset["backup"].endswith("-pre-reset.db")
+        assert http.get("/api/dashboard/study_progress").get_json()["total_sessions"] == 0
+        assert [b["file"] for b in http.get("/api/admin/backups").get_json()["backups"]][0] == reset["backup"]
+
+    manager = BackupManager(directory, keep=4, pages_per_step=1, sleep=0.001)
+    # Writers keep committing while the copy runs: one read transaction in WAL mode, page steps
+    # (finished in one step once writes keep restarting them) with a rollback journal
+    for journal_mode in ("delete", "wal"):
+        conn = sqlite3.connect(path)
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.close()
+        stop = threading.Event()
+        commits = []
+        def write():
+            conn = sqlite3.connect(path, timeout=5)
+            while not stop.is_set():
+                conn.execute("INSERT INTO groups (name, description) VALUES ('during backup', '')")
+                conn.commit()
+                commits.append(1)
+                time.sleep(0.001)
+            conn.close()
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            during = manager.create(path, label="online")
+        finally:
+            stop.set()
+            writer.join()
+        assert commits and manager.verify(during["path"])["ok"]
+        assert during["mode"] in (("snapshot",) if journal_mode == "wal" else ("incremental", "restarted"))
+
+    # Restore brings the sessions back and keeps the reset state as 'pre-restore'
+    result = manager.restore(os.path.join(directory, reset["backup"]), path)
+    assert result["previous"].endswith("-pre-restore.db")
+    with app.test_client() as http:
+        assert http.get("/api/dashboard/study_progress").get_json()["total_sessions"] == sessions
+    assert len(manager.list(path)) == 4  # retention: the manual backup is gone
+
+    # A damaged backup fails verification and is never restored
+    damaged = manager.list(path)[0]["path"]
+    with open(damaged, "r+b") as f:
+        f.seek(4096 + 100)
+        f.write(b"\xff" * 64)
+    assert not manager.verify(damaged)["ok"]
+    with pytest.raises(BackupError):
+        manager.restore(damaged, path)
+
+    scheduler = BackupScheduler(BackupManager(directory, keep=10), path, 0.05).start()
+    try:
+        for _ in range(100):
+            if any(b["label"] == "scheduled" for b in manager.list(path)):
+                break
+            time.sleep(0.05)
+    finally:
+        scheduler.stop()
+    assert any(b["label"] == "scheduled" for b in manager.list(path))
+
+    capsys.readouterr()
+    monkeypatch.setattr("sys.argv", ["backup", "--db", path, "--dir", directory, "--keep", "2", "prune"])
+    assert backup.main() == 0
+    assert len(json.loads(capsys.readouterr().out)["removed"]) > 0 and len(manager.list(path)) == 2
@@ -1,4 +1,5 @@
-from flask import request
+import json
+from flask import request, jsonify
 
 def get_pagination_params():
     """Extract and validate pagination parameters from the request."""
@@ -13,4 +14,32 @@ def get_pagination_params():
         page = 1
         per_page = 100
     
-    return page, per_page 
\ No newline at end of file
+    return page, per_page
+
+def is_async_request(data=None):
+    """True when the client asked to run the request as a background job (?async=1 or "async": true)."""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return bool(isinstance(data, dict) and data.get('async'))
+
+def job_accepted(job_id, created=True):
+    """202 response pointing the client at the job status and result endpoints."""
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'deduplicated': not created,
+        'status_url': f"/api/jobs/{job_id}",
+        'result_url': f"/api/jobs/{job_id}/result"
+    }), 202
+
+def wants_stream():
+    """True when the client asked for a server-sent-events response (?stream=1 or Accept: text/event-stream)."""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
@@ -0,0 +1,13 @@
+"""Production entry point for preforking servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the master imports this module once: the schema is created or upgraded,
+read-only assets (listening catalog, neighbour lists, embedding model) are loaded and then
+shared copy-on-write by the workers. Nothing here keeps a database connection open; each
+worker opens its own per request, and services holding connections, sessions or threads
+rebuild them in the child (os.register_at_fork hooks).
+"""
+from app import app, preload_assets
+
+preload_assets(app)
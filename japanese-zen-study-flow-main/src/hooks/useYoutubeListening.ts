@@ -49,108 +49,51 @@ const extractVideoId = (url: string): string => {
   return videoIdMatch ? videoIdMatch[1] : '';
 };
 
-// Parse text backend trả về thành mảng Question
-export function parseQuestionsFromText(text: string): Question[] {
-  const questionBlocks = text.split(/<question>/g).slice(1);
-  const questions: Question[] = [];
-  
-  questionBlocks.forEach((block, idx) => {
-    const endIdx = block.indexOf('</question>');
-    const content = endIdx !== -1 ? block.slice(0, endIdx) : block;
-    
-    // Improved field extraction with better error handling
-    const getField = (label: string): string => {
-      if (label === 'Conversation') {
-        const match = content.match(
-          /Conversation:\s*([\s\S]*?)(?=\n\s*Question:)/m
-        );
-        return match ? match[1].trim() : '';
-      } else {
-        try {
-          const pattern = new RegExp(
-            `${label}:\\s*([\\s\\S]*?)(?=\\n?\\s*(?:Introduction|Conversation|Question|Options):|<\/question>|$)`,
-            'm'
-          );
-          const match = content.match(pattern);
-          return match ? match[1].trim() : '';
-        } catch (error) {
-          console.warn(`Error parsing field ${label}:`, error);
-          return '';
-        }
-      }
-    };
-    
-    const introduction = getField('Introduction');
-    const conversation = getField('Conversation');
-    const questionText = getField('Question');
-    
-    // Improved options parsing
-    const optionsMatch = content.match(/Options:\s*([\s\S]*)/m);
-    let options: string[] = [];
-    if (optionsMatch) {
-      // Split lines, filter only lines that look like options, and stop at CorrectAnswer or any non-option line
-      const lines = optionsMatch[1]
-        .split('\n')
-        .map(line => line.trim())
-        .filter(line => line.length > 0);
-      options = [];
-      for (const line of lines) {
-        if (/^CorrectAnswer:/i.test(line)) break;
-        if (/^[1-4]\./.test(line) || /^[1-4]$/.test(line)) {
-          options.push(line.replace(/^[1-4]\.?\s*/, '').trim());
-        }
-        // Only allow up to 4 options
-        if (options.length === 4) break;
-      }
+// Chuẩn hóa câu hỏi backend đã parse (Introduction, Options, ...) về Question interface
+const toQuestion = (q: any, idx: number): Question => {
+  const options: string[] = q.Options || [];
+  let introduction: string = q.Introduction || '';
+  let conversation: string = q.Conversation || '';
+  // Câu hỏi 3 option: không hiện hội thoại, introduction chỉ lấy phần sau ký tự '番'
+  if ((q.OptionCount ?? options.length) === 3) {
+    const pos = introduction.indexOf('番');
+    if (pos !== -1 && pos + 1 < introduction.length) {
+      introduction = introduction.slice(pos + 1).trim();
     }
-    
-    // CorrectAnswer parsing
-    const correctAnswerMatch = content.match(/CorrectAnswer:\s*([1-4])/);
-    let correctAnswer: string | undefined = undefined;
-    if (correctAnswerMatch) {
-      correctAnswer = correctAnswerMatch[1];
+    conversation = '';
+  }
+  return {
+    id: idx + 1,
+    introduction,
+    conversation,
+    question: q.Question || '',
+    options,
+    correctAnswer: q.CorrectAnswer || undefined,
+  };
+};
+
+// Giây -> "m:ss"; rỗng nếu backend chưa có transcript kèm thời gian
+const formatSeconds = (seconds?: number | null): string => {
+  if (seconds === null || seconds === undefined) return '';
+  const total = Math.floor(seconds);
+  return `${Math.floor(total / 60)}:${String(total % 60).padStart(2, '0')}`;
+};
+
+// Poll job status cho tới khi job kết thúc
+const pollJob = async (statusUrl: string, intervalMs: number = 1500) => {
+  while (true) {
+    const response = await fetch(statusUrl);
+    if (!response.ok) {
+      throw new Error(`API Error: ${response.status} - ${await response.text()}`);
     }
-    
-    // Only add valid questions
-    if (questionText && questionText.length > 0) {
-      // Nếu là câu hỏi 3 option
-      if (options.length === 3) {
-        let intro = introduction;
-        // Nếu introduction chứa '番', chỉ lấy phần sau ký tự '番'
-        const pos = intro.indexOf('番');
-        if (pos !== -1 && pos + 1 < intro.length) {
-          intro = intro.slice(pos + 1).trim();
-        }
-        questions.push({
-          id: questions.length + 1,
-          introduction: intro,
-          conversation: '',
-          question: questionText,
-          options,
-          correctAnswer,
-        });
-      } else {
-        questions.push({
-          id: questions.length + 1,
-          introduction,
-          conversation,
-          question: questionText,
-          options,
-          correctAnswer,
-        });
-      }
-      
-      console.log(`Parsed question ${questions.length}:`, { 
-        introduction: introduction.substring(0, 50) + '...', 
-        conversation: conversation.substring(0, 50) + '...', 
-        questionText: questionText.substring(0, 50) + '...', 
-        optionsCount: options.length 
-      });
+    const job = await response.json();
+    if (job.status === 'succeeded') return job;
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
     }
-  });
-  
-  return questions;
-}
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
 
 export function useYoutubeListening(options?: { setSectionFiles?: (files: string[]) => void }) {
   const [loading, setLoading] = useState(false);
@@ -166,62 +109,44 @@ export function useYoutubeListening(options?: { setSectionFiles?: (files: string
     setVideoData(null);
     
     try {
-      // 1. Lấy transcript
-      await apiCall('/api/listening/get_transcript', youtubeUrl, 'text/plain');
-      
-      // 2. Split transcript
-      const splitResponse = await apiCall('/api/listening/split_transcript', { youtube_url: youtubeUrl });
-      const splitData = await splitResponse.json();
-      
-      const validSections = (splitData.sections_saved || []).filter((f: string) => /_section\d+\.txt$/.test(f));
-      console.log('Valid sections found:', validSections.length);
+      const videoId = extractVideoId(youtubeUrl);
+      // Video đã xử lý xong thì lấy thẳng từ catalog, không cần chạy job
+      let sections: any[] | null = null;
+      const catalogResponse = await fetch(`/api/listening/videos/${videoId}`);
+      if (catalogResponse.ok) {
+        const catalogVideo = await catalogResponse.json();
+        if (catalogVideo.processed) sections = catalogVideo.sections;
+      }
+      if (!sections) {
+        // Backend chạy transcript -> split -> structure (song song) -> index trong một job
+        const startResponse = await apiCall('/api/listening/process_video', { youtube_url: youtubeUrl });
+        const { status_url } = await startResponse.json();
+        const job = await pollJob(status_url);
+        sections = job.result.sections;
+      }
       
-      // 3. Structure từng section và index
       const mondais: Mondai[] = [];
       let totalQuestions = 0;
       
-      for (let i = 0; i < validSections.length; i++) {
-        const sectionNum = i + 1;
-        console.log(`Processing section ${sectionNum}/${validSections.length}`);
-        
-        try {
-          // Structure section
-          const structureResponse = await apiCall('/api/listening/structure_section', { 
-            youtube_url: youtubeUrl, 
-            section_num: sectionNum 
-          });
-          const structureData = await structureResponse.json();
-          
-          // Index questions (fire and forget)
-          apiCall('/api/listening/index_questions', { 
-            youtube_url: youtubeUrl, 
-            section_num: sectionNum 
-          }).catch(err => console.warn(`Index questions failed for section ${sectionNum}:`, err));
-          
-          // Parse questions từ structureData.content
-          const questions: Question[] = parseQuestionsFromText(structureData.content);
-          
-          mondais.push({
-            id: sectionNum,
-            title: `Mondai ${sectionNum}`,
-            description: `Section ${sectionNum} questions`,
-            questions,
-            startTime: '',
-            endTime: '',
-          });
-          
-          totalQuestions += questions.length;
-          console.log(`Section ${sectionNum} completed: ${questions.length} questions`);
-          
-        } catch (sectionError) {
-          console.error(`Failed to process section ${sectionNum}:`, sectionError);
-          // Continue with other sections instead of failing completely
+      for (const section of sections) {
+        if (section.error) {
+          console.error(`Failed to process section ${section.section_num}:`, section.error);
+          continue;
         }
+        const questions: Question[] = section.questions.map(toQuestion);
+        mondais.push({
+          id: section.section_num,
+          title: `Mondai ${section.section_num}`,
+          description: `Section ${section.section_num} questions`,
+          questions,
+          startTime: formatSeconds(section.start),
+          endTime: formatSeconds(section.end),
+        });
+        totalQuestions += questions.length;
       }
       
       console.log(`Total mondais processed: ${mondais.length}, Total questions: ${totalQuestions}`);
       
-      const videoId = extractVideoId(youtubeUrl);
       setVideoData({
         title: 'YouTube JLPT Listening',
         url: youtubeUrl,
@@ -302,8 +227,8 @@ export function useYoutubeListening(options?: { setSectionFiles?: (files: string
         section_num: sectionNum 
       }).catch(err => console.warn(`Index questions failed for section ${sectionNum}:`, err));
       
-      // Parse questions từ structureData.content
-      const questions: Question[] = parseQuestionsFromText(structureData.content);
+      // Backend đã parse sẵn câu hỏi
+      const questions: Question[] = (structureData.questions || []).map(toQuestion);
       setQuestions(questions);
       
       console.log(`Section ${sectionNum} analysis completed: ${questions.length} questions`);
@@ -342,18 +267,25 @@ export async function generateQuestionFromConversation(conversation: string): Pr
     if (!resp.ok) throw new Error(await resp.text());
     const data = await resp.json();
     if (!data.success || !data.question) return null;
-    const q = data.question;
-    // Chuẩn hóa về Question interface
-    return {
-      id: 1,
-      introduction: q.Introduction || '',
-      conversation: q.Conversation || '',
-      question: q.Question || '',
-      options: q.Options || [],
-      correctAnswer: q.CorrectAnswer || undefined,
-    };
+    return toQuestion(data.question, 0);
   } catch (err) {
     console.error('generateQuestionFromConversation error:', err);
     return null;
   }
-} 
\ No newline at end of file
+} 
+// Sinh câu hỏi cho nhiều hội thoại trong ít lần gọi LLM; null cho hội thoại sinh thất bại
+export async function generateQuestionsFromConversations(conversations: string[]): Promise<(Question | null)[]> {
+  try {
+    const resp = await fetch('/api/listening/generate_questions', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ conversations }),
+    });
+    if (!resp.ok) throw new Error(await resp.text());
+    const data = await resp.json();
+    return (data.questions || []).map((q: any, idx: number) => (q ? toQuestion(q, idx) : null));
+  } catch (err) {
+    console.error('generateQuestionsFromConversations error:', err);
+    return conversations.map(() => null);
+  }
+}